@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from telemetry import telemetry
+
+if TYPE_CHECKING:
+    from cldk.analysis.java import JavaAnalysis
+
+# CLDK and hamster are imported where an analysis is actually run or reloaded, so scripts that only read the
+# cache (or classify a single file) start without them
+
+ANALYSIS_CACHE_DIR = Path("./.cache/cldk")
+
+# Layout of one cache entry, .cache/cldk/<repo>@<commit>/:
+#   analysis.json       CLDK's own analysis output (written through analysis_json_path)
+#   sources/            copies of the test class sources, so later runs need no checkout
+#   test_entities.json  {test class: {"methods": [...], "source": "sources/<n>.java"}}, written last
+
+
+@dataclass
+class ProjectAnalysis:
+    test_entities: dict[str, list]
+    source_files: dict[str, Path]
+    name: Optional[str] = None
+    cache_dir: Optional[Path] = None
+    project_path: Optional[str] = None
+    _analysis: Optional["JavaAnalysis"] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def test_class_names(self) -> list[str]:
+        return list(self.test_entities.keys())
+
+    def read_source(self, test_class_name: str) -> str:
+        return self.source_files[test_class_name].read_text()
+
+    def iter_sources(self, skip=()) -> Iterator[tuple[str, str]]:
+        # sources are read as they are consumed, so only the classes in flight are held in memory
+        for test_class_name in self.test_entities:
+            if test_class_name in skip:
+                continue
+            yield test_class_name, self.read_source(test_class_name)
+
+    def get_class(self, test_class_name: str):
+        return self.java_analysis().get_class(test_class_name)
+
+    def java_analysis(self) -> "JavaAnalysis":
+        # The CLDK model is only reloaded (from the cached analysis.json) when something needs it,
+        # and only once when several classify workers ask for it at the same time
+        if self._analysis is None:
+            with self._lock:
+                if self._analysis is None:
+                    from cldk import CLDK
+
+                    self._analysis = CLDK(language="java").analysis(
+                        project_path=self.project_path or str(self.cache_dir),
+                        analysis_json_path=str(self.cache_dir) if self.cache_dir else None,
+                    )
+        return self._analysis
+
+
+def cache_dir_for(repo_name: str, commit_hash: str) -> Path:
+    return ANALYSIS_CACHE_DIR / f"{repo_name}@{commit_hash}"
+
+
+def is_cached(repo_name: str, commit_hash: str) -> bool:
+    return (cache_dir_for(repo_name, commit_hash) / "test_entities.json").exists()
+
+
+def git_head(project_path: str) -> Optional[str]:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_path, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def clean_head(project_path: str) -> Optional[str]:
+    """HEAD of the checkout as an analysis cache key, None when there are uncommitted or untracked changes.
+
+    The cache entry of a commit must describe that commit, so a dirty checkout is analysed without caching.
+    """
+    head = git_head(project_path)
+    if head is None:
+        return None
+    status = subprocess.run(["git", "status", "--porcelain"], cwd=project_path, capture_output=True, text=True)
+    return head if status.returncode == 0 and not status.stdout.strip() else None
+
+
+def _load_cached(cache_dir: Path, repo_name: str) -> ProjectAnalysis:
+    with open(cache_dir / "test_entities.json", "r") as f:
+        entries = json.load(f)
+    return ProjectAnalysis(
+        test_entities={name: entry["methods"] for name, entry in entries.items()},
+        source_files={name: cache_dir / entry["source"] for name, entry in entries.items()},
+        name=repo_name,
+        cache_dir=cache_dir,
+    )
+
+
+def _analyze(project_path: str, repo_name: str, cache_dir: Optional[Path], eager: bool) -> ProjectAnalysis:
+    with telemetry.stage("cldk_analysis"):
+        return _run_cldk(project_path, repo_name, cache_dir, eager)
+
+
+def _run_cldk(project_path: str, repo_name: str, cache_dir: Optional[Path], eager: bool) -> ProjectAnalysis:
+    from cldk import CLDK
+    from hamster.code_analysis.common import CommonAnalysis
+
+    cldk = CLDK(language="java")
+    analysis: "JavaAnalysis" = cldk.analysis(
+        project_path=project_path,
+        analysis_json_path=str(cache_dir) if cache_dir else None,
+        eager=eager,
+    )
+    common_analysis = CommonAnalysis(analysis=analysis)
+    test_entities, app_classes = common_analysis.get_test_methods_classes_and_application_classes()
+
+    source_files = {
+        test_class_name: Path(analysis.get_java_file(test_class_name)).absolute().resolve()
+        for test_class_name in test_entities
+    }
+    return ProjectAnalysis(
+        test_entities=dict(test_entities),
+        source_files=source_files,
+        name=repo_name,
+        cache_dir=cache_dir,
+        project_path=project_path,
+        _analysis=analysis,
+    )
+
+
+def _store(project: ProjectAnalysis, cache_dir: Path) -> ProjectAnalysis:
+    sources_dir = cache_dir / "sources"
+    sources_dir.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    for i, (test_class_name, source_file) in enumerate(project.source_files.items()):
+        relative = Path("sources") / f"{i}_{source_file.name}"
+        shutil.copyfile(source_file, cache_dir / relative)
+        entries[test_class_name] = {
+            "methods": [m if isinstance(m, (str, int, float, bool, type(None))) else str(m) for m in project.test_entities[test_class_name]],
+            "source": str(relative),
+        }
+
+    # test_entities.json marks a complete entry, so it is written last and atomically
+    tmp_path = cache_dir / "test_entities.json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=4)
+    os.replace(tmp_path, cache_dir / "test_entities.json")
+
+    # from here on sources are read from the cache, so the checkout can be removed
+    project.source_files = {name: cache_dir / entry["source"] for name, entry in entries.items()}
+    return project
+
+
+def load_project(project_path: Optional[str], repo_name: Optional[str] = None, commit_hash: Optional[str] = None, invalidate: bool = False) -> ProjectAnalysis:
+    # Without a (repo, commit) key the project is analysed from scratch and nothing is cached
+    if repo_name is None or commit_hash is None:
+        if project_path is None:
+            raise ValueError("project_path is required when the analysis is not cached")
+        return _analyze(project_path, repo_name or Path(project_path).resolve().name, None, eager=False)
+
+    cache_dir = cache_dir_for(repo_name, commit_hash)
+    if invalidate and cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    if is_cached(repo_name, commit_hash):
+        return _load_cached(cache_dir, repo_name)
+
+    if project_path is None:
+        raise ValueError(f"no cached analysis for {repo_name}@{commit_hash} and no project path to analyse")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return _store(_analyze(project_path, repo_name, cache_dir, eager=invalidate), cache_dir)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python analysis_cache.py list | clear [<repo>@<commit>]
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "clear":
+        target = ANALYSIS_CACHE_DIR / sys.argv[2] if len(sys.argv) > 2 else ANALYSIS_CACHE_DIR
+        shutil.rmtree(target, ignore_errors=True)
+    elif ANALYSIS_CACHE_DIR.exists():
+        for entry in sorted(ANALYSIS_CACHE_DIR.iterdir()):
+            complete = (entry / "test_entities.json").exists()
+            print(f"{entry.name}{'' if complete else ' (incomplete)'}")
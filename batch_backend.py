@@ -0,0 +1,463 @@
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+import is_integration_test as gate
+import pattern_analysis
+import pattern_rating
+from is_integration_test import TestClassification
+from llm_cache import cache_key, default_cache
+from llm_chains import HUMAN_TEMPLATE, response_format
+from pattern_analysis import IntegrationTestAnalysis
+from pattern_rating import IntergrationPatternRating
+from pattern_statistics import load_repo_analysis, open_journal, pattern_from_rating, write_stats
+from prompt_slicing import slicer
+from results_store import store
+from run_journal import write_json_object
+from static_filter import prefilter
+from telemetry import telemetry
+
+# Offline batch backend: the prompts of a whole repo set are written to a JSONL request file in the
+# OpenAI batch format, submitted in one go, polled until done, and the structured answers are mapped
+# back onto the classifier schemas. Results go through the same LLM cache as the synchronous path,
+# so cached classes are never submitted and a rerun after a failed batch only sends what is missing.
+
+BATCH_DIR = Path("./batches")
+ANALYSIS_DIR = Path("./analysis")
+LOCAL_BATCH_DIR = Path("./.cache/local_batches")
+ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_BATCH = 50000
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchError(Exception):
+    pass
+
+
+@dataclass
+class BatchRequest:
+    custom_id: str
+    schema: Type[BaseModel]
+    system_rules: str
+    prompt_version: str
+    model: str
+    temperature: float
+    code: str
+
+    def cache_key(self) -> str:
+        return cache_key(self.code, self.schema, self.system_rules, self.prompt_version, self.model, self.temperature)
+
+
+def request_line(request: BatchRequest, model: str) -> dict:
+    return {
+        "custom_id": request.custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": request.temperature,
+            "messages": [
+                {"role": "system", "content": request.system_rules},
+                {"role": "user", "content": HUMAN_TEMPLATE.format(code=request.code)},
+            ],
+            "response_format": response_format(request.schema),
+        },
+    }
+
+
+def parse_response(line: dict, schema: Type[BaseModel]) -> tuple[Optional[BaseModel], Optional[str]]:
+    # (result, error) for one line of a batch output or error file
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None, json.dumps(line.get("error") or response.get("body"))
+    message = response["body"]["choices"][0]["message"]
+    if message.get("refusal"):
+        return None, message["refusal"]
+    try:
+        return schema.model_validate_json(message["content"]), None
+    except ValidationError as e:
+        return None, str(e)
+
+
+@dataclass
+class BatchStatus:
+    status: str
+    completed: int = 0
+    failed: int = 0
+    total: int = 0
+
+
+class OpenAIBatchService:
+    """The OpenAI Batch API (or any server implementing /files and /batches)."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url or os.getenv("LLM_BATCH_BASE_URL"))
+
+    def model_name(self, model: str) -> str:
+        # OpenRouter style "openai/gpt-4o" -> "gpt-4o"
+        return model.rsplit("/", 1)[-1]
+
+    def submit(self, request_file: Path) -> str:
+        with open(request_file, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        return self.client.batches.create(input_file_id=uploaded.id, endpoint=ENDPOINT, completion_window="24h").id
+
+    def status(self, batch_id: str) -> BatchStatus:
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return BatchStatus(batch.status, counts.completed if counts else 0, counts.failed if counts else 0, counts.total if counts else 0)
+
+    def download(self, batch_id: str, output_path: Path) -> None:
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, "wb") as f:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).read())
+
+
+def fill_schema(body: dict) -> dict:
+    # stand-in answer: a valid instance of the requested schema, reproducible for the same request
+    rng = random.Random(hashlib.sha256(json.dumps(body["messages"], sort_keys=True).encode("utf-8")).digest())
+    schema = body["response_format"]["json_schema"]["schema"]
+    defs = schema.get("$defs", {})
+
+    def fill(node: dict):
+        if "$ref" in node:
+            return fill(defs[node["$ref"].rsplit("/", 1)[-1]])
+        if "enum" in node:
+            return rng.choice(node["enum"])
+        if node.get("type") == "boolean":
+            return rng.random() < 0.5
+        if node.get("type") == "object":
+            return {name: fill(child) for name, child in node["properties"].items()}
+        return "stand-in answer"
+
+    content = json.dumps(fill(schema))
+    return {
+        "object": "chat.completion",
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+def forward_to(base_url: str, api_key: Optional[str] = None) -> Callable[[dict], dict]:
+    # stand-in answer from an OpenAI-compatible chat endpoint, one synchronous request per line
+    import httpx
+
+    client = httpx.Client(timeout=120.0)
+    headers = {"Authorization": f"Bearer {api_key or os.getenv('OPENROUTER_API_KEY', '')}"}
+
+    def respond(body: dict) -> dict:
+        response = client.post(base_url.rstrip("/") + "/chat/completions", json=body, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    return respond
+
+
+class LocalBatchService:
+    """File-based stand-in for a batch API: one directory per batch under `root`.
+
+    `submit` only drops the request file into the directory; `process_pending` (run inline when
+    `inline` is set, or by `python batch_backend.py serve`) answers every line and writes output.jsonl.
+    """
+
+    def __init__(self, root: Path = LOCAL_BATCH_DIR, respond: Callable[[dict], dict] = fill_schema, inline: bool = True):
+        self.root = Path(root)
+        self.respond = respond
+        self.inline = inline
+
+    def model_name(self, model: str) -> str:
+        return model
+
+    def _write_status(self, batch_dir: Path, **status) -> None:
+        tmp_path = batch_dir / "status.json.tmp"
+        tmp_path.write_text(json.dumps(status))
+        os.replace(tmp_path, batch_dir / "status.json")
+
+    def submit(self, request_file: Path) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        batch_dir = self.root / batch_id
+        batch_dir.mkdir(parents=True)
+        (batch_dir / "input.jsonl").write_bytes(Path(request_file).read_bytes())
+        self._write_status(batch_dir, status="validating")
+        return batch_id
+
+    def status(self, batch_id: str) -> BatchStatus:
+        if self.inline:
+            self.process_pending()
+        status = json.loads((self.root / batch_id / "status.json").read_text())
+        return BatchStatus(**status)
+
+    def download(self, batch_id: str, output_path: Path) -> None:
+        Path(output_path).write_bytes((self.root / batch_id / "output.jsonl").read_bytes())
+
+    def process_pending(self) -> int:
+        processed = 0
+        for batch_dir in sorted(self.root.glob("batch_*")):
+            if not (batch_dir / "status.json").exists():
+                # still being submitted
+                continue
+            status = json.loads((batch_dir / "status.json").read_text())
+            if status["status"] != "validating":
+                continue
+            self._write_status(batch_dir, status="in_progress")
+            completed = failed = 0
+            with open(batch_dir / "input.jsonl", "r") as f_in, open(batch_dir / "output.jsonl", "w") as f_out:
+                for line in f_in:
+                    request = json.loads(line)
+                    try:
+                        response = {"status_code": 200, "body": self.respond(request["body"])}
+                        error = None
+                        completed += 1
+                    except Exception as e:
+                        response = None
+                        error = {"message": str(e)}
+                        failed += 1
+                    f_out.write(json.dumps({"custom_id": request["custom_id"], "response": response, "error": error}) + "\n")
+            self._write_status(batch_dir, status="completed", completed=completed, failed=failed, total=completed + failed)
+            processed += 1
+        return processed
+
+
+class BatchRunner:
+    """Serializes requests into batch files, submits them, polls, and maps the answers back by custom_id."""
+
+    def __init__(self, service, work_dir: Path = BATCH_DIR, poll_interval: float = 30.0, max_requests: int = MAX_REQUESTS_PER_BATCH):
+        self.service = service
+        self.work_dir = Path(work_dir)
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.submitted = 0
+        self.cached = 0
+        self.failed = 0
+
+    def _write_parts(self, name: str, requests: Iterable[BatchRequest], results: dict, schemas: dict) -> list[Path]:
+        parts = []
+        f = None
+        count = 0
+        cache = default_cache()
+        try:
+            for request in requests:
+                cached = cache.get(request.cache_key(), request.schema) if cache is not None else None
+                if cached is not None:
+                    results[request.custom_id] = cached
+                    self.cached += 1
+                    continue
+                if f is None or count >= self.max_requests:
+                    if f is not None:
+                        f.close()
+                    parts.append(self.work_dir / f"{name}.part{len(parts)}.jsonl")
+                    f = open(parts[-1], "w")
+                    count = 0
+                f.write(json.dumps(request_line(request, self.service.model_name(request.model))) + "\n")
+                schemas[request.custom_id] = (request.schema, request.cache_key(), request.model)
+                count += 1
+        finally:
+            if f is not None:
+                f.close()
+        return parts
+
+    def _batch_id(self, part: Path) -> str:
+        # a part that was already submitted (e.g. before a crash) is polled again instead of resubmitted
+        marker = part.with_suffix(".batch.json")
+        digest = hashlib.sha256(part.read_bytes()).hexdigest()
+        if marker.exists():
+            submitted = json.loads(marker.read_text())
+            if submitted["sha256"] == digest and self.service.status(submitted["batch_id"]).status not in ("failed", "cancelled"):
+                return submitted["batch_id"]
+        batch_id = self.service.submit(part)
+        marker.write_text(json.dumps({"batch_id": batch_id, "sha256": digest}))
+        return batch_id
+
+    def _wait(self, batch_id: str) -> BatchStatus:
+        while True:
+            status = self.service.status(batch_id)
+            if status.status in TERMINAL_STATUSES:
+                return status
+            print(f"batch {batch_id}: {status.status} ({status.completed}/{status.total})")
+            time.sleep(self.poll_interval)
+
+    def run(self, name: str, requests: Iterable[BatchRequest]) -> dict[str, BaseModel]:
+        """Returns {custom_id: result}; requests that failed are missing from the result."""
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        results: dict[str, BaseModel] = {}
+        schemas: dict[str, tuple] = {}
+        parts = self._write_parts(name, requests, results, schemas)
+
+        cache = default_cache()
+        batch_ids = [self._batch_id(part) for part in parts]
+        self.submitted += len(schemas)
+        for part, batch_id in zip(parts, batch_ids):
+            status = self._wait(batch_id)
+            if status.status == "failed":
+                raise BatchError(f"batch {batch_id} ({part}) failed")
+            output_path = part.with_suffix(".output.jsonl")
+            self.service.download(batch_id, output_path)
+            answered = set()
+            with open(output_path, "r") as f:
+                for line in f:
+                    line = json.loads(line)
+                    answered.add(line["custom_id"])
+                    schema, key, model = schemas[line["custom_id"]]
+                    result, error = parse_response(line, schema)
+                    if result is None:
+                        self.failed += 1
+                        print(f"{line['custom_id']}: {error}")
+                        continue
+                    results[line["custom_id"]] = result
+                    if cache is not None:
+                        cache.put(key, result, model)
+            # an expired batch only answers part of its requests
+            with open(part, "r") as f:
+                self.failed += sum(1 for line in f if json.loads(line)["custom_id"] not in answered)
+        return results
+
+    def stats(self) -> dict:
+        return {"submitted": self.submitted, "from_cache": self.cached, "failed": self.failed}
+
+
+def classify_corpus(repos_info: dict, runner: BatchRunner, mode: str = "stats", resume: bool = False, invalidate_analysis: bool = False) -> None:
+    """Two batches for the whole repo set: the integration test gate, then the rating (stats) or analysis.
+
+    In stats mode a repo's journal is only marked done once every class has an answer; with `resume`, the
+    classes already journaled are skipped, so a rerun only submits the classes whose requests failed.
+    """
+    projects = {}
+    done_classes: dict[str, set[str]] = {}
+    for folder_name, details in repos_info.items():
+        if mode == "stats" and resume:
+            journal = open_journal(folder_name, resume=True)
+            if journal.is_done():
+                continue
+            done_classes[folder_name] = journal.completed_keys()
+        with telemetry.scope(repo=folder_name):
+            project = load_repo_analysis(folder_name, details["github_url"], details["commit"], invalidate=invalidate_analysis)
+        if project is not None:
+            projects[folder_name] = project
+
+    # phase 1: the gate, only for classes the static pre-filter cannot decide
+    decisions: dict[tuple[str, str], Optional[bool]] = {}
+    gate_ids: dict[str, tuple[str, str]] = {}
+
+    def gate_requests():
+        for folder_name, project in projects.items():
+            for test_class_name, code_body in project.iter_sources(skip=done_classes.get(folder_name, ())):
+                verdict = prefilter.verdict(code_body)
+                decisions[(folder_name, test_class_name)] = verdict.decision
+                if verdict.decision is None:
+                    custom_id = f"gate-{len(gate_ids)}"
+                    gate_ids[custom_id] = (folder_name, test_class_name)
+                    yield BatchRequest(custom_id, TestClassification, gate.SYSTEM_RULES, gate.PROMPT_VERSION, gate.MODEL_NAME, gate.TEMPERATURE, code_body)
+
+    gate_results = runner.run("gate", gate_requests())
+    for custom_id, key in gate_ids.items():
+        # a class whose gate request failed stays undecided and is left out of the output
+        decisions[key] = gate_results[custom_id].is_integration_test if custom_id in gate_results else None
+
+    # phase 2: the pattern prompt for every integration test
+    if mode == "stats":
+        schema, module = IntergrationPatternRating, pattern_rating
+    else:
+        schema, module = IntegrationTestAnalysis, pattern_analysis
+    pattern_ids: dict[tuple[str, str], str] = {}
+
+    def pattern_requests():
+        for (folder_name, test_class_name), decision in decisions.items():
+            if decision:
+                project = projects[folder_name]
+                payload = slicer.payload(project, test_class_name, project.read_source(test_class_name))
+                custom_id = f"{mode}-{len(pattern_ids)}"
+                pattern_ids[(folder_name, test_class_name)] = custom_id
+                yield BatchRequest(custom_id, schema, module.SYSTEM_RULES, module.PROMPT_VERSION, module.MODEL_NAME, module.TEMPERATURE, payload)
+
+    pattern_results = runner.run(mode, pattern_requests())
+
+    # same outputs as the synchronous scripts: stats/<repo>.json (through the journal) or analysis/<repo>.json
+    for folder_name in projects:
+        keys = [key for key in decisions if key[0] == folder_name]
+        if mode == "stats":
+            journal = open_journal(folder_name, resume=resume)
+            missing = 0
+            for key in keys:
+                test_class_name = key[1]
+                if decisions[key] is False:
+                    journal.record(test_class_name, {"test_class": test_class_name, "pattern": "Not an integration test"})
+                elif decisions[key] and pattern_ids[key] in pattern_results:
+                    journal.record(test_class_name, {"test_class": test_class_name, "pattern": pattern_from_rating(pattern_results[pattern_ids[key]])})
+                else:
+                    # the gate or pattern request failed
+                    missing += 1
+            if missing:
+                # left unmarked and without stats/<repo>.json, so --resume retries the missing classes
+                print(f"{folder_name}: {missing} classes without an answer, rerun with --resume")
+                journal.close()
+                continue
+            journal.mark_done()
+            journal.close()
+            write_stats(folder_name, journal)
+        else:
+            ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+            analyses = ((key[1], pattern_results[pattern_ids[key]].dict()) for key in keys if decisions[key] and pattern_ids[key] in pattern_results)
+            with open(ANALYSIS_DIR / f"{folder_name}.json", "w") as f:
+                write_json_object(analyses, f)
+            store.record_file(ANALYSIS_DIR / f"{folder_name}.json", "analysis")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="classify a repo set through batch submissions")
+    run_parser.add_argument("repos_info_json")
+    run_parser.add_argument("--mode", choices=["stats", "analysis"], default="stats", help="write stats/<repo>.json or analysis/<repo>.json")
+    run_parser.add_argument("--local", metavar="DIR", help="submit to the file-based stand-in service in DIR instead of the OpenAI Batch API")
+    run_parser.add_argument("--local-inline", action="store_true", help="let the stand-in answer while polling, no separate serve process")
+    run_parser.add_argument("--poll-interval", type=float, default=30.0)
+    run_parser.add_argument("--work-dir", default=str(BATCH_DIR), help="request and output files")
+    run_parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    run_parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompt instead of the full source")
+    run_parser.add_argument("--resume", action="store_true", help="skip repos whose stats journal is complete")
+    run_parser.add_argument("--invalidate-analysis", action="store_true", help="re-run CLDK even when a cached analysis exists")
+    run_parser.add_argument("--store", action="store_true", help="load each output file into the results store as it is written (see results_store.py)")
+
+    serve_parser = subparsers.add_parser("serve", help="run the file-based stand-in service")
+    serve_parser.add_argument("root", nargs="?", default=str(LOCAL_BATCH_DIR))
+    serve_parser.add_argument("--forward", metavar="BASE_URL", help="answer through an OpenAI-compatible endpoint instead of schema-filled stand-in answers")
+    serve_parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        service = LocalBatchService(Path(args.root), forward_to(args.forward) if args.forward else fill_schema, inline=False)
+        while True:
+            if service.process_pending():
+                print("processed pending batches")
+            time.sleep(args.poll_interval)
+
+    prefilter.enabled = not args.no_prefilter
+    slicer.enabled = args.slice
+    store.enabled = args.store
+    if args.local:
+        service = LocalBatchService(Path(args.local), inline=args.local_inline)
+    else:
+        service = OpenAIBatchService()
+    runner = BatchRunner(service, Path(args.work_dir), poll_interval=args.poll_interval)
+
+    with open(args.repos_info_json, "r") as f:
+        repos_info = json.load(f)
+    classify_corpus(repos_info, runner, args.mode, resume=args.resume, invalidate_analysis=args.invalidate_analysis)
+    print(f"Batch: {runner.stats()}")
+    print(f"Static pre-filter: {prefilter.stats()}")
+    telemetry.report()
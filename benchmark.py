@@ -0,0 +1,360 @@
+import hashlib
+import importlib
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+# Throughput benchmark that needs no API key: a local OpenAI-compatible stub server answers the structured
+# output requests with schema-valid JSON after a configurable latency, failing a configurable share of them.
+# Each case runs the pattern_statistics or pattern_analysis flow in a fresh subprocess (so the module-level
+# caches, limiters and dedup index start empty and peak memory is per case) over a fixture project built from
+# examples/*.txt, and reports classes/sec, p50/p99 per-class latency and peak memory.
+
+EXAMPLES_DIR = Path("./examples")
+FIXTURE_COMMIT = "fixture"
+
+
+class StubLLMServer:
+    """OpenAI-compatible /chat/completions endpoint for `with_structured_output` (json_schema) requests.
+
+    Answers are a function of the request body and `seed` only, so every run sees the same answers whatever
+    the concurrency. `responses` maps a schema name to canned field values that override the generated ones.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 429,
+                 retry_after: float = 0.05, responses: Optional[dict] = None, seed: int = 0, port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.responses = responses or {}
+        self.seed = seed
+        self.requests = 0
+        self.errors = 0
+        self._attempts: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _rng(self, digest: str, salt: str = "") -> random.Random:
+        return random.Random(int(hashlib.sha256(f"{self.seed}:{salt}:{digest}".encode()).hexdigest()[:16], 16))
+
+    def _fill(self, schema: dict, defs: dict, rng: random.Random):
+        if "$ref" in schema:
+            return self._fill(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, rng)
+        if "anyOf" in schema:
+            return self._fill(schema["anyOf"][0], defs, rng)
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        kind = schema.get("type")
+        if kind == "object":
+            return {name: self._fill(field, defs, rng) for name, field in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [self._fill(schema.get("items", {}), defs, rng)]
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if kind == "integer":
+            return rng.randint(0, 10)
+        if kind == "number":
+            return round(rng.random(), 3)
+        if kind == "null":
+            return None
+        return f"stub answer {rng.randint(0, 999)}"
+
+    def answer(self, body: dict) -> tuple[int, dict, float]:
+        """(status, payload, delay in seconds) for one request body."""
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        # the attempt number is part of the seed, so a retried request can succeed
+        rng = self._rng(digest, str(attempt))
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return self.error_status, {"error": {"message": "stub error", "type": "stub_error", "code": self.error_status}}, delay
+
+        json_schema = (body.get("response_format") or {}).get("json_schema")
+        if json_schema is None:
+            return 400, {"error": {"message": "only json_schema response_format is supported", "type": "invalid_request_error"}}, 0.0
+        schema = json_schema["schema"]
+        content = self._fill(schema, schema.get("$defs", {}), self._rng(digest))
+        content.update(self.responses.get(json_schema.get("name"), {}))
+        content = json.dumps(content)
+
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []) if isinstance(m.get("content"), str))
+        return 200, {
+            "id": f"chatcmpl-{digest[:24]}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4, "total_tokens": (prompt_chars + len(content)) // 4},
+        }, delay
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    status, payload, delay = stub.answer(body)
+                else:
+                    status, payload, delay = 404, {"error": {"message": f"unknown path {self.path}"}}, 0.0
+                time.sleep(delay)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self._attempts.clear()
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def build_fixture(root: Path, name: str = "fixture", copies: int = 1, examples_dir: Path = EXAMPLES_DIR) -> Path:
+    """Writes an analysis-cache entry (see analysis_cache.py) with `copies` variants of every example class.
+
+    Copies differ only in a comment, so they miss the LLM cache but are near-duplicates of each other.
+    Returns the cache root to point analysis_cache.ANALYSIS_CACHE_DIR at.
+    """
+    examples = sorted(examples_dir.glob("*.txt"))
+    if not examples:
+        raise ValueError(f"no examples found in {examples_dir}")
+    entry_dir = root / f"{name}@{FIXTURE_COMMIT}"
+    sources_dir = entry_dir / "sources"
+    sources_dir.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    for copy in range(copies):
+        for example in examples:
+            relative = Path("sources") / f"{len(entries)}_{example.stem}.java"
+            (entry_dir / relative).write_text(f"// fixture copy {copy}\n" + example.read_text(errors="replace"))
+            entries[f"fixture.copy{copy}.{example.stem}"] = {"methods": [], "source": str(relative)}
+    with open(entry_dir / "test_entities.json", "w") as f:
+        json.dump(entries, f, indent=4)
+    return root
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    # nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def run_case(args) -> dict:
+    """Runs one flow in this process against the stub; called in the case subprocess."""
+    import analysis_cache
+    import llm_dispatch
+    from chunked_classification import chunker
+    from llm_cache import default_cache
+    from llm_chains import registry
+    from model_cascade import cascade
+    from near_duplicates import dedup
+    from pattern_analysis import analyze_sources
+    from pattern_statistics import classify_sources
+    from static_filter import prefilter
+    from telemetry import telemetry
+
+    registry.base_url = args.base_url
+    llm_dispatch.configure(args.max_workers)
+    prefilter.enabled = not args.no_prefilter
+    chunker.token_budget = args.token_budget
+    dedup.enabled = args.dedup
+    cascade.enabled = args.cascade
+
+    # LangChain and the OpenAI client are otherwise imported by the first model call, inside the timed run
+    for module in ("langchain_core.prompts", "langchain_core.runnables", "langchain_openai"):
+        importlib.import_module(module)
+
+    if args.trace_heap:
+        # tracemalloc slows the run down several times, so classes/sec is not comparable with it on
+        tracemalloc.start()
+    start = time.perf_counter()
+    if args.project:
+        # a real checkout, including its CLDK analysis
+        project = analysis_cache.load_project(args.project)
+    else:
+        analysis_cache.ANALYSIS_CACHE_DIR = Path(args.fixture)
+        project = analysis_cache.load_project(None, args.fixture_name, FIXTURE_COMMIT)
+
+    if args.flow == "stats":
+        results = classify_sources(project.iter_sources(), args.max_workers, args.fused, project)
+        positives = sum(r["pattern"] != "Not an integration test" for r in results)
+    else:
+        results = list(analyze_sources(project.iter_sources(), project, args.max_workers, args.fused))
+        positives = sum(analysis is not None for _, analysis in results)
+    wall_s = time.perf_counter() - start
+    peak_heap = tracemalloc.get_traced_memory()[1] if args.trace_heap else None
+    tracemalloc.stop()
+
+    latencies = [c["stages"]["classify"]["wall_s"] for c in telemetry.summary()["classes"] if "classify" in c["stages"]]
+    cache = default_cache()
+    return {
+        "classes": len(results),
+        "integration_tests": positives,
+        "wall_s": round(wall_s, 3),
+        "classes_per_s": round(len(results) / wall_s, 2) if wall_s else None,
+        "p50_s": round(percentile(latencies, 50), 3) if latencies else None,
+        "p99_s": round(percentile(latencies, 99), 3) if latencies else None,
+        "llm_calls": telemetry.summary()["stages"].get("llm", {}).get("calls", 0),
+        "retries": llm_dispatch.limiter().retries,
+        "cache": cache.stats() if cache is not None else None,
+        "peak_heap_mb": round(peak_heap / 2**20, 1) if peak_heap is not None else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def case_command(flow: str, max_workers: int, base_url: str, fixture: Path, options) -> list[str]:
+    command = [sys.executable, __file__, "case", "--flow", flow, "--max-workers", str(max_workers), "--base-url", base_url,
+               "--fixture", str(fixture), "--fixture-name", options.fixture_name]
+    if options.project:
+        command += ["--project", options.project]
+    if options.token_budget:
+        command += ["--token-budget", str(options.token_budget)]
+    for flag in ("fused", "dedup", "cascade", "no_prefilter", "trace_heap"):
+        if getattr(options, flag):
+            command.append("--" + flag.replace("_", "-"))
+    return command
+
+
+def print_results(rows: list[dict]) -> None:
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Benchmark")
+    columns = ("flow", "workers", "run", "classes", "classes/s", "p50 s", "p99 s", "llm calls", "retries", "stub errors", "peak heap MB", "peak RSS MB")
+    keys = ("flow", "max_workers", "run", "classes", "classes_per_s", "p50_s", "p99_s", "llm_calls", "retries", "stub_errors", "peak_heap_mb", "peak_rss_mb")
+    for column in columns:
+        table.add_column(column, justify="left" if column == "flow" else "right")
+    for row in rows:
+        table.add_row(*(str(row.get(key, "")) for key in keys))
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_pipeline_options(p):
+        p.add_argument("--fused", action="store_true", help="gate and classify each class in a single LLM call")
+        p.add_argument("--dedup", action="store_true", help="classify one representative per cluster of near-duplicate test classes")
+        p.add_argument("--cascade", action="store_true", help="ask a cheaper model first and escalate uncertain answers")
+        p.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+        p.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks")
+        p.add_argument("--project", help="benchmark a real checkout (runs CLDK) instead of the fixture")
+        p.add_argument("--fixture-name", default="fixture")
+        p.add_argument("--trace-heap", action="store_true", help="also report the peak Python heap (tracemalloc; slows the run down)")
+
+    run = commands.add_parser("run", help="start the stub server and run the benchmark matrix")
+    run.add_argument("--flows", nargs="+", choices=["stats", "analysis"], default=["stats", "analysis"])
+    run.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="max LLM requests in flight, one case per value")
+    run.add_argument("--copies", type=int, default=10, help="variants of each example class in the fixture project")
+    run.add_argument("--examples", default=str(EXAMPLES_DIR))
+    run.add_argument("--repeat", type=int, default=1, help="runs per case")
+    run.add_argument("--cache", action="store_true", help="share one fresh LLM cache across the runs of a case (run 1 cold, later runs warm)")
+    run.add_argument("--latency", type=float, default=0.5, help="stub response time in seconds")
+    run.add_argument("--jitter", type=float, default=0.1, help="uniform +/- jitter on the stub response time")
+    run.add_argument("--error-rate", type=float, default=0.0, help="share of stub requests answered with --error-status")
+    run.add_argument("--error-status", type=int, default=429)
+    run.add_argument("--responses", help="JSON file {schema name: {field: value}} of canned answer fields")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", help="write the results as JSON")
+    add_pipeline_options(run)
+
+    case = commands.add_parser("case", help="one benchmark run (started by `run`)")
+    case.add_argument("--flow", choices=["stats", "analysis"], required=True)
+    case.add_argument("--max-workers", type=int, default=1)
+    case.add_argument("--base-url", required=True)
+    case.add_argument("--fixture", required=True)
+    add_pipeline_options(case)
+
+    args = parser.parse_args()
+
+    if args.command == "case":
+        print(json.dumps(run_case(args)))
+        sys.exit(0)
+
+    responses = None
+    if args.responses:
+        with open(args.responses, "r") as f:
+            responses = json.load(f)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as work_dir:
+        fixture = build_fixture(Path(work_dir) / "cldk", args.fixture_name, args.copies, Path(args.examples))
+        with StubLLMServer(args.latency, args.jitter, args.error_rate, args.error_status, responses=responses, seed=args.seed) as server:
+            for flow in args.flows:
+                for max_workers in args.workers:
+                    env = {**os.environ, "OPENROUTER_API_KEY": "benchmark", "LLM_CACHE": "on" if args.cache else "off",
+                           "LLM_CACHE_PATH": str(Path(work_dir) / f"llm_cache-{flow}-{max_workers}.sqlite")}
+                    for repeat in range(args.repeat):
+                        server.reset_counters()
+                        completed = subprocess.run(case_command(flow, max_workers, server.url, fixture, args), env=env,
+                                                   stdout=subprocess.PIPE, text=True)
+                        if completed.returncode != 0:
+                            print(f"{flow} with {max_workers} workers failed (exit {completed.returncode})", file=sys.stderr)
+                            continue
+                        # the result is the last line of the case's output
+                        result = json.loads(completed.stdout.strip().splitlines()[-1])
+                        rows.append({"flow": flow, "max_workers": max_workers, "run": repeat + 1, **result,
+                                     "stub_requests": server.requests, "stub_errors": server.errors})
+
+    print_results(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"argv": sys.argv, "results": rows}, f, indent=4)
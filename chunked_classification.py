@@ -0,0 +1,246 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional, TypeVar
+
+import tree_sitter_java
+from tree_sitter import Language, Parser
+
+from llm_dispatch import imap_ordered
+
+R = TypeVar("R")
+
+# Map-reduce mode for test classes too large for one call (e.g. generated EvoMaster suites).
+# A class over the token budget is split into chunks that each hold the whole class minus some of its
+# @Test methods: package, imports, class annotations, fields, fixtures and helpers are in every chunk,
+# the @Test methods are packed greedily into groups. The chunks are classified in parallel and the
+# per-chunk answers are merged by the schema's merge function (merge_classifications, merge_ratings, merge_analyses).
+# Every classifier goes through the module-level `chunker`, which is off until a token budget is set.
+
+JAVA_LANGUAGE = Language(tree_sitter_java.language())
+TEST_ANNOTATIONS = {"Test", "ParameterizedTest", "RepeatedTest", "TestFactory", "TestTemplate"}
+# JUnit 4/5 and TestNG setup and teardown, and the JUnit 3 methods by name
+FIXTURE_ANNOTATIONS = {
+    "Before", "After", "BeforeEach", "AfterEach", "BeforeAll", "AfterAll", "BeforeClass", "AfterClass",
+    "BeforeMethod", "AfterMethod", "BeforeSuite", "AfterSuite", "BeforeTest", "AfterTest",
+}
+JUNIT3_FIXTURES = {"setUp", "tearDown"}
+COMMENT_NODES = {"line_comment", "block_comment"}
+DEFAULT_TOKEN_MODEL = "gpt-4o"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model.rsplit("/", 1)[-1])
+    except Exception:
+        # unknown model name, or the BPE file cannot be downloaded
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        # offline without a cached tokenizer: roughly four characters per token
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _text(node) -> str:
+    return node.text.decode("utf-8", errors="replace")
+
+
+def _is_test_method(node, junit3: bool) -> bool:
+    if node.type != "method_declaration":
+        return False
+    for child in node.children:
+        if child.type == "modifiers":
+            for modifier in child.named_children:
+                if modifier.type in ("annotation", "marker_annotation"):
+                    name = modifier.child_by_field_name("name")
+                    if name is not None and _text(name).rsplit(".", 1)[-1] in TEST_ANNOTATIONS:
+                        return True
+    name = node.child_by_field_name("name")
+    return junit3 and name is not None and _text(name).startswith("test")
+
+
+def _test_method_spans(source: bytes):
+    # (class body node, [(start, end) byte span of each @Test method, leading comments included])
+    tree = Parser(JAVA_LANGUAGE).parse(source)
+    class_node = next((node for node in tree.root_node.named_children if node.type == "class_declaration"), None)
+    if class_node is None:
+        return None, []
+    body = class_node.child_by_field_name("body")
+    superclass = class_node.child_by_field_name("superclass")
+    junit3 = superclass is not None and _text(superclass).endswith("TestCase")
+
+    spans = []
+    members = body.named_children
+    for i, member in enumerate(members):
+        if not _is_test_method(member, junit3):
+            continue
+        # the span starts right after the previous non-comment sibling, so javadoc and blank lines go with the method
+        j = i - 1
+        while j >= 0 and members[j].type in COMMENT_NODES:
+            j -= 1
+        start = members[j].end_byte if j >= 0 else body.start_byte + 1
+        spans.append((start, member.end_byte))
+    return body, spans
+
+
+def _without(source: bytes, spans: list[tuple[int, int]]) -> bytes:
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(source[position:start])
+        position = end
+    parts.append(source[position:])
+    return b"".join(parts)
+
+
+def split_class(source: str, token_budget: int, model: str = DEFAULT_TOKEN_MODEL) -> list[str]:
+    """Splits a test class into chunks of about `token_budget` tokens.
+
+    Every chunk keeps the class minus the other chunks' @Test methods and holds at least one @Test method,
+    so a large header or a single large method can exceed the budget. A class that fits, or has fewer than
+    two @Test methods to split on, is returned whole as a single chunk.
+    """
+    if count_tokens(source, model) <= token_budget:
+        return [source]
+
+    data = source.encode("utf-8")
+    body, spans = _test_method_spans(data)
+    if len(spans) < 2:
+        return [source]
+
+    header_tokens = count_tokens(_without(data, spans).decode("utf-8", errors="replace"), model)
+    groups: list[list[int]] = []
+    used = token_budget
+    for i, (start, end) in enumerate(spans):
+        method_tokens = count_tokens(data[start:end].decode("utf-8", errors="replace"), model)
+        if groups and used + method_tokens <= token_budget:
+            groups[-1].append(i)
+            used += method_tokens
+        else:
+            groups.append([i])
+            used = header_tokens + method_tokens
+
+    chunks = []
+    for n, group in enumerate(groups, start=1):
+        kept = set(group)
+        chunk = _without(data, [span for i, span in enumerate(spans) if i not in kept])
+        # tell the model that the class was cut, right after the opening brace of the class body
+        note = f"\n    // Part {n} of {len(groups)}: {len(group)} of the {len(spans)} test methods of this class are shown, the others are omitted."
+        insert_at = body.start_byte + 1
+        chunks.append((chunk[:insert_at] + note.encode("utf-8") + chunk[insert_at:]).decode("utf-8", errors="replace"))
+    return chunks
+
+
+@dataclass
+class ChunkedRun:
+    chunks: int
+    tokens: int
+    latency_s: float
+
+
+class ChunkedClassifier:
+    """Runs a classifier once per chunk of an oversized class and merges the answers.
+
+    With `token_budget` None (the default) every class goes to the classifier whole.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, model: str = DEFAULT_TOKEN_MODEL):
+        self.token_budget = token_budget
+        self.model = model
+        self.calls = 0
+        self.chunked_calls = 0
+        self.chunks = 0
+        self._lock = threading.Lock()
+
+    def split(self, source: str) -> list[str]:
+        if self.token_budget is None:
+            return [source]
+        return split_class(source, self.token_budget, self.model)
+
+    def run(self, classify: Callable[[str], R], merge: Callable[[list[R]], R], source: str) -> R:
+        chunks = self.split(source)
+        with self._lock:
+            self.calls += 1
+            self.chunks += len(chunks)
+            if len(chunks) > 1:
+                self.chunked_calls += 1
+        if len(chunks) == 1:
+            return classify(source)
+        # the chunks share the global LLM limiter with every other class in flight
+        return merge(list(imap_ordered(classify, chunks, len(chunks))))
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "calls": self.calls,
+            "chunked_calls": self.chunked_calls,
+            "chunks": self.chunks,
+        }
+
+
+chunker = ChunkedClassifier()
+
+
+def measure(classify: Callable[[str], R], merge: Callable[[list[R]], R], source: str, system_rules: str, token_budget: Optional[int], model: str = DEFAULT_TOKEN_MODEL) -> tuple[R, ChunkedRun]:
+    # prompt tokens sent (system rules + code of every call) and wall time of one class
+    from llm_chains import HUMAN_TEMPLATE
+
+    classifier = ChunkedClassifier(token_budget, model)
+    chunks = classifier.split(source)
+    tokens = sum(count_tokens(system_rules, model) + count_tokens(HUMAN_TEMPLATE.format(code=chunk), model) for chunk in chunks)
+    start = time.perf_counter()
+    result = classifier.run(classify, merge, source)
+    return result, ChunkedRun(len(chunks), tokens, round(time.perf_counter() - start, 3))
+
+
+if __name__ == "__main__":
+    # One-shot versus chunked on the given files: chunks, prompt tokens, latency and the two answers.
+    # The LLM result cache is off so the latencies are real; --dry-run only prints the split.
+    import argparse
+    import json
+    import os
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("java_files", nargs="+")
+    parser.add_argument("--token-budget", type=int, default=2000)
+    parser.add_argument("--mode", choices=["rating", "analysis"], default="rating")
+    parser.add_argument("--dry-run", action="store_true", help="print the chunks and token counts without calling the model")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for file_path in args.java_files:
+            with open(file_path, "r") as file:
+                source = file.read()
+            chunks = split_class(source, args.token_budget)
+            print(f"{file_path}: {count_tokens(source)} tokens, {len(chunks)} chunk(s) of {[count_tokens(c) for c in chunks]} tokens")
+        sys.exit(0)
+
+    os.environ["LLM_CACHE"] = "off"
+    if args.mode == "rating":
+        from pattern_rating import SYSTEM_RULES, merge_ratings as merge, rate_integration_test_pattern as classify
+    else:
+        from pattern_analysis import SYSTEM_RULES, merge_analyses as merge, classify_integration_test_pattern as classify
+
+    report = {}
+    for file_path in args.java_files:
+        with open(file_path, "r") as file:
+            source = file.read()
+        one_shot, one_shot_run = measure(classify, merge, source, SYSTEM_RULES, None)
+        chunked, chunked_run = measure(classify, merge, source, SYSTEM_RULES, args.token_budget)
+        report[file_path] = {
+            "one_shot": {**one_shot_run.__dict__, "result": one_shot.model_dump(mode="json")},
+            "chunked": {**chunked_run.__dict__, "result": chunked.model_dump(mode="json")},
+        }
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,313 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+# A long-running classifier: one process keeps the HTTP client, the LLM cache, the static filter and the loaded
+# CLDK analyses warm, and serves requests over local HTTP (or a Unix socket with --socket):
+#   POST /classify  {"path": "Foo.java"} or {"source": "...", "name": "Foo"}  -> {"test_class", <stage>: entry}
+#   POST /project   {"path": checkout, "repo", "commit"} (repo and commit default to the folder name and HEAD;
+#                   a cached analysis needs no path) -> one NDJSON line per test class as soon as it is classified,
+#                   then {"done": true, "classes": n}
+#   GET  /stats     cache, dispatch and pipeline statistics
+# "stages" picks the entries (stats, analysis; both by default), as in unified_pipeline.py. The /project lines are
+# those of ndjson_output.py, so `ndjson_output.py to-json` turns a saved stream into stats/ and analysis/ files.
+# Only the server imports the pipeline; the client subcommands need nothing but the standard library.
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_PROJECTS = 8
+# near-duplicate representatives kept by the long-running process
+MAX_REPRESENTATIVES = 50_000
+
+
+class Daemon:
+    def __init__(self, max_workers: int = 1, fused: bool = False, max_projects: int = DEFAULT_MAX_PROJECTS):
+        from unified_pipeline import STAGES
+
+        self.stages = STAGES
+        self.max_workers = max_workers
+        self.fused = fused
+        self.max_projects = max_projects
+        # loaded analyses, least recently used first
+        self.projects: OrderedDict[tuple[str, str], object] = OrderedDict()
+        self._loading: dict[tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def pipeline(self, stage_names: Optional[list[str]]):
+        from classification_pipeline import ClassificationPipeline
+
+        unknown = set(stage_names or ()) - set(self.stages)
+        if unknown:
+            raise ValueError(f"unknown stages: {sorted(unknown)}")
+        return ClassificationPipeline([self.stages[name]() for name in stage_names or self.stages], self.fused)
+
+    def project(self, path: Optional[str], repo: Optional[str], commit: Optional[str]):
+        from analysis_cache import clean_head, load_project
+
+        repo = repo or (Path(path).resolve().name if path else None)
+        commit = commit or (clean_head(path) if path else None)
+        if repo is None or (commit is None and path is None):
+            raise ValueError("a project needs a path, or a repo and commit with a cached analysis")
+        if commit is None:
+            # uncommitted changes: analysed for this request only, neither cached nor kept
+            return load_project(path, repo)
+        key = (repo, commit)
+        with self._lock:
+            if key in self.projects:
+                self.projects.move_to_end(key)
+                return self.projects[key]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # a CLDK analysis is too heavy to run twice at once for the same project; other projects load meanwhile
+        with key_lock:
+            try:
+                with self._lock:
+                    project = self.projects.get(key)
+                if project is None:
+                    project = load_project(path, repo, commit)
+                    with self._lock:
+                        self.projects[key] = project
+                        while len(self.projects) > self.max_projects:
+                            self.projects.popitem(last=False)
+                return project
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def classify(self, request: dict) -> dict:
+        if "source" in request:
+            name, source = request.get("name", "Test"), request["source"]
+        else:
+            file_path = Path(request["path"])
+            name, source = request.get("name", file_path.stem), file_path.read_text()
+        return {"test_class": name, **self.pipeline(request.get("stages")).classify(name, source)}
+
+    def classify_project(self, request: dict):
+        from telemetry import telemetry
+
+        project = self.project(request.get("path"), request.get("repo"), request.get("commit"))
+        pipeline = self.pipeline(request.get("stages"))
+        with telemetry.scope(repo=project.name):
+            for test_class_name, records in pipeline.run(project.iter_sources(), project, self.max_workers):
+                yield {"repo": project.name, "test_class": test_class_name, **records}
+
+    def stats(self) -> dict:
+        import llm_dispatch
+        from chunked_classification import chunker
+        from llm_cache import default_cache
+        from llm_chains import registry
+        from model_cascade import cascade
+        from near_duplicates import dedup
+        from prompt_slicing import slicer
+        from static_filter import prefilter
+        from telemetry import telemetry
+
+        cache = default_cache()
+        with self._lock:
+            projects = [f"{repo}@{commit}" for repo, commit in self.projects]
+        return {
+            "projects": projects,
+            "llm_cache": cache.stats() if cache is not None else None,
+            "llm_dispatch": llm_dispatch.limiter().stats(),
+            "llm_latency": registry.latency_stats(),
+            "static_prefilter": prefilter.stats(),
+            "chunked_classification": chunker.stats(),
+            "prompt_slicing": slicer.stats(),
+            "model_cascade": cascade.stats(),
+            "near_duplicates": dedup.stats(),
+            "telemetry": telemetry.summary(),
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    daemon: Daemon
+
+    def log_message(self, format, *args):
+        # client_address is empty on a Unix socket, so the default format cannot be used
+        print(f"{self.command} {self.path} {format % args}", file=sys.stderr)
+
+    def _send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _request(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.daemon.stats())
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            request = self._request()
+            if self.path == "/classify":
+                self._send_json(200, self.daemon.classify(request))
+                return
+            if self.path != "/project":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            lines = self.daemon.classify_project(request)
+            first = next(lines, None)
+        except (OSError, KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            # a model or analysis failure must not drop the connection without an answer
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        # HTTP/1.0 without Content-Length: the body ends when the connection closes, so lines can be flushed one by one
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        count = 0
+        try:
+            for line in itertools.chain([first] if first is not None else [], lines):
+                self._write_line(line)
+                count += 1
+            self._write_line({"done": True, "classes": count})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self._write_line({"error": str(e), "classes": count})
+
+    def _write_line(self, body: dict) -> None:
+        self.wfile.write(json.dumps(body).encode() + b"\n")
+        self.wfile.flush()
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # only the owner may connect: the socket is created 0600 rather than chmod-ed after bind
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+
+def serve(daemon: Daemon, port: int = DEFAULT_PORT, socket_path: Optional[str] = None) -> None:
+    handler = type("DaemonHandler", (Handler,), {"daemon": daemon})
+    if socket_path:
+        Path(socket_path).unlink(missing_ok=True)
+        server = UnixHTTPServer(socket_path, handler)
+        print(f"Listening on {socket_path}", file=sys.stderr)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        print(f"Listening on http://127.0.0.1:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path:
+            Path(socket_path).unlink(missing_ok=True)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method: str, path: str, body: Optional[dict] = None, port: int = DEFAULT_PORT, socket_path: Optional[str] = None):
+    """Sends a request to a running daemon and returns the open response."""
+    connection = UnixHTTPConnection(socket_path) if socket_path else http.client.HTTPConnection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else None
+    connection.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+    return connection.getresponse()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="listen on / connect to this Unix socket instead of the port")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    serve_parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    serve_parser.add_argument("--fused", action="store_true", help="gate and classify each class in a single LLM call (one stage per request)")
+    serve_parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompts instead of the full source")
+    serve_parser.add_argument("--cascade", action="store_true", help="ask a cheaper model first for the analysis and escalate uncertain answers")
+    serve_parser.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks classified separately")
+    serve_parser.add_argument("--dedup", action="store_true", help="answer near-duplicates of a class classified earlier with a copy of its answers")
+    serve_parser.add_argument("--dedup-threshold", type=float, help="minimum estimated Jaccard similarity of a near-duplicate (default: near_duplicates.DEFAULT_THRESHOLD)")
+    serve_parser.add_argument("--max-projects", type=int, default=DEFAULT_MAX_PROJECTS, help="loaded project analyses kept in memory, least recently used dropped first")
+
+    classify_parser = subparsers.add_parser("classify", help="classify Java files")
+    classify_parser.add_argument("files", nargs="+")
+    classify_parser.add_argument("--stages", nargs="+")
+
+    project_parser = subparsers.add_parser("project", help="classify every test class of a project, printed as NDJSON")
+    project_parser.add_argument("project_path", nargs="?")
+    project_parser.add_argument("--repo-name", help="analysis cache key (default: project folder name)")
+    project_parser.add_argument("--commit", help="analysis cache key (default: git HEAD of the project)")
+    project_parser.add_argument("--stages", nargs="+")
+
+    subparsers.add_parser("stats", help="print the daemon's statistics")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        import llm_dispatch
+        from chunked_classification import chunker
+        from model_cascade import cascade
+        from near_duplicates import dedup
+        from prompt_slicing import slicer
+        from static_filter import prefilter
+
+        llm_dispatch.configure(args.max_workers)
+        prefilter.enabled = not args.no_prefilter
+        chunker.token_budget = args.token_budget
+        slicer.enabled = args.slice
+        cascade.enabled = args.cascade
+        dedup.enabled = args.dedup
+        if args.dedup_threshold is not None:
+            dedup.threshold = args.dedup_threshold
+        dedup.max_representatives = MAX_REPRESENTATIVES
+        serve(Daemon(args.max_workers, args.fused, args.max_projects), args.port, args.socket)
+        sys.exit(0)
+
+    if args.command == "classify":
+        responses = (request("POST", "/classify", {"path": str(Path(f).resolve()), "stages": args.stages}, args.port, args.socket) for f in args.files)
+    elif args.command == "project":
+        body = {"path": str(Path(args.project_path).resolve()) if args.project_path else None, "repo": args.repo_name, "commit": args.commit, "stages": args.stages}
+        responses = [request("POST", "/project", body, args.port, args.socket)]
+    else:
+        responses = [request("GET", "/stats", None, args.port, args.socket)]
+
+    failed = False
+    for response in responses:
+        # /project answers line by line; print each as it arrives
+        line = b"\n"
+        for line in response:
+            sys.stdout.write(line.decode())
+            sys.stdout.flush()
+        if not line.endswith(b"\n"):
+            print()
+        failed = failed or response.status != 200
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,67 @@
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, Iterator, Optional
+
+from llm_dispatch import imap_ordered
+from near_duplicates import dedup
+from prompt_slicing import slicer
+from static_filter import prefilter
+from telemetry import telemetry
+
+# One pass over the test classes of a project with pluggable classifier stages. Each class is read once and
+# gated once (static pre-filter, then the LLM gate when undecided); every stage then classifies the same
+# integration tests from the same prompt payload (full source or structural slice). Near-duplicate
+# propagation and telemetry cover the whole pass, so a duplicate class costs no call in any stage.
+# pattern_statistics.RatingStage and pattern_analysis.AnalysisStage are the two stages; unified_pipeline.py
+# runs both and writes stats/<repo>.json and analysis/<repo>.json from the same pass.
+
+
+class ClassifierStage(ABC):
+    """One classifier of the pass. `record` turns its answer (None for non-integration tests) into a report entry."""
+
+    name: str
+
+    @abstractmethod
+    def classify(self, payload: str, code_body: str) -> Any:
+        ...
+
+    @abstractmethod
+    def classify_fused(self, code_body: str) -> Any:
+        # gate and classify in a single call; None for a non-integration test
+        ...
+
+    @abstractmethod
+    def record(self, test_class_name: str, answer: Any, provenance: Optional[dict]) -> Any:
+        ...
+
+
+class ClassificationPipeline:
+    def __init__(self, stages: list[ClassifierStage], fused: bool = False):
+        if fused and len(stages) != 1:
+            # a fused call answers the gate and one classifier, so it cannot be shared between stages
+            raise ValueError("fused classification runs exactly one stage")
+        self.stages = stages
+        self.fused = fused
+
+    def _answers(self, test_class_name: str, code_body: str, project) -> dict[str, Any]:
+        if self.fused:
+            return {stage.name: stage.classify_fused(code_body) for stage in self.stages}
+
+        if not prefilter.is_integration_test(code_body).is_integration_test:
+            return {stage.name: None for stage in self.stages}
+
+        # the gate reads the full source; the classifiers can work from the structural slice
+        payload = slicer.payload(project, test_class_name, code_body)
+        return {stage.name: stage.classify(payload, code_body) for stage in self.stages}
+
+    def classify(self, test_class_name: str, code_body: str, project=None) -> dict[str, Any]:
+        """{stage name: report entry} for one test class."""
+        # a near-duplicate of a class already classified in this run gets a copy of its answers
+        key = f"{project.name}:{test_class_name}" if project is not None and project.name else test_class_name
+        repo = {"repo": project.name} if project is not None and project.name else {}
+        with telemetry.scope(**repo, test_class=test_class_name), telemetry.stage("classify"):
+            answers, provenance = dedup.classify(key, code_body, lambda: self._answers(test_class_name, code_body, project))
+        return {stage.name: stage.record(test_class_name, answers[stage.name], provenance) for stage in self.stages}
+
+    def run(self, test_sources: Iterable[tuple[str, str]], project=None, max_workers: int = 1) -> Iterator[tuple[str, dict[str, Any]]]:
+        # (test class, {stage name: report entry}) in the order of test_sources for any max_workers
+        return imap_ordered(lambda item: (item[0], self.classify(item[0], item[1], project)), test_sources, max_workers)
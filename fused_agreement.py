@@ -0,0 +1,88 @@
+import argparse
+import json
+import random
+from pathlib import Path
+
+import llm_dispatch
+from analysis_cache import clean_head, load_project
+from is_integration_test import is_integration_test
+from llm_dispatch import imap_ordered
+from pattern_analysis import classify_integration_test_pattern, classify_gated_integration_test_pattern
+from pattern_rating import IntergrationPatternRating, rate_integration_test_pattern, rate_gated_integration_test_pattern
+from pattern_statistics import pattern_from_rating
+
+# Compares the fused single-call mode with the two-call path on a sample of test classes.
+# The static pre-filter is bypassed on purpose: this measures agreement between the models' answers.
+
+
+def compare_rating(code_body: str) -> dict:
+    two_call_gate = is_integration_test(code_body).is_integration_test
+    fused = rate_gated_integration_test_pattern(code_body)
+    row = {"gate_agrees": two_call_gate == fused.is_integration_test}
+    if two_call_gate and fused.is_integration_test:
+        two_call = rate_integration_test_pattern(code_body)
+        fused_rating = fused.rating()
+        row["fields_agree"] = {name: getattr(two_call, name) == getattr(fused_rating, name) for name in IntergrationPatternRating.model_fields}
+        row["pattern_agrees"] = pattern_from_rating(two_call) == pattern_from_rating(fused_rating)
+    return row
+
+
+def compare_analysis(code_body: str) -> dict:
+    two_call_gate = is_integration_test(code_body).is_integration_test
+    fused = classify_gated_integration_test_pattern(code_body)
+    row = {"gate_agrees": two_call_gate == fused.is_integration_test}
+    if two_call_gate and fused.is_integration_test:
+        two_call = classify_integration_test_pattern(code_body)
+        fused_analysis = fused.analysis()
+        row["fields_agree"] = {
+            name: getattr(two_call, name) == getattr(fused_analysis, name)
+            for name in ("is_self_contained", "fit_assessment", "pattern_name", "confidence_score")
+        }
+        row["pattern_agrees"] = two_call.pattern_name == fused_analysis.pattern_name
+    return row
+
+
+def summarize(rows: list[dict]) -> dict:
+    compared = [row for row in rows if "pattern_agrees" in row]
+    summary = {
+        "sampled": len(rows),
+        "gate_agreement": sum(row["gate_agrees"] for row in rows) / len(rows) if rows else None,
+        "compared_integration_tests": len(compared),
+        "pattern_agreement": sum(row["pattern_agrees"] for row in compared) / len(compared) if compared else None,
+        "field_agreement": {},
+    }
+    for row in compared:
+        for name, agrees in row["fields_agree"].items():
+            summary["field_agreement"].setdefault(name, 0)
+            summary["field_agreement"][name] += agrees
+    for name in summary["field_agreement"]:
+        summary["field_agreement"][name] /= len(compared)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("project_path")
+    parser.add_argument("--mode", choices=["rating", "analysis"], default="rating")
+    parser.add_argument("--sample", type=int, default=20, help="number of test classes to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+
+    project = load_project(args.project_path, Path(args.project_path).resolve().name, clean_head(args.project_path))
+
+    test_class_names = sorted(project.test_class_names())
+    random.Random(args.seed).shuffle(test_class_names)
+    sample = test_class_names[:args.sample]
+
+    compare = compare_rating if args.mode == "rating" else compare_analysis
+
+    def run(test_class_name: str) -> dict:
+        code_body = project.read_source(test_class_name)
+        return {"test_class": test_class_name, **compare(code_body)}
+
+    rows = list(imap_ordered(run, sample, args.max_workers))
+
+    print(json.dumps({"summary": summarize(rows), "classes": rows}, indent=4))
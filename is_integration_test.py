@@ -1,8 +1,8 @@
 import sys
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
-import os
+
+from chunked_classification import chunker
+from llm_chains import structured_classification
 
 
 
@@ -16,27 +16,12 @@ class TestClassification(BaseModel):
         description="A concise explanation citing specific annotations or logic found in the code."
     )
 
-def is_integration_test(file_content: str) -> TestClassification:
-    # api_key = os.getenv("OPENAI_API_KEY") 
-    api_key = os.getenv("OPENROUTER_API_KEY") 
-
-    # if the environment variable is not set, raise an error
-    if not api_key:
-        raise ValueError("API_KEY environment variable is not set.")
-    
-    # 2. Setup the Model
-    # We use 'with_structured_output' to bind the Pydantic model to the LLM
-    llm = ChatOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        model="gpt-4o",
-        temperature=0.1,
-        api_key=api_key
-    ).with_structured_output(TestClassification)
-
-
-    # 3. Create the Prompt Template
-    # We use a template to separate instructions from the dynamic input
-    system_rules = """
+# Bump PROMPT_VERSION whenever the prompt semantics change so cached answers are not reused
+MODEL_NAME = "gpt-4o"
+TEMPERATURE = 0.1
+PROMPT_VERSION = "1"
+
+SYSTEM_RULES = """
 Role: You are an expert Java Test Architect.
 
 Task: Analyze the provided Java test class and determine if it is a REST API Integration Test.
@@ -59,19 +44,21 @@ Analysis Steps:
 3. Check Annotations: Look for @SpringBootTest(webEnvironment = ...), @WebMvcTest, @AutoConfigureMockMvc.
 4. Check Method Body: Do the tests perform actions like .perform(get(...)), .getForEntity(...), or given().when().get(...)?s
 """
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_rules),
-        ("human", "Analyze this Java code:\n\n{code}")
-    ])
-
-    # 4. Create the Chain and Invoke
-    # Chain: Prompt -> LLM -> Pydantic Object
-    chain = prompt | llm
-    
-    result = chain.invoke({"code": file_content})
-    
-    return result
+
+def merge_classifications(classifications: list[TestClassification]) -> TestClassification:
+    # a class is an integration test as soon as one of its chunks is
+    positive = [c for c in classifications if c.is_integration_test]
+    return TestClassification(
+        is_integration_test=bool(positive),
+        reasoning=(positive or classifications)[0].reasoning,
+    )
+
+def is_integration_test(file_content: str) -> TestClassification:
+    # Answers for an unchanged source, prompt, model and temperature come from the on-disk cache
+    return chunker.run(
+        lambda code: structured_classification(TestClassification, SYSTEM_RULES, PROMPT_VERSION, MODEL_NAME, TEMPERATURE, code),
+        merge_classifications, file_content
+    )
 
 # --- Usage Example ---
 if __name__ == "__main__":
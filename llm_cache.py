@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+DEFAULT_CACHE_PATH = Path("./.cache/llm_cache.sqlite")
+
+
+def cache_key(source: str, schema: Type[BaseModel], prompt: str, prompt_version: str, model: str, temperature: float) -> str:
+    # The key covers everything that can change the answer: the Java source,
+    # the prompt text and its explicit version, the output schema, the model and the temperature.
+    h = hashlib.sha256()
+    for part in (
+        source,
+        prompt,
+        prompt_version,
+        json.dumps(schema.model_json_schema(), sort_keys=True),
+        model,
+        repr(float(temperature)),
+    ):
+        h.update(hashlib.sha256(part.encode("utf-8")).digest())
+    return h.hexdigest()
+
+
+class LLMCache:
+    """On-disk cache of structured LLM results, keyed by `cache_key`."""
+
+    def __init__(self, path: Path | str = DEFAULT_CACHE_PATH, max_entries: Optional[int] = None, max_age_seconds: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        # One connection shared by every thread; sqlite3 serialises access but the counters need the lock too
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                schema TEXT NOT NULL,
+                model TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str, schema: Type[T]) -> Optional[T]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return schema.model_validate_json(row[0])
+
+    def put(self, key: str, value: BaseModel, model: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, schema, model, payload, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, type(value).__name__, model, value.model_dump_json(), now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def get_or_compute(self, key: str, schema: Type[T], model: str, compute: Callable[[], T]) -> T:
+        cached = self.get(key, schema)
+        if cached is not None:
+            return cached
+        value = compute()
+        self.put(key, value, model)
+        return value
+
+    def evict(self) -> int:
+        # Drop expired entries first, then the least recently used ones above the size limit
+        removed = 0
+        with self._lock:
+            if self.max_age_seconds is not None:
+                cur = self._conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+                removed += cur.rowcount
+            if self.max_entries is not None:
+                cur = self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                removed += cur.rowcount
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+
+_default_cache: Optional[LLMCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> Optional[LLMCache]:
+    # Configured through the environment so the classifiers keep their one-argument signature:
+    #   LLM_CACHE=off                 disable caching
+    #   LLM_CACHE_PATH=...            sqlite file (default ./.cache/llm_cache.sqlite)
+    #   LLM_CACHE_MAX_ENTRIES=...     LRU size limit
+    #   LLM_CACHE_MAX_AGE_DAYS=...    age limit
+    global _default_cache
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_entries = os.getenv("LLM_CACHE_MAX_ENTRIES")
+            max_age_days = os.getenv("LLM_CACHE_MAX_AGE_DAYS")
+            _default_cache = LLMCache(
+                os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH)),
+                max_entries=int(max_entries) if max_entries else None,
+                max_age_seconds=float(max_age_days) * 86400 if max_age_days else None,
+            )
+        return _default_cache
+
+
+def cached_invoke(schema: Type[T], prompt: str, prompt_version: str, model: str, temperature: float, source: str, invoke: Callable[[], T], cache: Optional[LLMCache] = None) -> T:
+    cache = cache if cache is not None else default_cache()
+    if cache is None:
+        return invoke()
+    key = cache_key(source, schema, prompt, prompt_version, model, temperature)
+    return cache.get_or_compute(key, schema, model, invoke)
+
+
+if __name__ == "__main__":
+    import sys
+
+    cache = LLMCache(os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH)))
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+
+    if command == "clear":
+        cache.clear()
+    elif command == "evict":
+        cache.max_entries = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        cache.max_age_seconds = float(sys.argv[3]) * 86400 if len(sys.argv) > 3 else None
+        print(f"Evicted {cache.evict()} entries")
+    print(json.dumps({"path": str(cache.path), "entries": len(cache)}, indent=4))
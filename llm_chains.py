@@ -0,0 +1,235 @@
+import os
+import statistics
+from collections import deque
+import threading
+import time
+from typing import TYPE_CHECKING, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from llm_cache import cached_invoke
+from llm_dispatch import llm_call
+from telemetry import telemetry
+
+if TYPE_CHECKING:
+    import httpx
+
+T = TypeVar("T", bound=BaseModel)
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+HUMAN_TEMPLATE = "Analyze this Java code:\n\n{code}"
+# latency percentiles are over the most recent calls, so a long-running process does not grow without bound
+LATENCY_WINDOW = 10_000
+
+
+def _strict(node: dict, root: dict) -> dict:
+    # the rules of OpenAI structured outputs: every object is closed and lists all its properties as
+    # required, None defaults are dropped and a $ref with sibling keys is inlined
+    for definition in node.get("$defs", {}).values():
+        _strict(definition, root)
+    if node.get("type") == "object":
+        node.setdefault("additionalProperties", False)
+    if isinstance(node.get("properties"), dict):
+        node["required"] = list(node["properties"])
+        node["properties"] = {key: _strict(value, root) for key, value in node["properties"].items()}
+    if isinstance(node.get("items"), dict):
+        node["items"] = _strict(node["items"], root)
+    if isinstance(node.get("anyOf"), list):
+        node["anyOf"] = [_strict(variant, root) for variant in node["anyOf"]]
+    if isinstance(node.get("allOf"), list):
+        if len(node["allOf"]) == 1:
+            node.update(_strict(node.pop("allOf")[0], root))
+        else:
+            node["allOf"] = [_strict(entry, root) for entry in node["allOf"]]
+    if "default" in node and node["default"] is None:
+        del node["default"]
+    if "$ref" in node and len(node) > 1:
+        resolved = root
+        for key in node["$ref"].removeprefix("#/").split("/"):
+            resolved = resolved[key]
+        # the keys next to the $ref win over the referenced schema's
+        node.update({**resolved, **node})
+        del node["$ref"]
+        return _strict(node, root)
+    return node
+
+
+def response_format(schema: Type[BaseModel]) -> dict:
+    # the strict json_schema response format the OpenAI client builds for a Pydantic class; the batch
+    # backend sends the same one, so batch answers and synchronous answers share the LLM cache keys
+    json_schema = schema.model_json_schema()
+    return {"type": "json_schema", "json_schema": {"schema": _strict(json_schema, json_schema), "name": schema.__name__, "strict": True}}
+
+
+def new_chain(schema: Type[BaseModel], system_rules: str, model: str, temperature: float, api_key: str, base_url: str, http_client: Optional["httpx.Client"] = None):
+    # LangChain and the OpenAI client take over a second to import, so they are only loaded for the first
+    # model call; a run answered from the result cache never imports them
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import RunnableLambda
+    from langchain_openai import ChatOpenAI
+
+    # The response format is bound as a plain dict and the answer parsed here. Given the Pydantic class,
+    # the OpenAI client returns a completion whose parsed field does not match its declared type, and
+    # ChatOpenAI dumping it emits a Pydantic serializer warning on every call.
+    def parse(message) -> dict:
+        # same output as with_structured_output(schema, include_raw=True): the raw message carries the token usage
+        try:
+            return {"raw": message, "parsed": schema.model_validate_json(message.content), "parsing_error": None}
+        except ValueError as e:
+            return {"raw": message, "parsed": None, "parsing_error": e}
+
+    # Chain: Prompt -> LLM -> Pydantic Object
+    llm = ChatOpenAI(
+        base_url=base_url,
+        model=model,
+        temperature=temperature,
+        api_key=api_key,
+        http_client=http_client,
+        max_retries=0  # retries and backoff are handled by llm_dispatch
+    ).bind(response_format=response_format(schema))
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_rules),
+        ("human", HUMAN_TEMPLATE)
+    ])
+
+    return prompt | llm | RunnableLambda(parse)
+
+
+class ChainRegistry:
+    """Builds each (schema, prompt, model, temperature) chain once and shares one keep-alive HTTP client."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, max_connections: int = 64):
+        self._api_key = api_key
+        self.base_url = base_url or os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL)
+        self.max_connections = max_connections
+        self._chains = {}
+        self._http_client: Optional["httpx.Client"] = None
+        self._lock = threading.Lock()
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+
+    @property
+    def api_key(self) -> str:
+        # api_key = os.getenv("OPENAI_API_KEY")
+        api_key = self._api_key or os.getenv("OPENROUTER_API_KEY")
+
+        # if the environment variable is not set, raise an error
+        if not api_key:
+            raise ValueError("API_KEY environment variable is not set.")
+        return api_key
+
+    @property
+    def http_client(self) -> "httpx.Client":
+        import httpx
+
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                )
+            return self._http_client
+
+    def chain(self, schema: Type[BaseModel], system_rules: str, model: str, temperature: float):
+        key = (schema, system_rules, model, temperature)
+        chain = self._chains.get(key)
+        if chain is None:
+            http_client = self.http_client
+            with self._lock:
+                chain = self._chains.get(key)
+                if chain is None:
+                    chain = new_chain(schema, system_rules, model, temperature, self.api_key, self.base_url, http_client)
+                    self._chains[key] = chain
+        return chain
+
+    def invoke(self, schema: Type[T], system_rules: str, model: str, temperature: float, code: str) -> T:
+        chain = self.chain(schema, system_rules, model, temperature)
+        start = time.perf_counter()
+        try:
+            output = chain.invoke({"code": code})
+        except Exception:
+            telemetry.record_llm(model, time.perf_counter() - start, 0, 0, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.calls += 1
+
+        usage = getattr(output["raw"], "usage_metadata", None) or {}
+        telemetry.record_llm(model, elapsed, usage.get("input_tokens", 0), usage.get("output_tokens", 0), error=output["parsed"] is None)
+        if output["parsing_error"] is not None:
+            raise output["parsing_error"]
+        if output["parsed"] is None:
+            raise ValueError(f"no structured {schema.__name__} in the model response")
+        return output["parsed"]
+
+    def latency_stats(self) -> dict:
+        with self._lock:
+            latencies, calls = list(self.latencies), self.calls
+        return latency_summary(latencies, calls)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            self._chains.clear()
+
+
+def latency_summary(latencies: list[float], calls: Optional[int] = None) -> dict:
+    # `calls` is the total when `latencies` only holds the most recent ones
+    if not latencies:
+        return {"calls": calls or 0}
+    return {
+        "calls": len(latencies) if calls is None else calls,
+        "mean_s": round(statistics.fmean(latencies), 3),
+        "p50_s": round(statistics.median(latencies), 3),
+        "max_s": round(max(latencies), 3),
+    }
+
+
+registry = ChainRegistry()
+
+
+def invoke_structured(schema: Type[T], system_rules: str, model: str, temperature: float, code: str) -> T:
+    return registry.invoke(schema, system_rules, model, temperature, code)
+
+
+def structured_classification(schema: Type[T], system_rules: str, prompt_version: str, model: str, temperature: float, code: str) -> T:
+    # Cache lookup first, then a rate-limited call through the shared chain
+    return cached_invoke(
+        schema, system_rules, prompt_version, model, temperature, code,
+        lambda: llm_call(invoke_structured, schema, system_rules, model, temperature, code)
+    )
+
+
+if __name__ == "__main__":
+    # Per-call latency with a freshly built client and chain (the old behaviour) versus the shared registry.
+    # Calls go straight to the model, the result cache is not used.
+    import argparse
+    import json
+
+    from is_integration_test import MODEL_NAME, SYSTEM_RULES, TEMPERATURE, TestClassification
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("java_file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.java_file, "r") as file:
+        code = file.read()
+
+    fresh = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        new_chain(TestClassification, SYSTEM_RULES, MODEL_NAME, TEMPERATURE, registry.api_key, registry.base_url).invoke({"code": code})
+        fresh.append(time.perf_counter() - start)
+
+    pooled = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        invoke_structured(TestClassification, SYSTEM_RULES, MODEL_NAME, TEMPERATURE, code)
+        pooled.append(time.perf_counter() - start)
+
+    print(json.dumps({"per_call_construction": latency_summary(fresh), "shared_registry": latency_summary(pooled)}, indent=4))
@@ -0,0 +1,164 @@
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from telemetry import telemetry
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+RETRYABLE_STATUS_CODES = {408, 429}
+RETRYABLE_EXCEPTIONS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    # openai.APIStatusError and httpx.HTTPStatusError both expose the status code, just in different places
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code_of(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES or code >= 500
+    return type(exc).__name__ in RETRYABLE_EXCEPTIONS
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for requests in flight against the model API."""
+
+    def __init__(self, max_in_flight: int, min_in_flight: int = 1, decrease_factor: float = 0.5):
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.decrease_factor = decrease_factor
+        self.limit = float(self.max_in_flight)
+        self.in_flight = 0
+        self.throttled = 0
+        self.retries = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                # multiplicative decrease
+                self.throttled += 1
+                self.limit = max(float(self.min_in_flight), self.limit * self.decrease_factor)
+            else:
+                # additive increase: roughly +1 per `limit` successful calls
+                self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def call(self, fn: Callable[..., R], *args, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0) -> R:
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = fn(*args)
+            except Exception as exc:
+                retryable = is_retryable(exc)
+                self.release(throttled=retryable)
+                if not retryable or attempt >= max_retries:
+                    raise
+                delay = retry_after_of(exc) or min(max_delay, base_delay * 2 ** attempt)
+                attempt += 1
+                with self._cond:
+                    self.retries += 1
+                telemetry.record_retry()
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+            self.release()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "max_in_flight": self.max_in_flight,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
+
+
+_limiter = AdaptiveLimiter(max_in_flight=1)
+
+
+def configure(max_in_flight: int) -> AdaptiveLimiter:
+    global _limiter
+    _limiter = AdaptiveLimiter(max_in_flight=max_in_flight)
+    return _limiter
+
+
+def limiter() -> AdaptiveLimiter:
+    return _limiter
+
+
+_call_counter: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("llm_call_counter", default=None)
+_call_counter_lock = threading.Lock()
+
+
+@contextmanager
+def counting_calls() -> Iterator[list]:
+    # counter[0] is the number of model requests made inside the block, including those
+    # made by imap_ordered workers started from it (they run in a copy of the caller's context)
+    counter = [0]
+    token = _call_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _call_counter.reset(token)
+
+
+def llm_call(fn: Callable[..., R], *args) -> R:
+    # Every model request goes through the process-wide limiter so concurrent
+    # callers share one in-flight budget and one backoff state
+    counter = _call_counter.get()
+    if counter is not None:
+        with _call_counter_lock:
+            counter[0] += 1
+    return _limiter.call(fn, *args)
+
+
+def imap_ordered(fn: Callable[[T], R], items: Iterable[T], max_workers: int = 1) -> Iterator[R]:
+    # Like map(), but runs up to `max_workers` calls at once. Items are pulled
+    # lazily and results are yielded in input order as soon as they are ready.
+    if max_workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        iterator = iter(items)
+        for item in iterator:
+            pending.append(pool.submit(contextvars.copy_context().run, fn, item))
+            if len(pending) >= max_workers * 2:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for item in iterator:
+                pending.append(pool.submit(contextvars.copy_context().run, fn, item))
+                break
+            yield result
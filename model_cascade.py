@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, TypeVar
+
+from llm_chains import LATENCY_WINDOW, latency_summary
+
+T = TypeVar("T")
+
+# Two-tier model cascade: every class goes to the cheap model first and only answers that the
+# `escalate` rule rejects are asked again of the expensive model. Calls, latency and escalation
+# reasons are recorded per tier so the rule can be tuned for throughput.
+
+CHEAP_MODEL_NAME = "openai/gpt-4o-mini"
+
+
+class ModelCascade:
+    def __init__(self, enabled: bool = False, cheap_model: str = CHEAP_MODEL_NAME):
+        self.enabled = enabled
+        self.cheap_model = cheap_model
+        self._latencies: dict[str, deque[float]] = {tier: deque(maxlen=LATENCY_WINDOW) for tier in ("cheap", "expensive")}
+        self._calls = {"cheap": 0, "expensive": 0}
+        self.escalations = 0
+        self.reasons: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _timed(self, tier: str, classify: Callable[[str], T], model: str) -> T:
+        start = time.perf_counter()
+        result = classify(model)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies[tier].append(elapsed)
+            self._calls[tier] += 1
+        return result
+
+    def run(self, classify: Callable[[str], T], escalate: Callable[[T], list[str]], expensive_model: str) -> T:
+        """`classify(model)` answers with the given model; `escalate(answer)` lists the reasons to escalate, if any."""
+        if not self.enabled:
+            return classify(expensive_model)
+
+        answer = self._timed("cheap", classify, self.cheap_model)
+        reasons = escalate(answer)
+        if not reasons:
+            return answer
+
+        with self._lock:
+            self.escalations += 1
+            for reason in reasons:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        return self._timed("expensive", classify, expensive_model)
+
+    def stats(self) -> dict:
+        with self._lock:
+            cheap_calls = self._calls["cheap"]
+            return {
+                "enabled": self.enabled,
+                "cheap_model": self.cheap_model,
+                "cheap": latency_summary(list(self._latencies["cheap"]), cheap_calls),
+                "expensive": latency_summary(list(self._latencies["expensive"]), self._calls["expensive"]),
+                "escalation_rate": round(self.escalations / cheap_calls, 3) if cheap_calls else None,
+                "escalation_reasons": dict(self.reasons),
+            }
+
+
+cascade = ModelCascade()
@@ -0,0 +1,120 @@
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+from run_journal import JsonArrayWriter, JsonObjectWriter
+
+# NDJSON output: one line per test class, {"repo": ..., "test_class": ..., <stage>: entry}, written and flushed as
+# soon as the class is classified, so results are visible (and can be piped) while a huge project is still running.
+# The stages are those of unified_pipeline.py: "stats" entries are the items of stats/<repo>.json, "analysis"
+# entries the values of analysis/<repo>.json (null for a non-integration test). `to-json` converts a stream back
+# into those files, repo by repo, so downstream consumers of the pretty JSON keep working.
+
+STAGE_WRITERS = {"stats": JsonArrayWriter, "analysis": JsonObjectWriter}
+
+
+class NdjsonWriter:
+    def __init__(self, f: IO[str]):
+        self.f = f
+        self._lock = threading.Lock()
+
+    def write(self, repo: Optional[str], test_class_name: str, records: dict) -> None:
+        line = json.dumps({"repo": repo, "test_class": test_class_name, **records}) + "\n"
+        with self._lock:
+            self.f.write(line)
+            self.f.flush()
+
+    def close(self) -> None:
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+def open_ndjson(path: str) -> NdjsonWriter:
+    # "-" streams to stdout
+    if path == "-":
+        return NdjsonWriter(sys.stdout)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return NdjsonWriter(open(path, "w", encoding="utf-8"))
+
+
+def _repo_ranges(ndjson_path: Path, default_repo: str) -> dict[str, list[tuple[int, int]]]:
+    # byte ranges of each repo's lines, in stream order; a stream written repo by repo has one range per repo
+    ranges: dict[str, list[tuple[int, int]]] = {}
+    with open(ndjson_path, "rb") as f:
+        start = 0
+        for line in f:
+            end = start + len(line)
+            try:
+                repo = json.loads(line).get("repo") or default_repo
+            except json.JSONDecodeError:
+                # a torn last line from a crash mid-write
+                start = end
+                continue
+            repo_ranges = ranges.setdefault(repo, [])
+            if repo_ranges and repo_ranges[-1][1] == start:
+                repo_ranges[-1] = (repo_ranges[-1][0], end)
+            else:
+                repo_ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(f: IO[bytes], start: int, end: int) -> Iterator[dict]:
+    f.seek(start)
+    while start < end:
+        line = f.readline()
+        start += len(line)
+        yield json.loads(line)
+
+
+def to_json(ndjson_path: Path, output_dir: Path = Path("."), default_repo: Optional[str] = None) -> list[Path]:
+    """Writes <output_dir>/<stage>/<repo>.json for every stage and repo in the stream; returns the files written.
+
+    Lines without a repo (single files, daemon /classify answers) go to `default_repo`, the input file stem by default.
+    A first pass finds where each repo's lines are, then the repos are written one at a time, so at most one file
+    per stage is open however many repos the stream has and however their lines are interleaved.
+    """
+    default_repo = default_repo or Path(ndjson_path).stem
+    written = []
+    if not Path(ndjson_path).exists():
+        return written
+    with open(ndjson_path, "rb") as f:
+        for repo, repo_ranges in _repo_ranges(ndjson_path, default_repo).items():
+            writers = {}
+            try:
+                for start, end in repo_ranges:
+                    for record in _read_range(f, start, end):
+                        for stage, writer_class in STAGE_WRITERS.items():
+                            if stage not in record:
+                                continue
+                            if stage not in writers:
+                                path = output_dir / stage / f"{repo}.json"
+                                path.parent.mkdir(parents=True, exist_ok=True)
+                                writers[stage] = writer_class(open(path, "w"))
+                                written.append(path)
+                            if stage == "stats":
+                                writers[stage].add(record[stage])
+                            elif record[stage] is not None:
+                                writers[stage].add(record["test_class"], record[stage])
+            finally:
+                for writer in writers.values():
+                    writer.close()
+                    writer.f.close()
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("to-json", help="convert an NDJSON stream into stats/<repo>.json and analysis/<repo>.json")
+    convert_parser.add_argument("ndjson_path")
+    convert_parser.add_argument("--output-dir", default=".", help="the stats/ and analysis/ folders are created here")
+    convert_parser.add_argument("--repo", help="repo name for lines without one (default: the input file stem)")
+    args = parser.parse_args()
+
+    for path in to_json(Path(args.ndjson_path), Path(args.output_dir), args.repo):
+        print(path)
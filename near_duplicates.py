@@ -0,0 +1,229 @@
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+from tree_sitter import Parser
+
+from chunked_classification import JAVA_LANGUAGE
+from llm_dispatch import counting_calls
+
+R = TypeVar("R")
+
+# Near-duplicate test classes (copy-pasted controller tests, generated suites that differ only in literals,
+# the same test in several modules) are classified once. Each class is reduced to a normalized token stream
+# (no package/imports/comments, literals replaced by their kind), shingled, and MinHashed; LSH bands find
+# candidate representatives and the estimated Jaccard similarity decides. A class within the threshold of a
+# representative gets a copy of the representative's result instead of its own LLM calls.
+
+SKIPPED_NODES = {"package_declaration", "import_declaration", "line_comment", "block_comment"}
+LITERAL_NODES = {
+    "string_literal": "<str>", "text_block": "<str>", "character_literal": "<char>",
+    "decimal_integer_literal": "<num>", "hex_integer_literal": "<num>", "octal_integer_literal": "<num>",
+    "binary_integer_literal": "<num>", "decimal_floating_point_literal": "<num>", "hex_floating_point_literal": "<num>",
+}
+MERSENNE_PRIME = (1 << 61) - 1
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+DEFAULT_THRESHOLD = 0.9
+
+
+def normalized_tokens(source: str) -> list[str]:
+    tree = Parser(JAVA_LANGUAGE).parse(source.encode("utf-8"))
+    tokens = []
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        if node.type in SKIPPED_NODES:
+            continue
+        if node.type in LITERAL_NODES:
+            tokens.append(LITERAL_NODES[node.type])
+        elif node.child_count == 0:
+            tokens.append(node.text.decode("utf-8", errors="replace"))
+        else:
+            stack.extend(reversed(node.children))
+    return tokens
+
+
+def _shingle_hashes(tokens: list[str], size: int = SHINGLE_SIZE) -> set[int]:
+    if len(tokens) < size:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = (" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+    return {int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, source: str) -> tuple[int, ...]:
+        hashes = _shingle_hashes(normalized_tokens(source))
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    # estimated Jaccard similarity of the two shingle sets
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass
+class Representative:
+    key: str
+    signature: tuple[int, ...]
+    result: Future
+    llm_calls: int = 0
+    duplicates: int = 0
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index of the classified representatives of this run, shared across repos.
+
+    With `max_representatives` set (the daemon does), the representatives matched least recently are
+    dropped from the index beyond that many; their classes are then no longer found as originals.
+    """
+
+    def __init__(self, enabled: bool = False, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 max_representatives: Optional[int] = None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_representatives = max_representatives
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[Representative]] = {}
+        # every indexed representative by id, least recently matched first
+        self._representatives: OrderedDict[int, Representative] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.classified = 0
+        self.propagated = 0
+        self.llm_calls_saved = 0
+
+    def _band_keys(self, signature: tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def _best_match(self, signature: tuple[int, ...]) -> tuple[Optional[Representative], float]:
+        best, best_similarity = None, 0.0
+        seen = set()
+        for band_key in self._band_keys(signature):
+            for representative in self._buckets.get(band_key, ()):
+                if id(representative) in seen:
+                    continue
+                seen.add(id(representative))
+                s = similarity(signature, representative.signature)
+                if s > best_similarity:
+                    best, best_similarity = representative, s
+        return (best, best_similarity) if best_similarity >= self.threshold else (None, best_similarity)
+
+    def _add(self, representative: Representative) -> None:
+        for band_key in self._band_keys(representative.signature):
+            self._buckets.setdefault(band_key, []).append(representative)
+        self._representatives[id(representative)] = representative
+        while self.max_representatives is not None and len(self._representatives) > self.max_representatives:
+            _, oldest = self._representatives.popitem(last=False)
+            self._unlink(oldest)
+            self.evicted += 1
+
+    def _unlink(self, representative: Representative) -> None:
+        self._representatives.pop(id(representative), None)
+        for band_key in self._band_keys(representative.signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None and representative in bucket:
+                bucket.remove(representative)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _remove(self, representative: Representative) -> None:
+        with self._lock:
+            self._unlink(representative)
+
+    def classify(self, key: str, source: str, compute: Callable[[], R]) -> tuple[R, Optional[dict]]:
+        """Returns (result, provenance); provenance is None when `compute` ran for this class."""
+        if not self.enabled:
+            return compute(), None
+
+        signature = self.hasher.signature(source)
+        with self._lock:
+            match, match_similarity = self._best_match(signature)
+            if match is None:
+                # first of its cluster: registered before it is classified, so duplicates in flight wait for it
+                representative = Representative(key, signature, Future())
+                self._add(representative)
+            else:
+                self._representatives.move_to_end(id(match))
+
+        if match is not None:
+            try:
+                result = match.result.result()
+            except Exception:
+                # the representative failed; this class is classified on its own
+                return compute(), None
+            with self._lock:
+                match.duplicates += 1
+                self.propagated += 1
+                self.llm_calls_saved += match.llm_calls
+            return result, {"duplicate_of": match.key, "similarity": round(match_similarity, 3)}
+
+        try:
+            with counting_calls() as calls:
+                result = compute()
+        except BaseException as e:
+            self._remove(representative)
+            representative.result.set_exception(e)
+            raise
+        representative.llm_calls = calls[0]
+        with self._lock:
+            self.classified += 1
+        representative.result.set_result(result)
+        return result, None
+
+    def clusters(self) -> list[Representative]:
+        with self._lock:
+            representatives = list(self._representatives.values())
+        return [r for r in representatives if r.duplicates]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "classified": self.classified,
+            "propagated": self.propagated,
+            "clusters_with_duplicates": len(self.clusters()),
+            "llm_calls_saved": self.llm_calls_saved,
+            "evicted": self.evicted,
+        }
+
+
+dedup = NearDuplicateIndex()
+
+
+if __name__ == "__main__":
+    # Groups the given Java files (or every .java file under the given directories) without calling the model
+    import argparse
+    import json
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    files = []
+    for path in map(Path, args.paths):
+        files += sorted(path.rglob("*.java")) if path.is_dir() else [path]
+
+    index = NearDuplicateIndex(enabled=True, threshold=args.threshold)
+    groups: dict[str, list[dict]] = {}
+    for file_path in files:
+        _, provenance = index.classify(str(file_path), file_path.read_text(errors="replace"), lambda: None)
+        if provenance is not None:
+            groups.setdefault(provenance["duplicate_of"], []).append({"file": str(file_path), "similarity": provenance["similarity"]})
+
+    print(json.dumps({"files": len(files), "representatives": index.classified, "duplicates": index.propagated, "clusters": groups}, indent=4))
@@ -1,16 +1,27 @@
-import os
 import sys
 from pathlib import Path
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from enum import Enum
-from cldk import CLDK
-from cldk.analysis.java import JavaAnalysis
-from hamster.code_analysis.common import CommonAnalysis
-import json
-
-from is_integration_test import is_integration_test
+from typing import Optional
+from analysis_cache import clean_head, load_project
+
+import is_integration_test as gate
+from is_integration_test import is_integration_test, merge_classifications, TestClassification
+from chunked_classification import chunker
+from classification_pipeline import ClassificationPipeline, ClassifierStage
+from near_duplicates import DEFAULT_THRESHOLD, dedup
+from prompt_slicing import slicer
+from static_filter import known_pattern, prefilter, static_pattern
+from model_cascade import CHEAP_MODEL_NAME, cascade
+from telemetry import telemetry
+from llm_cache import default_cache
+from llm_chains import structured_classification, registry
+from run_journal import JOURNAL_DIR, RunJournal, write_json_object
+from ndjson_output import open_ndjson
+import llm_dispatch
+import argparse
+
+ANALYSIS_JOURNAL_DIR = JOURNAL_DIR / "analysis"
 
 class FitAssessment(str, Enum):
     PERFECT_FIT = "Perfect Fit"
@@ -48,20 +59,32 @@ class IntegrationTestAnalysis(BaseModel):
         description="The confidence level of the classification."
     )
 
-def classify_integration_test_pattern(file_content: str) -> IntegrationTestAnalysis:
-    # api_key = os.getenv("OPENAI_API_KEY")
-    api_key = os.getenv("OPENROUTER_API_KEY")
+# Fused mode: the gate and the pattern analysis in a single structured-output call
+class GatedIntegrationTestAnalysis(IntegrationTestAnalysis):
+    is_integration_test: bool = Field(
+        ...,
+        description="True if the class is a REST API integration test, False otherwise."
+    )
+    integration_test_reasoning: str = Field(
+        ...,
+        description="A concise explanation of the integration test decision, citing specific annotations or logic found in the code."
+    )
 
+    def classification(self) -> TestClassification:
+        return TestClassification(is_integration_test=self.is_integration_test, reasoning=self.integration_test_reasoning)
 
-    llm = ChatOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        model="openai/gpt-4o",  # or "gpt-3.5-turbo"
-        temperature=0.7,
-        api_key=api_key
-    ).with_structured_output(IntegrationTestAnalysis)
+    def analysis(self) -> IntegrationTestAnalysis:
+        return IntegrationTestAnalysis(**self.model_dump(include=set(IntegrationTestAnalysis.model_fields)))
 
+# Bump PROMPT_VERSION whenever the prompt semantics change so cached answers are not reused
+MODEL_NAME = "openai/gpt-4o"
+TEMPERATURE = 0.7
+# A fused call has a single temperature, so with --fused the gate decision is sampled at the analysis
+# temperature rather than at is_integration_test.TEMPERATURE (0.1). The rating's fused call has no such gap.
+GATED_TEMPERATURE = TEMPERATURE
+PROMPT_VERSION = "1"
 
-    system_rules = """
+SYSTEM_RULES = """
 Role: You are an expert Software Test Architect researching strategies for "Self-Contained Integration Tests."
 
 Context: We have identified 4 common patterns developers use to ensure integration tests are self-contained (i.e., one test's data does not break another test). We are analyzing a dataset of tests to see if they fit these patterns or if developers are using strategies we haven't documented yet. We first need to confirm if the test is actually self-contained (i.e., it can run reliably regardless of previous test executions and leaves the system clean). If it is, we want to classify how it achieves that.
@@ -120,17 +143,119 @@ Your Task:
 
 
 """
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_rules),
-        ("human", "Analyze this Java code:\n\n{code}")
-    ])
-    
-    chain = prompt | llm
 
-    result = chain.invoke({"code": file_content})
+GATED_SYSTEM_RULES = gate.SYSTEM_RULES + """
+Then, only if it IS a REST API Integration Test, also analyze it as described below. If it is NOT, still fill in the remaining fields, they will be ignored.
+""" + SYSTEM_RULES
+
+CONFIDENCE_WEIGHTS = {ConfidenceScore.LOW: 1, ConfidenceScore.MEDIUM: 2, ConfidenceScore.HIGH: 3}
+
+def merge_analyses(analyses: list[IntegrationTestAnalysis]) -> IntegrationTestAnalysis:
+    # Confidence-weighted vote on the pattern; the class is self-contained only if every chunk is
+    votes = {}
+    for analysis in analyses:
+        key = analysis.pattern_name.strip().casefold()
+        votes[key] = votes.get(key, 0) + CONFIDENCE_WEIGHTS[analysis.confidence_score]
+    winner_key = max(votes, key=votes.get)
+    agreeing = [a for a in analyses if a.pattern_name.strip().casefold() == winner_key]
+    winner = max(agreeing, key=lambda a: CONFIDENCE_WEIGHTS[a.confidence_score])
+
+    confidence = winner.confidence_score
+    if len(agreeing) < len(analyses) and confidence == ConfidenceScore.HIGH:
+        # split votes never give a high-confidence answer
+        confidence = ConfidenceScore.MEDIUM
+    return IntegrationTestAnalysis(
+        is_self_contained=all(a.is_self_contained for a in analyses),
+        analysis_of_mechanism=winner.analysis_of_mechanism,
+        fit_assessment=winner.fit_assessment,
+        pattern_name=winner.pattern_name,
+        reasoning=f"{winner.reasoning} ({len(agreeing)} of {len(analyses)} chunks of the class agree.)",
+        confidence_score=confidence,
+    )
+
+def merge_gated_analyses(analyses: list[GatedIntegrationTestAnalysis]) -> GatedIntegrationTestAnalysis:
+    classification = merge_classifications([analysis.classification() for analysis in analyses])
+    positive = [analysis.analysis() for analysis in analyses if analysis.is_integration_test]
+    analysis = merge_analyses(positive or [analysis.analysis() for analysis in analyses])
+    return GatedIntegrationTestAnalysis(
+        **analysis.model_dump(),
+        is_integration_test=classification.is_integration_test,
+        integration_test_reasoning=classification.reasoning,
+    )
+
+def classify_integration_test_pattern(file_content: str, model: str = MODEL_NAME) -> IntegrationTestAnalysis:
+    return chunker.run(
+        lambda code: structured_classification(IntegrationTestAnalysis, SYSTEM_RULES, PROMPT_VERSION, model, TEMPERATURE, code),
+        merge_analyses, file_content
+    )
+
+def classify_gated_integration_test_pattern(file_content: str, model: str = MODEL_NAME) -> GatedIntegrationTestAnalysis:
+    # One call instead of is_integration_test + classify_integration_test_pattern
+    return chunker.run(
+        lambda code: structured_classification(GatedIntegrationTestAnalysis, GATED_SYSTEM_RULES, PROMPT_VERSION, model, GATED_TEMPERATURE, code),
+        merge_gated_analyses, file_content
+    )
+
+def escalation_reasons(analysis: IntegrationTestAnalysis, code_body: str) -> list[str]:
+    # Cascade rule: a cheap answer is only kept when it is confident, fits a known pattern and agrees with the static hint
+    reasons = []
+    if analysis.confidence_score == ConfidenceScore.LOW:
+        reasons.append("low_confidence")
+    if analysis.fit_assessment == FitAssessment.NO_FIT:
+        reasons.append("no_fit")
+    hint = static_pattern(code_body)
+    if hint is not None and known_pattern(analysis.pattern_name) != hint:
+        reasons.append("static_disagreement")
+    return reasons
+
+def classify_with_cascade(payload: str, code_body: str) -> IntegrationTestAnalysis:
+    # `payload` is what the model reads (the full source or its slice), the static hint always uses the full source
+    return cascade.run(
+        lambda model: classify_integration_test_pattern(payload, model),
+        lambda analysis: escalation_reasons(analysis, code_body),
+        MODEL_NAME,
+    )
+
+def gated_escalation_reasons(gated: GatedIntegrationTestAnalysis, verdict, code_body: str) -> list[str]:
+    if not gated.is_integration_test:
+        return ["static_disagreement"] if verdict.decision is True else []
+    return escalation_reasons(gated.analysis(), code_body)
+
+def gated_classification(code_body: str):
+    # Static negatives never reach the model; static positives only use the analysis part of the fused answer
+    verdict = prefilter.verdict(code_body, fused=True)
+    if verdict.decision is False:
+        return None
+    gated = cascade.run(
+        lambda model: classify_gated_integration_test_pattern(code_body, model),
+        lambda answer: gated_escalation_reasons(answer, verdict, code_body),
+        MODEL_NAME,
+    )
+    if verdict.decision is None and not gated.is_integration_test:
+        return None
+    return gated.analysis()
+
+class AnalysisStage(ClassifierStage):
+    """The descriptive IntegrationTestAnalysis of analysis/<repo>.json."""
+
+    name = "analysis"
+
+    def classify(self, payload: str, code_body: str) -> IntegrationTestAnalysis:
+        return classify_with_cascade(payload, code_body)
+
+    def classify_fused(self, code_body: str) -> Optional[IntegrationTestAnalysis]:
+        return gated_classification(code_body)
+
+    def record(self, test_class_name: str, analysis: Optional[IntegrationTestAnalysis], provenance: Optional[dict]) -> Optional[dict]:
+        if analysis is None:
+            return None
+        return {**analysis.dict(), **(provenance or {})}
+
+def analyze_sources(test_sources, project, max_workers: int = 1, fused: bool = False):
+    # (test class, analysis or None for non-integration tests), in the order of test_sources for any max_workers
+    pipeline = ClassificationPipeline([AnalysisStage()], fused)
+    return ((name, records[AnalysisStage.name]) for name, records in pipeline.run(test_sources, project, max_workers))
 
-    return result
 
 if __name__ == "__main__":
     '''
@@ -152,32 +277,93 @@ if __name__ == "__main__":
         print(f"Confidence Score: {classification.confidence_score}")
     '''
 
-    project_path = sys.argv[1]
-    cldk = CLDK(language="java")
-    analysis: JavaAnalysis = cldk.analysis(project_path=project_path)
-    common_analysis = CommonAnalysis(analysis=analysis)
-    test_entities, app_classes = common_analysis.get_test_methods_classes_and_application_classes()
-
-    results = dict()
-
-    for test_class_name, test_methods in test_entities.items():
-        java_file_name = analysis.get_java_file(test_class_name)
-        class_file_path = Path(java_file_name).absolute().resolve()
-        klass = analysis.get_class(test_class_name)
-        code_body = class_file_path.read_text()
-
-        # if not "ActivitiesIntegrationTest" in test_class_name:
-        #     continue
-
-        is_integration = is_integration_test(code_body).is_integration_test
-
-        if not is_integration:
-            continue
-        
-        pattern_classification = classify_integration_test_pattern(code_body)
-
-        results[test_class_name] =  pattern_classification.dict()
-    
-    # print the results as json
-    print(json.dumps(results, indent=4))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("project_path", help="a project checkout, or a single .java file to classify without CLDK")
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    parser.add_argument("--fused", action="store_true", help="gate and classify each class in a single LLM call")
+    parser.add_argument("--journal", help="per-class results journal (default: journal/analysis/<project folder>.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="skip test classes already in the journal")
+    parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompt instead of the full source")
+    parser.add_argument("--cascade", action="store_true", help="ask a cheaper model first and escalate uncertain answers")
+    parser.add_argument("--cheap-model", default=CHEAP_MODEL_NAME, help="first tier of --cascade")
+    parser.add_argument("--dedup", action="store_true", help="classify one representative per cluster of near-duplicate test classes")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity of a near-duplicate")
+    parser.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks classified separately")
+    parser.add_argument("--repo-name", help="analysis cache key (default: project folder name)")
+    parser.add_argument("--commit", help="analysis cache key (default: git HEAD of the project)")
+    parser.add_argument("--invalidate-analysis", action="store_true", help="re-run CLDK even when a cached analysis exists")
+    parser.add_argument("--ndjson", metavar="PATH", help="also stream each class as an NDJSON line as soon as it is classified ('-' for stdout, instead of the json at the end)")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+    prefilter.enabled = not args.no_prefilter
+    chunker.token_budget = args.token_budget
+    slicer.enabled = args.slice
+    dedup.enabled = args.dedup
+    cascade.enabled = args.cascade
+    cascade.cheap_model = args.cheap_model
+    dedup.threshold = args.dedup_threshold
+
+    project_path = args.project_path
+    ndjson = open_ndjson(args.ndjson) if args.ndjson else None
+    if Path(project_path).is_file():
+        # single file: no CLDK analysis and no journal, the file stem names the class
+        file_path = Path(project_path)
+        for name, result in analyze_sources([(file_path.stem, file_path.read_text())], None, fused=args.fused):
+            if ndjson is not None:
+                ndjson.write(None, name, {AnalysisStage.name: result})
+            if args.ndjson != "-":
+                write_json_object([(name, result)] if result is not None else [], sys.stdout)
+                print()
+        sys.exit(0)
+
+    journal_path = Path(args.journal) if args.journal else ANALYSIS_JOURNAL_DIR / f"{Path(project_path).resolve().name}.jsonl"
+    journal = RunJournal(journal_path, resume=args.resume)
+    finished = args.resume and journal.is_done()
+    done = journal.completed_keys() if args.resume and not finished else set()
+    repo_name = args.repo_name or Path(project_path).resolve().name
+    if ndjson is not None:
+        # classes finished by an earlier run come first, so the stream is complete
+        for test_class_name, pattern_classification in journal.results():
+            ndjson.write(repo_name, test_class_name, {AnalysisStage.name: pattern_classification})
+
+    if not finished:
+        # the CLDK analysis is cached per (repo name, commit); the commit defaults to the checkout's HEAD
+        commit_hash = args.commit or clean_head(project_path)
+        if commit_hash is None:
+            print(f"{project_path} has uncommitted changes or no git HEAD, the analysis is not cached", file=sys.stderr)
+        project = load_project(project_path, repo_name, commit_hash, invalidate=args.invalidate_analysis)
+
+        pending = project.iter_sources(skip=done)
+
+        # analyze_sources yields in the order of test_entities, so the output is the same for any max_workers.
+        # Every class is journaled (None for non-integration tests) so --resume can skip it.
+        for test_class_name, pattern_classification in analyze_sources(pending, project, args.max_workers, args.fused):
+            journal.record(test_class_name, pattern_classification)
+            if ndjson is not None:
+                ndjson.write(repo_name, test_class_name, {AnalysisStage.name: pattern_classification})
+        journal.mark_done()
+    journal.close()
+
+    if ndjson is not None:
+        ndjson.close()
+    if args.ndjson != "-":
+        # print the results as json, streamed from the journal
+        results = ((name, result) for name, result in journal.results() if result is not None)
+        write_json_object(results, sys.stdout)
+        print()
+
+    # cache statistics go to stderr so the json on stdout stays clean
+    cache = default_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}", file=sys.stderr)
+    print(f"LLM dispatch: {llm_dispatch.limiter().stats()}", file=sys.stderr)
+    print(f"LLM latency: {registry.latency_stats()}", file=sys.stderr)
+    print(f"Static pre-filter: {prefilter.stats()}", file=sys.stderr)
+    print(f"Chunked classification: {chunker.stats()}", file=sys.stderr)
+    print(f"Prompt slicing: {slicer.stats()}", file=sys.stderr)
+    print(f"Near-duplicates: {dedup.stats()}", file=sys.stderr)
+    print(f"Model cascade: {cascade.stats()}", file=sys.stderr)
+    telemetry.report(file=sys.stderr)
         
\ No newline at end of file
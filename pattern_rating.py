@@ -1,8 +1,11 @@
 import os
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
+import is_integration_test as gate
+from chunked_classification import chunker
+from is_integration_test import TestClassification, merge_classifications
+from llm_chains import structured_classification
+
 class IntergrationPatternRating(BaseModel):
     has_restart: bool = Field(
         description="True if the test class uses application restart between tests, False otherwise."
@@ -20,23 +23,27 @@ class IntergrationPatternRating(BaseModel):
         description="True if the test class uses no fixtures and has manual setup/teardown logic inside @Test methods, False otherwise."
     )
 
-def rate_integration_test_pattern(file_content: str) -> IntergrationPatternRating:
-    # api_key = os.getenv("OPENAI_API_KEY")   
-    api_key = os.getenv("OPENROUTER_API_KEY")   
+# Fused mode: the gate and the rating in a single structured-output call
+class GatedPatternRating(IntergrationPatternRating):
+    is_integration_test: bool = Field(
+        description="True if the class is a REST API integration test, False otherwise. When False, all the rating fields are False."
+    )
+    reasoning: str = Field(
+        description="A concise explanation citing specific annotations or logic found in the code."
+    )
 
-    # if the environment variable is not set, raise an error
-    if not api_key:
-        raise ValueError("API KEY environment variable is not set.") 
-    
-    llm = ChatOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        model="gpt-4o",
-        temperature=0.1,
-        api_key=api_key
-    ).with_structured_output(IntergrationPatternRating)
+    def classification(self) -> TestClassification:
+        return TestClassification(is_integration_test=self.is_integration_test, reasoning=self.reasoning)
+
+    def rating(self) -> IntergrationPatternRating:
+        return IntergrationPatternRating(**self.model_dump(include=set(IntergrationPatternRating.model_fields)))
 
+# Bump PROMPT_VERSION whenever the prompt semantics change so cached answers are not reused
+MODEL_NAME = "gpt-4o"
+TEMPERATURE = 0.1
+PROMPT_VERSION = "1"
 
-    system_rules = """
+SYSTEM_RULES = """
 Role: You are an expert Software Test Architect specializing in Java REST API integration testing strategies.
 
 Task: Analyze the provided Java test class code and rate it on the following aspects related to integration test patterns.
@@ -54,17 +61,35 @@ The Aspects to Rate:
 5. Manual Setup in Tests:
    - Does the test class have manual setup/teardown logic inside @Test methods?
 """
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_rules),
-        ("human", "Analyze this Java code:\n\n{code}")
-    ])
 
-    chain = prompt | llm
+GATED_SYSTEM_RULES = gate.SYSTEM_RULES + """
+Then, only if it IS a REST API Integration Test, also rate it as described below. If it is NOT, set every rating field to False.
+""" + SYSTEM_RULES
+
+def merge_ratings(ratings: list[IntergrationPatternRating]) -> IntergrationPatternRating:
+    # an aspect seen in any chunk holds for the class
+    return IntergrationPatternRating(**{
+        name: any(getattr(rating, name) for rating in ratings) for name in IntergrationPatternRating.model_fields
+    })
+
+def merge_gated_ratings(ratings: list[GatedPatternRating]) -> GatedPatternRating:
+    classification = merge_classifications([rating.classification() for rating in ratings])
+    positive = [rating.rating() for rating in ratings if rating.is_integration_test]
+    rating = merge_ratings(positive) if positive else IntergrationPatternRating(**{name: False for name in IntergrationPatternRating.model_fields})
+    return GatedPatternRating(**rating.model_dump(), **classification.model_dump())
 
-    result = chain.invoke({"code": file_content})
+def rate_integration_test_pattern(file_content: str) -> IntergrationPatternRating:
+    return chunker.run(
+        lambda code: structured_classification(IntergrationPatternRating, SYSTEM_RULES, PROMPT_VERSION, MODEL_NAME, TEMPERATURE, code),
+        merge_ratings, file_content
+    )
 
-    return result
+def rate_gated_integration_test_pattern(file_content: str) -> GatedPatternRating:
+    # One call instead of is_integration_test + rate_integration_test_pattern
+    return chunker.run(
+        lambda code: structured_classification(GatedPatternRating, GATED_SYSTEM_RULES, PROMPT_VERSION, MODEL_NAME, TEMPERATURE, code),
+        merge_gated_ratings, file_content
+    )
 
 if __name__ == "__main__":
     file_path = os.sys.argv[1]
@@ -1,141 +1,234 @@
-import os
 from pathlib import Path
-from langchain_openai import ChatOpenAI
 import sys
-from langchain_core.prompts import ChatPromptTemplate
-from pydantic import BaseModel, Field
-from cldk import CLDK
-from cldk.analysis.java import JavaAnalysis
-from hamster.code_analysis.common import CommonAnalysis
-from is_integration_test import is_integration_test
-from pattern_rating import rate_integration_test_pattern
+from analysis_cache import ProjectAnalysis, is_cached, load_project
+from chunked_classification import chunker
+from classification_pipeline import ClassificationPipeline, ClassifierStage
+from near_duplicates import DEFAULT_THRESHOLD, dedup
+from prompt_slicing import slicer
+from static_filter import prefilter
+from telemetry import telemetry
+from pattern_rating import rate_integration_test_pattern, rate_gated_integration_test_pattern, IntergrationPatternRating
+from llm_cache import default_cache
+from llm_chains import registry
+from repo_fetch import FetchError, fetcher
+from repo_scheduler import plan
+from results_store import store
+from run_journal import JOURNAL_DIR, RunJournal, write_json_array
+from ndjson_output import NdjsonWriter, open_ndjson
+import llm_dispatch
+import argparse
 import json
-import subprocess
+from typing import Collection, Iterable, Iterator, Optional
 
-def process_project(project_path: str) -> list[dict]:
-    cldk = CLDK(language="java")
-    analysis: JavaAnalysis = cldk.analysis(project_path=project_path)
-    common_analysis = CommonAnalysis(analysis=analysis)
-    test_entities, app_classes = common_analysis.get_test_methods_classes_and_application_classes()
+STATS_DIR = Path("./stats")
+STATS_JOURNAL_DIR = JOURNAL_DIR / "stats"
 
-    results = []
+def pattern_from_rating(pattern_rating: IntergrationPatternRating) -> str:
+    if pattern_rating.manual_setup_in_tests:
+        return "Manual setup in tests"
+    elif pattern_rating.has_restart:
+        return "Restart"
+    elif pattern_rating.has_fixture and pattern_rating.reloading_data_in_fixtures:
+        return "Clear and reload"
+    elif pattern_rating.has_fixture and pattern_rating.API_calls_in_fixtures:
+        return "API calls"
+    else:
+        return f"No recognized pattern: {{ {pattern_rating} }}"
 
-    for test_class_name, test_methods in test_entities.items():
-        java_file_name = analysis.get_java_file(test_class_name)
-        class_file_path = Path(java_file_name).absolute().resolve()
-        klass = analysis.get_class(test_class_name)
-        code_body = class_file_path.read_text()
 
-        # if not "ActivitiesIntegrationTest" in test_class_name:
-        #     continue
+def gated_rating(code_body: str) -> Optional[IntergrationPatternRating]:
+    # Static negatives never reach the model; static positives only use the rating part of the fused answer
+    verdict = prefilter.verdict(code_body, fused=True)
+    if verdict.decision is False:
+        return None
+    gated = rate_gated_integration_test_pattern(code_body)
+    if verdict.decision is None and not gated.is_integration_test:
+        return None
+    return gated.rating()
 
-        is_integration = is_integration_test(code_body).is_integration_test
-        
-        # print(f"Test Class: {test_class_name}")
-        # print(f"  Is Integration Test? {is_integration}")
-        # print()
 
+class RatingStage(ClassifierStage):
+    """The stats/<repo>.json pattern buckets."""
 
-        if not is_integration:
-            # print(f"Test Class: {test_class_name}")
-            # print("  Not an integration test.")
-            # print()
-            results.append({
-                "test_class": test_class_name,
-                "pattern": "Not an integration test"
-            })
-            continue
-        
-        # pattern_classification = classify_integration_test_pattern(code_body)
-
-        # print(f"Test Class: {test_class_name}")
-        # print(f"  Pattern Type: {pattern_classification.pattern_type}")
-        # print(f"  Explanation: {pattern_classification.explanation}")
-        # print()
+    name = "stats"
 
-        pattern_rating = rate_integration_test_pattern(code_body)
+    def classify(self, payload: str, code_body: str) -> IntergrationPatternRating:
+        return rate_integration_test_pattern(payload)
 
-        # print(pattern_rating)
+    def classify_fused(self, code_body: str) -> Optional[IntergrationPatternRating]:
+        return gated_rating(code_body)
 
-        if pattern_rating.manual_setup_in_tests:
-            # print(f"Test Class: {test_class_name}")
-            # print("  Manual setup in tests.")
-            # print()
-            results.append({
-                "test_class": test_class_name,
-                "pattern": "Manual setup in tests"
-            })
-        elif pattern_rating.has_restart:
-            # print(f"Test Class: {test_class_name}")
-            # print("  Restart")
-            # print()
-            results.append({
-                "test_class": test_class_name,
-                "pattern": "Restart"
-            })
-        elif pattern_rating.has_fixture and pattern_rating.reloading_data_in_fixtures:
-            # print(f"Test Class: {test_class_name}")
-            # print("  Clear and reload")
-            # print()
-            results.append({
+    def record(self, test_class_name: str, pattern_rating: Optional[IntergrationPatternRating], provenance: Optional[dict]) -> dict:
+        if pattern_rating is None:
+            result = {
                 "test_class": test_class_name,
-                "pattern": "Clear and reload"
-            })
-        elif pattern_rating.has_fixture and pattern_rating.API_calls_in_fixtures:
-            # print(f"Test Class: {test_class_name}")
-            # print("  API calls")
-            # print()
-            results.append({
-                "test_class": test_class_name,
-                "pattern": "API calls"
-            })
+                "pattern": "Not an integration test"
+            }
         else:
-            # print(f"Test Class: {test_class_name}")
-            # print(f"  No recognized pattern: {pattern_rating}")
-            # print()
-            results.append({
+            result = {
                 "test_class": test_class_name,
-                "pattern": f"No recognized pattern: {{ {pattern_rating} }}"
-            })
-    
-    return results
+                "pattern": pattern_from_rating(pattern_rating)
+            }
+        if provenance is not None:
+            result.update(provenance)
+        return result
+
+
+def classify_test_class(test_class_name: str, code_body: str, fused: bool = False, project: Optional[ProjectAnalysis] = None) -> dict:
+    return ClassificationPipeline([RatingStage()], fused).classify(test_class_name, code_body, project)[RatingStage.name]
+
+
+def iter_test_sources(project_path: str, skip: Collection[str] = ()) -> Iterator[tuple[str, str]]:
+    return load_project(project_path).iter_sources(skip)
+
+
+def classify_sources(test_sources: Iterable[tuple[str, str]], max_workers: int = 1, fused: bool = False, project: Optional[ProjectAnalysis] = None) -> list[dict]:
+    # results keep the input order regardless of max_workers
+    pipeline = ClassificationPipeline([RatingStage()], fused)
+    return [records[RatingStage.name] for _, records in pipeline.run(test_sources, project, max_workers)]
+
+
+def iter_project(project_path: str, max_workers: int = 1, fused: bool = False) -> Iterator[dict]:
+    # one result at a time, in test_entities order; sources are read as the classes are classified
+    project = load_project(project_path)
+    pipeline = ClassificationPipeline([RatingStage()], fused)
+    return (records[RatingStage.name] for _, records in pipeline.run(project.iter_sources(), project, max_workers))
+
+
+def process_project(project_path: str, max_workers: int = 1, fused: bool = False) -> list[dict]:
+    return list(iter_project(project_path, max_workers, fused))
+
+
+def open_journal(folder_name: str, resume: bool = False) -> RunJournal:
+    return RunJournal(STATS_JOURNAL_DIR / f"{folder_name}.jsonl", resume=resume)
+
+
+def classify_into_journal(test_sources: Iterable[tuple[str, str]], journal: RunJournal, max_workers: int = 1, fused: bool = False,
+                          project: Optional[ProjectAnalysis] = None, ndjson: Optional[NdjsonWriter] = None) -> int:
+    # each result is fsynced to the journal as soon as it is ready instead of being collected in memory
+    count = 0
+    pipeline = ClassificationPipeline([RatingStage()], fused)
+    for test_class_name, records in pipeline.run(test_sources, project, max_workers):
+        journal.record(test_class_name, records[RatingStage.name])
+        if ndjson is not None:
+            ndjson.write(project.name if project is not None else None, test_class_name, records)
+        count += 1
+    journal.mark_done()
+    return count
+
+
+def checkout_repo(folder_name: str, url: str, commit_hash: str, temp_dir: Path = Path("./temp")) -> Optional[Path]:
+    # Only the pinned commit is fetched, into a mirror cache reused by later runs (see repo_fetch.py)
+    folder_path = temp_dir / folder_name
+    try:
+        return fetcher.checkout(url, commit_hash, folder_path)
+    except FetchError as e:
+        print(f"Failed to fetch {commit_hash} from {url}. Skipping. ({e})")
+        return None
+
+
+def remove_checkout(folder_path: Path) -> None:
+    fetcher.remove(folder_path)
+
+
+def write_stats(folder_name: str, journal: RunJournal, stats_dir: Path = STATS_DIR) -> None:
+    # compaction: the journal is streamed into the usual stats/<repo>.json list
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    with open(stats_dir / f"{folder_name}.json", "w") as f_out:
+        write_json_array((result for test_class_name, result in journal.results()), f_out)
+    store.record_file(stats_dir / f"{folder_name}.json", "stats")
+
+
+def load_repo_analysis(folder_name: str, url: str, commit_hash: str, invalidate: bool = False) -> Optional[ProjectAnalysis]:
+    # A cached (repo, commit) analysis needs neither a checkout nor CLDK
+    if not invalidate and is_cached(folder_name, commit_hash):
+        return load_project(None, folder_name, commit_hash)
+
+    folder_path = checkout_repo(folder_name, url, commit_hash)
+    if folder_path is None:
+        return None
+    try:
+        return load_project(str(folder_path), folder_name, commit_hash, invalidate=invalidate)
+    finally:
+        # the test sources are copied into the analysis cache, so the checkout can go right away
+        remove_checkout(folder_path)
+
+
+def print_run_stats(file=None) -> None:
+    cache = default_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}", file=file)
+    print(f"LLM dispatch: {llm_dispatch.limiter().stats()}", file=file)
+    print(f"LLM latency: {registry.latency_stats()}", file=file)
+    print(f"Static pre-filter: {prefilter.stats()}", file=file)
+    print(f"Chunked classification: {chunker.stats()}", file=file)
+    print(f"Prompt slicing: {slicer.stats()}", file=file)
+    print(f"Near-duplicates: {dedup.stats()}", file=file)
+    telemetry.report(file=file)
 
 
 if __name__ == "__main__":
-    repos_info_json = sys.argv[1]
-    
-    with open(repos_info_json, "r") as f:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repos_info_json")
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    parser.add_argument("--fused", action="store_true", help="gate and rate each class in a single LLM call")
+    parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompt instead of the full source")
+    parser.add_argument("--dedup", action="store_true", help="classify one representative per cluster of near-duplicate test classes")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity of a near-duplicate")
+    parser.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks classified separately")
+    parser.add_argument("--sparse", action="store_true", help="check out only build files and src/ trees")
+    parser.add_argument("--resume", action="store_true", help="skip repos and test classes already in the journal")
+    parser.add_argument("--invalidate-analysis", action="store_true", help="re-run CLDK even when a cached analysis exists")
+    parser.add_argument("--schedule", action="store_true", help="process repos longest-first by estimated cost (see repo_scheduler.py); repos run one at a time here, so only a budget changes the run time")
+    parser.add_argument("--max-run-tokens", type=float, help="only the most informative repos whose estimated tokens fit this budget (implies --schedule)")
+    parser.add_argument("--max-run-hours", type=float, help="only the most informative repos whose estimated time fits this budget (implies --schedule)")
+    parser.add_argument("--store", action="store_true", help="load each stats/<repo>.json into the results store as it is written (see results_store.py)")
+    parser.add_argument("--ndjson", metavar="PATH", help="also stream each class as an NDJSON line as soon as it is classified ('-' for stdout)")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+    prefilter.enabled = not args.no_prefilter
+    chunker.token_budget = args.token_budget
+    slicer.enabled = args.slice
+    dedup.enabled = args.dedup
+    dedup.threshold = args.dedup_threshold
+    fetcher.sparse = args.sparse
+    store.enabled = args.store
+    ndjson = open_ndjson(args.ndjson) if args.ndjson else None
+
+    with open(args.repos_info_json, "r") as f:
         repos_info = json.load(f)
-    
-    # repo_results = {}
+    if args.schedule or args.max_run_tokens is not None or args.max_run_hours is not None:
+        max_seconds = args.max_run_hours * 3600 if args.max_run_hours is not None else None
+        repos_info, _, left_out = plan(repos_info, max_tokens=args.max_run_tokens, max_seconds=max_seconds)
+        if left_out:
+            print(f"Budget: {len(left_out)} repos left out", file=sys.stderr if args.ndjson == "-" else None)
 
     for folder_name, details in repos_info.items():
-        url = details['github_url']
-        commit_hash = details['commit']
-
-        folder_path=Path("./temp") / folder_name
-        if not folder_path.exists():
-            try:
-                subprocess.check_call(["git", "clone", url, str(folder_path)])
-            except subprocess.CalledProcessError:
-                print(f"Failed to clone {url}. Skipping.")
+        with telemetry.scope(repo=folder_name):
+            journal = open_journal(folder_name, resume=args.resume)
+            if ndjson is not None:
+                # classes finished by an earlier run come first, so the stream is complete
+                for test_class_name, result in journal.results():
+                    ndjson.write(folder_name, test_class_name, {RatingStage.name: result})
+            if args.resume and journal.is_done():
+                if not (STATS_DIR / f"{folder_name}.json").exists():
+                    write_stats(folder_name, journal)
                 continue
-        
-
-        try:
-            # We run the command INSIDE the new folder using the cwd argument
-            subprocess.check_call(["git", "checkout", commit_hash], cwd=folder_path)
-        except subprocess.CalledProcessError:
-            print(f"Failed to checkout {commit_hash} in {folder_path}")
-
-        
-        # remove the cloned repo after processing
-        pattern_results = process_project(str(folder_path))
-        
-        # write results to a json file
-        with open(Path("./stats")/f"{folder_name}.json", "w") as f_out:
-            json.dump(pattern_results, f_out, indent=4)
-
-        subprocess.check_call(["rm", "-rf", str(folder_path)])
-    
-    
+
+            project = load_repo_analysis(folder_name, details['github_url'], details['commit'], invalidate=args.invalidate_analysis)
+            if project is None:
+                continue
+
+            test_sources = project.iter_sources(skip=journal.completed_keys())
+            classify_into_journal(test_sources, journal, max_workers=args.max_workers, fused=args.fused, project=project, ndjson=ndjson)
+            journal.close()
+
+            # write results to a json file
+            write_stats(folder_name, journal)
+
+    if ndjson is not None:
+        ndjson.close()
+    # with the stream on stdout, the statistics go to stderr
+    print_run_stats(file=sys.stderr if args.ndjson == "-" else None)
@@ -0,0 +1,210 @@
+import threading
+
+from chunked_classification import FIXTURE_ANNOTATIONS, JUNIT3_FIXTURES, TEST_ANNOTATIONS, count_tokens
+
+# Structural slice of a test class for the pattern rating/analysis prompts, built from the CLDK class model:
+# class annotations and declaration, fields, constructors and fixture methods in full (with the helpers
+# they call), test methods abridged to their first lines, other helpers as declarations only.
+# License banners, package and import blocks are dropped. The integration test gate always sees the full source.
+
+MAX_TEST_LINES = 12
+
+
+def _annotation_name(annotation: str) -> str:
+    return annotation.lstrip("@").split("(", 1)[0].strip().rsplit(".", 1)[-1]
+
+
+def _method_name(callable_) -> str:
+    return callable_.signature.split("(", 1)[0].strip()
+
+
+def _lines(source_lines: list[str], start_line: int, end_line: int) -> list[str]:
+    # CLDK line numbers are 1-based and inclusive
+    return source_lines[max(start_line, 1) - 1:end_line]
+
+
+def _with_annotations(annotations: list[str], lines: list[str], indent: str) -> list[str]:
+    # depending on the parser the declaration range may or may not start at the annotations
+    text = "\n".join(lines)
+    missing = [indent + a for a in annotations if a not in text]
+    return missing + lines
+
+
+def _indent_of(lines: list[str]) -> str:
+    first = next((line for line in lines if line.strip()), "")
+    return first[:len(first) - len(first.lstrip())]
+
+
+def _abridged(callable_, source_lines: list[str], max_lines: int) -> list[str]:
+    lines = _lines(source_lines, callable_.start_line, callable_.end_line)
+    body_start = getattr(callable_, "code_start_line", None) or callable_.start_line
+    head = body_start - callable_.start_line + 1
+    body = lines[head:-1]
+    if len(body) <= max_lines:
+        return lines
+    indent = _indent_of(body)
+    return lines[:head] + body[:max_lines] + [f"{indent}// ... {len(body) - max_lines} lines omitted", lines[-1]]
+
+
+def slice_class(klass, source: str, qualified_name: str, max_test_lines: int = MAX_TEST_LINES) -> str:
+    """Builds the compact prompt payload for one test class from its CLDK `JType` and source."""
+    source_lines = source.splitlines()
+    callables = list(klass.callable_declarations.values())
+
+    extends = list(getattr(klass, "extends_list", None) or [])
+    junit3 = any(e.rsplit(".", 1)[-1] == "TestCase" for e in extends)
+
+    def annotation_names(callable_) -> set[str]:
+        return {_annotation_name(a) for a in callable_.annotations}
+
+    def is_test(callable_) -> bool:
+        return bool(annotation_names(callable_) & TEST_ANNOTATIONS) or (junit3 and _method_name(callable_).startswith("test"))
+
+    def is_fixture(callable_) -> bool:
+        return (
+            callable_.is_constructor
+            or bool(annotation_names(callable_) & FIXTURE_ANNOTATIONS)
+            or (junit3 and _method_name(callable_) in JUNIT3_FIXTURES)
+        )
+
+    fixtures = [c for c in callables if not c.is_implicit and is_fixture(c)]
+    # helpers called from a fixture can hold the actual setup (e.g. cleanDatabase()), so they are kept in full
+    fixture_calls = {site.method_name for c in fixtures for site in c.call_sites}
+
+    simple_name = qualified_name.rsplit(".", 1)[-1].rsplit("$", 1)[-1]
+    declaration = " ".join([*klass.modifiers, "interface" if klass.is_interface else "class", simple_name])
+    if extends:
+        declaration += " extends " + ", ".join(extends)
+    implements = list(getattr(klass, "implements_list", None) or [])
+    if implements:
+        declaration += " implements " + ", ".join(implements)
+
+    out = [f"// Structural slice of {qualified_name}: imports omitted, test method bodies abridged to {max_test_lines} lines"]
+    out += list(klass.annotations)
+    out.append(declaration + " {")
+
+    for field in sorted(klass.field_declarations, key=lambda f: f.start_line):
+        lines = _lines(source_lines, field.start_line, field.end_line)
+        out += _with_annotations(field.annotations, lines, _indent_of(lines))
+
+    for callable_ in sorted((c for c in callables if not c.is_implicit), key=lambda c: c.start_line):
+        if is_fixture(callable_) or _method_name(callable_) in fixture_calls:
+            lines = _lines(source_lines, callable_.start_line, callable_.end_line)
+        elif is_test(callable_):
+            lines = _abridged(callable_, source_lines, max_test_lines)
+        else:
+            lines = _abridged(callable_, source_lines, 0)
+        out.append("")
+        out += _with_annotations(callable_.annotations, lines, _indent_of(lines))
+    out.append("}")
+    return "\n".join(out) + "\n"
+
+
+class PromptSlicer:
+    """Replaces the full source with its structural slice in the pattern prompts, when enabled."""
+
+    def __init__(self, enabled: bool = False, max_test_lines: int = MAX_TEST_LINES):
+        self.enabled = enabled
+        self.max_test_lines = max_test_lines
+        self.sliced = 0
+        self.full = 0
+        self.tokens_full = 0
+        self.tokens_sliced = 0
+        self._lock = threading.Lock()
+
+    def payload(self, project, test_class_name: str, source: str) -> str:
+        if not self.enabled or project is None:
+            return source
+        klass = project.get_class(test_class_name)
+        if klass is None:
+            # no class model (e.g. a parse failure in CLDK): send the full source
+            with self._lock:
+                self.full += 1
+            return source
+        sliced = slice_class(klass, source, test_class_name, self.max_test_lines)
+        tokens_full, tokens_sliced = count_tokens(source), count_tokens(sliced)
+        with self._lock:
+            self.sliced += 1
+            self.tokens_full += tokens_full
+            self.tokens_sliced += tokens_sliced
+        return sliced
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sliced": self.sliced,
+            "full_source": self.full,
+            "tokens_full": self.tokens_full,
+            "tokens_sliced": self.tokens_sliced,
+            "token_reduction": round(1 - self.tokens_sliced / self.tokens_full, 3) if self.tokens_full else None,
+        }
+
+
+slicer = PromptSlicer()
+
+
+def _normalized(pattern_name: str) -> str:
+    return pattern_name.strip().casefold()
+
+
+if __name__ == "__main__":
+    # Token reduction and agreement of sliced prompts with the full-source results in analysis/<project>.json.
+    # The recorded results were sampled at the analysis temperature, so --rerun-full also classifies the
+    # full source again: full-vs-recorded agreement is the noise floor for sliced-vs-recorded.
+    import argparse
+    import json
+    from pathlib import Path
+
+    import llm_dispatch
+    from analysis_cache import clean_head, load_project
+    from llm_dispatch import imap_ordered
+    from pattern_analysis import classify_integration_test_pattern
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("project_path")
+    parser.add_argument("recorded_json", help="full-source results, e.g. analysis/catwatch.json")
+    parser.add_argument("--max-test-lines", type=int, default=MAX_TEST_LINES)
+    parser.add_argument("--sample", type=int, help="only the first N recorded classes")
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    parser.add_argument("--rerun-full", action="store_true", help="also classify the full source again")
+    parser.add_argument("--dry-run", action="store_true", help="only count tokens, no model calls")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+    slicer.enabled = True
+    slicer.max_test_lines = args.max_test_lines
+
+    with open(args.recorded_json, "r") as f:
+        recorded = json.load(f)
+    project = load_project(args.project_path, Path(args.project_path).resolve().name, clean_head(args.project_path))
+    known = set(project.test_class_names())
+    names = [name for name in recorded if name in known][:args.sample]
+
+    def evaluate(test_class_name: str) -> dict:
+        source = project.read_source(test_class_name)
+        sliced = slicer.payload(project, test_class_name, source)
+        row = {"test_class": test_class_name, "tokens_full": count_tokens(source), "tokens_sliced": count_tokens(sliced)}
+        if args.dry_run:
+            return row
+        expected = recorded[test_class_name]
+        candidates = {"sliced": sliced, "full": source} if args.rerun_full else {"sliced": sliced}
+        for label, payload in candidates.items():
+            result = classify_integration_test_pattern(payload)
+            row[f"{label}_pattern_agrees"] = _normalized(result.pattern_name) == _normalized(expected["pattern_name"])
+            row[f"{label}_fit_agrees"] = result.fit_assessment.value == expected["fit_assessment"]
+            row[f"{label}_self_contained_agrees"] = result.is_self_contained == expected["is_self_contained"]
+        return row
+
+    rows = list(imap_ordered(evaluate, names, args.max_workers))
+
+    summary = {
+        "classes": len(rows),
+        "missing_from_project": len([name for name in recorded if name not in known]),
+        "tokens_full": sum(row["tokens_full"] for row in rows),
+        "tokens_sliced": sum(row["tokens_sliced"] for row in rows),
+    }
+    summary["token_reduction"] = round(1 - summary["tokens_sliced"] / summary["tokens_full"], 3) if summary["tokens_full"] else None
+    for key in sorted({key for row in rows for key in row if key.endswith("_agrees")}):
+        summary[key.removesuffix("_agrees") + "_agreement"] = round(sum(row[key] for row in rows) / len(rows), 3)
+
+    print(json.dumps({"summary": summary, "classes": rows}, indent=4))
@@ -0,0 +1,147 @@
+import hashlib
+import re
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+from telemetry import telemetry
+
+DEFAULT_MIRROR_DIR = Path("./.cache/mirrors")
+
+# Non-cone sparse patterns: top-level files, build descriptors and every src/ tree (main and test sources)
+SPARSE_PATTERNS = [
+    "/*",
+    "!/*/",
+    "**/src/",
+    "**/pom.xml",
+    "**/build.gradle",
+    "**/build.gradle.kts",
+    "**/settings.gradle",
+    "**/settings.gradle.kts",
+    "**/gradle.properties",
+    "**/.mvn/",
+    "**/gradle/",
+]
+
+
+class FetchError(Exception):
+    pass
+
+
+def _git(*args: str, cwd: Optional[Path] = None, check: bool = True) -> subprocess.CompletedProcess:
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise FetchError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result
+
+
+class RepoFetcher:
+    """Fetches only the pinned commit of a repo into a bare mirror cache and checks it out as a worktree.
+
+    The mirror for a URL is kept between runs: a commit that is already in the mirror is checked out
+    without touching the network. Fetches are shallow (depth 1) and blobless; file contents are
+    downloaded on checkout, and with `sparse` only the build files and src/ trees are checked out.
+    """
+
+    def __init__(self, mirror_dir: Path = DEFAULT_MIRROR_DIR, sparse: bool = False, sparse_patterns: Optional[list[str]] = None):
+        self.mirror_dir = Path(mirror_dir)
+        self.sparse = sparse
+        self.sparse_patterns = sparse_patterns or SPARSE_PATTERNS
+        self._locks: dict[Path, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def mirror_path(self, url: str) -> Path:
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        return self.mirror_dir / f"{name}-{digest}.git"
+
+    def _lock_for(self, mirror: Path) -> threading.Lock:
+        # fetch and checkout know the mirror by its relative path, remove() by the absolute one from the worktree
+        mirror = Path(mirror).resolve()
+        with self._locks_guard:
+            return self._locks.setdefault(mirror, threading.Lock())
+
+    def _init_mirror(self, mirror: Path, url: str) -> None:
+        mirror.parent.mkdir(parents=True, exist_ok=True)
+        _git("init", "--bare", "--quiet", str(mirror))
+        _git("remote", "add", "origin", url, cwd=mirror)
+        # partial clone settings, so blobs missing from the mirror are fetched on demand
+        _git("config", "core.repositoryformatversion", "1", cwd=mirror)
+        _git("config", "extensions.partialClone", "origin", cwd=mirror)
+        _git("config", "remote.origin.promisor", "true", cwd=mirror)
+        _git("config", "remote.origin.partialclonefilter", "blob:none", cwd=mirror)
+
+    def has_commit(self, mirror: Path, commit_hash: str) -> bool:
+        # Looks at the pinned ref only: reading the object itself would make git lazily fetch it
+        # from the promisor remote instead of going through the shallow fetch below
+        return _git("rev-parse", "--verify", "--quiet", f"refs/pinned/{commit_hash}", cwd=mirror, check=False).returncode == 0
+
+    def _pin(self, mirror: Path, commit_hash: str) -> bool:
+        # keep the commit reachable so gc in the mirror never drops it
+        return _git("update-ref", f"refs/pinned/{commit_hash}", commit_hash, cwd=mirror, check=False).returncode == 0
+
+    def fetch(self, url: str, commit_hash: str) -> Path:
+        mirror = self.mirror_path(url)
+        with self._lock_for(mirror), telemetry.stage("clone"):
+            if not mirror.exists():
+                self._init_mirror(mirror, url)
+            if self.has_commit(mirror, commit_hash):
+                return mirror
+
+            shallow = _git("fetch", "--quiet", "--depth", "1", "--filter=blob:none", "origin", commit_hash, cwd=mirror, check=False)
+            if shallow.returncode != 0 or not self._pin(mirror, commit_hash):
+                # servers that refuse to serve an arbitrary commit: fall back to all refs, still blobless
+                _git("fetch", "--quiet", "--filter=blob:none", "origin", "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*", cwd=mirror)
+                if not self._pin(mirror, commit_hash):
+                    raise FetchError(f"commit {commit_hash} not found in {url}")
+        return mirror
+
+    def checkout(self, url: str, commit_hash: str, folder_path: Path) -> Path:
+        mirror = self.fetch(url, commit_hash)
+        with telemetry.stage("checkout"):
+            return self._checkout(mirror, commit_hash, Path(folder_path))
+
+    def _checkout(self, mirror: Path, commit_hash: str, folder_path: Path) -> Path:
+        if folder_path.exists():
+            self.remove(folder_path)
+        folder_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._lock_for(mirror):
+            _git("worktree", "add", "--quiet", "--detach", "--no-checkout", str(folder_path.absolute()), commit_hash, cwd=mirror)
+        if self.sparse:
+            _git("sparse-checkout", "set", "--no-cone", *self.sparse_patterns, cwd=folder_path)
+        _git("checkout", "--quiet", "--detach", commit_hash, cwd=folder_path)
+        return folder_path
+
+    def remove(self, folder_path: Path) -> None:
+        folder_path = Path(folder_path)
+        # the .git file of a worktree points back at its mirror
+        git_file = folder_path / ".git"
+        mirror = None
+        if git_file.is_file():
+            gitdir = Path(git_file.read_text().strip().removeprefix("gitdir:").strip())
+            mirror = gitdir.parent.parent
+        if mirror is not None and mirror.exists():
+            with self._lock_for(mirror):
+                _git("worktree", "remove", "--force", str(folder_path.absolute()), cwd=mirror, check=False)
+                _git("worktree", "prune", cwd=mirror, check=False)
+        if folder_path.exists():
+            subprocess.check_call(["rm", "-rf", str(folder_path)])
+
+
+fetcher = RepoFetcher()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("commit")
+    parser.add_argument("folder_path")
+    parser.add_argument("--sparse", action="store_true")
+    args = parser.parse_args()
+
+    fetcher.sparse = args.sparse
+    print(fetcher.checkout(args.url, args.commit, Path(args.folder_path)))
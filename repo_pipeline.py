@@ -0,0 +1,271 @@
+import argparse
+import json
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from tqdm import tqdm
+
+import llm_dispatch
+from analysis_cache import ProjectAnalysis, is_cached, load_project
+from ndjson_output import NdjsonWriter, open_ndjson
+from pattern_statistics import STATS_DIR, RatingStage, checkout_repo, classify_into_journal, open_journal, print_run_stats, remove_checkout, write_stats
+from run_journal import RunJournal
+from repo_fetch import fetcher
+from repo_scheduler import plan
+from results_store import store
+from chunked_classification import chunker
+from near_duplicates import DEFAULT_THRESHOLD, dedup
+from prompt_slicing import slicer
+from static_filter import prefilter
+from telemetry import telemetry
+
+# Staged runner for pattern_statistics over many repos:
+#   fetch (pinned commit into the mirror cache + worktree) -> static analysis (CLDK, cached per repo and commit) -> LLM classification
+# Each stage has its own bounded worker pool, so repo N+1 is fetched and analysed while repo N is classified.
+# A checkout is removed as soon as its analysis and test sources are in the analysis cache;
+# `max_checkouts` caps how many exist on disk. A repo holds one of `max_in_flight` slots from the start of its
+# fetch until its classification ends, so fetch and analysis only run that far ahead of classification.
+
+
+@dataclass
+class RepoJob:
+    folder_name: str
+    url: str
+    commit: str
+    folder_path: Optional[Path] = None
+    journal: Optional[RunJournal] = None
+    project: Optional[ProjectAnalysis] = None
+    classified: int = 0
+    skipped: bool = False
+    error: Optional[str] = None
+
+
+class RepoPipeline:
+    STAGES = ("fetch", "analysis", "classify")
+
+    def __init__(
+        self,
+        fetch_workers: int = 2,
+        analysis_workers: int = 1,
+        classify_workers: int = 2,
+        max_checkouts: int = 3,
+        max_in_flight: Optional[int] = None,
+        max_workers: int = 1,
+        fused: bool = False,
+        resume: bool = False,
+        invalidate_analysis: bool = False,
+        temp_dir: Path = Path("./temp"),
+        stats_dir: Path = STATS_DIR,
+        show_progress: bool = True,
+        ndjson: Optional[NdjsonWriter] = None,
+    ):
+        self.max_workers = max_workers
+        self.fused = fused
+        self.resume = resume
+        self.invalidate_analysis = invalidate_analysis
+        self.temp_dir = temp_dir
+        self.stats_dir = stats_dir
+        self.show_progress = show_progress
+        self.ndjson = ndjson
+        self._executors = {
+            "fetch": ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch"),
+            "analysis": ThreadPoolExecutor(max_workers=analysis_workers, thread_name_prefix="analysis"),
+            "classify": ThreadPoolExecutor(max_workers=classify_workers, thread_name_prefix="classify"),
+        }
+        self._checkouts = threading.BoundedSemaphore(max_checkouts)
+        # by default the repos being classified plus one prepared ahead per analysis worker
+        self.max_in_flight = max_in_flight or classify_workers + analysis_workers
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._on_disk = 0
+        self._finished = threading.Event()
+        self._bars: dict[str, tqdm] = {}
+
+    def run(self, repos_info: dict) -> list[RepoJob]:
+        jobs = [RepoJob(name, details["github_url"], details["commit"]) for name, details in repos_info.items()]
+        if not jobs:
+            return jobs
+
+        self._remaining = len(jobs)
+        self._finished.clear()
+        self._bars = {
+            stage: tqdm(total=len(jobs), desc=f"{stage:<8}", position=i, unit="repo", disable=not self.show_progress)
+            for i, stage in enumerate(self.STAGES)
+        }
+        try:
+            for job in jobs:
+                # released in _finish, whichever stage the repo stops at
+                self._slots.acquire()
+                self._submit("fetch", self._fetch, job)
+            self._finished.wait()
+        finally:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            for bar in self._bars.values():
+                bar.close()
+        return jobs
+
+    def _submit(self, stage: str, fn, job: RepoJob) -> None:
+        self._executors[stage].submit(self._run_stage, stage, fn, job)
+
+    def _run_stage(self, stage: str, fn, job: RepoJob) -> None:
+        try:
+            with telemetry.scope(repo=job.folder_name):
+                next_stage = fn(job)
+        except Exception:
+            job.error = f"{stage}: {traceback.format_exc(limit=3)}"
+            tqdm.write(f"[{job.folder_name}] {stage} failed")
+            next_stage = None
+        finally:
+            self._bars[stage].update(1)
+
+        if next_stage is None:
+            self._cleanup(job)
+            self._finish(job, stage)
+        else:
+            self._submit(next_stage, getattr(self, f"_{next_stage}"), job)
+
+    def _fetch(self, job: RepoJob) -> Optional[str]:
+        job.journal = open_journal(job.folder_name, resume=self.resume)
+        if self.ndjson is not None:
+            # classes finished by an earlier run come first, so the stream is complete
+            for test_class_name, result in job.journal.results():
+                self.ndjson.write(job.folder_name, test_class_name, {RatingStage.name: result})
+        if self.resume and job.journal.is_done():
+            if not (self.stats_dir / f"{job.folder_name}.json").exists():
+                write_stats(job.folder_name, job.journal, self.stats_dir)
+            job.skipped = True
+            return None
+        if not self.invalidate_analysis and is_cached(job.folder_name, job.commit):
+            # the cached analysis carries the test sources, no checkout needed
+            return "analysis"
+
+        # blocks while max_checkouts repos are on disk; released once their sources are in the analysis cache
+        self._checkouts.acquire()
+        try:
+            folder_path = checkout_repo(job.folder_name, job.url, job.commit, self.temp_dir)
+        except Exception:
+            self._checkouts.release()
+            raise
+        if folder_path is None:
+            self._checkouts.release()
+            job.error = f"fetch: failed to clone {job.url}"
+            return None
+        job.folder_path = folder_path
+        self._count_checkout(+1)
+        return "analysis"
+
+    def _analysis(self, job: RepoJob) -> Optional[str]:
+        project_path = str(job.folder_path) if job.folder_path is not None else None
+        job.project = load_project(project_path, job.folder_name, job.commit, invalidate=self.invalidate_analysis)
+        self._cleanup(job)
+        return "classify"
+
+    def _classify(self, job: RepoJob) -> Optional[str]:
+        test_sources = job.project.iter_sources(skip=job.journal.completed_keys())
+        job.classified = classify_into_journal(test_sources, job.journal, self.max_workers, self.fused, job.project, self.ndjson)
+        job.journal.close()
+        write_stats(job.folder_name, job.journal, self.stats_dir)
+        return None
+
+    def _cleanup(self, job: RepoJob) -> None:
+        with self._lock:
+            folder_path, job.folder_path = job.folder_path, None
+        if folder_path is not None:
+            remove_checkout(folder_path)
+            self._checkouts.release()
+            self._count_checkout(-1)
+
+    def _finish(self, job: RepoJob, stage: str) -> None:
+        if job.journal is not None:
+            job.journal.close()
+        # the loaded analysis is not needed any more; the returned jobs keep only the outcome
+        job.project = None
+        self._slots.release()
+        # a repo that stops early still counts as done for the stages it skipped
+        skipped = self.STAGES[self.STAGES.index(stage) + 1:]
+        for later in skipped:
+            self._bars[later].update(1)
+        with self._lock:
+            self._remaining -= 1
+            if self._remaining == 0:
+                self._finished.set()
+
+    def _count_checkout(self, delta: int) -> None:
+        with self._lock:
+            self._on_disk += delta
+            on_disk = self._on_disk
+        self._bars["fetch"].set_postfix(on_disk=on_disk, refresh=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repos_info_json")
+    parser.add_argument("--fetch-workers", type=int, default=2, help="repos cloned at once")
+    parser.add_argument("--analysis-workers", type=int, default=1, help="CLDK analyses at once")
+    parser.add_argument("--classify-workers", type=int, default=2, help="repos classified at once")
+    parser.add_argument("--max-checkouts", type=int, default=3, help="maximum checkouts on disk")
+    parser.add_argument("--max-in-flight", type=int, help="maximum repos between the start of their fetch and the end of their classification (default: classify + analysis workers)")
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    parser.add_argument("--fused", action="store_true", help="gate and rate each class in a single LLM call")
+    parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompt instead of the full source")
+    parser.add_argument("--dedup", action="store_true", help="classify one representative per cluster of near-duplicate test classes")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity of a near-duplicate")
+    parser.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks classified separately")
+    parser.add_argument("--sparse", action="store_true", help="check out only build files and src/ trees")
+    parser.add_argument("--resume", action="store_true", help="skip repos and test classes already in the journal")
+    parser.add_argument("--invalidate-analysis", action="store_true", help="re-run CLDK even when a cached analysis exists")
+    parser.add_argument("--schedule", action="store_true", help="process repos longest-first by estimated cost (see repo_scheduler.py)")
+    parser.add_argument("--max-run-tokens", type=float, help="only the most informative repos whose estimated tokens fit this budget (implies --schedule)")
+    parser.add_argument("--max-run-hours", type=float, help="only the most informative repos whose estimated time fits this budget (implies --schedule)")
+    parser.add_argument("--store", action="store_true", help="load each stats/<repo>.json into the results store as it is written (see results_store.py)")
+    parser.add_argument("--ndjson", metavar="PATH", help="also stream each class as an NDJSON line as soon as it is classified ('-' for stdout)")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+    prefilter.enabled = not args.no_prefilter
+    chunker.token_budget = args.token_budget
+    slicer.enabled = args.slice
+    dedup.enabled = args.dedup
+    dedup.threshold = args.dedup_threshold
+    fetcher.sparse = args.sparse
+    store.enabled = args.store
+    ndjson = open_ndjson(args.ndjson) if args.ndjson else None
+    # with the stream on stdout, everything else goes to stderr
+    log = sys.stderr if args.ndjson == "-" else None
+
+    with open(args.repos_info_json, "r") as f:
+        repos_info = json.load(f)
+    if args.schedule or args.max_run_tokens is not None or args.max_run_hours is not None:
+        max_seconds = args.max_run_hours * 3600 if args.max_run_hours is not None else None
+        repos_info, _, left_out = plan(repos_info, max_tokens=args.max_run_tokens, max_seconds=max_seconds, workers=args.classify_workers)
+        if left_out:
+            print(f"Budget: {len(left_out)} repos left out", file=log)
+
+    pipeline = RepoPipeline(
+        fetch_workers=args.fetch_workers,
+        analysis_workers=args.analysis_workers,
+        classify_workers=args.classify_workers,
+        max_checkouts=args.max_checkouts,
+        max_in_flight=args.max_in_flight,
+        max_workers=args.max_workers,
+        fused=args.fused,
+        resume=args.resume,
+        invalidate_analysis=args.invalidate_analysis,
+        ndjson=ndjson,
+    )
+    jobs = pipeline.run(repos_info)
+
+    for job in jobs:
+        if job.error:
+            print(f"{job.folder_name}: {job.error}", file=log)
+    if ndjson is not None:
+        ndjson.close()
+    print_run_stats(file=log)
@@ -0,0 +1,202 @@
+import json
+import math
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from analysis_cache import cache_dir_for
+from telemetry import METRICS_DIR
+
+# Orders the repos of a run by estimated cost, longest first (LPT), so the parallel workers do not sit idle
+# behind one huge repo at the end, and optionally keeps only the most informative repos that fit a token or
+# time budget. Cost is estimated, best source first, from:
+#   history      the repo's own totals in an earlier run's metrics file (metrics/*.json, see telemetry.py)
+#   source size  bytes and count of its test sources in the analysis cache, times rates fitted on the history
+#   endpoints    endpoint_method from combined.json, times rates fitted on the history
+# Without any history the defaults below are used; they only matter for budgets, the order only needs ratios.
+
+DEFAULT_TOKENS_PER_SOURCE_BYTE = 0.6
+DEFAULT_SECONDS_PER_TEST_CLASS = 2.0
+DEFAULT_TEST_CLASSES_PER_ENDPOINT = 0.5
+DEFAULT_COST = {"seconds": 60.0, "tokens": 20_000.0}
+
+
+@dataclass
+class RepoEstimate:
+    repo: str
+    seconds: float
+    tokens: float
+    basis: str
+    value: float
+
+
+def informativeness(details: dict) -> float:
+    # repos with more REST endpoints tend to have more integration tests, with diminishing returns
+    return 1.0 + math.log1p(details.get("endpoint_method") or 0) + math.log1p(details.get("endppoint_class", details.get("endpoint_class")) or 0)
+
+
+def load_history(metrics_dir: Path = METRICS_DIR) -> dict[str, dict]:
+    """{repo: {"seconds", "tokens"}} from the most recent metrics file that has the repo."""
+    history = {}
+    for path in sorted(metrics_dir.glob("*.json"), key=lambda p: p.stat().st_mtime) if metrics_dir.is_dir() else []:
+        try:
+            with open(path, "r") as f:
+                repos = json.load(f).get("repos", {})
+        except (OSError, json.JSONDecodeError):
+            continue
+        for repo, entry in repos.items():
+            stages = entry.get("stages", {})
+            seconds = entry.get("elapsed_s")
+            if seconds is None:
+                # metrics written before elapsed_s: the stage totals count concurrent classes in full,
+                # so this overestimates the classify time
+                seconds = sum(totals["wall_s"] for stage, totals in stages.items() if stage not in ("llm", "retry"))
+            tokens = entry.get("prompt_tokens", 0) + entry.get("completion_tokens", 0)
+            if "classify" in stages:
+                history[repo] = {"seconds": seconds, "tokens": tokens}
+    return history
+
+
+def cached_sources(repo: str, commit: str) -> Optional[dict]:
+    """Test class count and total source bytes from the analysis cache, when the (repo, commit) is cached."""
+    cache_dir = cache_dir_for(repo, commit)
+    try:
+        with open(cache_dir / "test_entities.json", "r") as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    source_bytes = sum((cache_dir / entry["source"]).stat().st_size for entry in entries.values() if (cache_dir / entry["source"]).exists())
+    return {"test_classes": len(entries), "source_bytes": source_bytes}
+
+
+def _median_ratio(pairs: list[tuple[float, float]]) -> Optional[float]:
+    ratios = [a / b for a, b in pairs if b]
+    return statistics.median(ratios) if ratios else None
+
+
+class CostModel:
+    def __init__(self, history: Optional[dict[str, dict]] = None):
+        self.history = load_history() if history is None else history
+        self.rates: dict[str, float] = {}
+        self.sources: dict[str, Optional[dict]] = {}
+
+    def fit(self, repos_info: dict) -> "CostModel":
+        self.sources = sources = {repo: cached_sources(repo, details["commit"]) for repo, details in repos_info.items()}
+        with_sources = [(self.history[r], s) for r, s in sources.items() if r in self.history and s]
+        with_endpoints = [(self.history[r], repos_info[r]) for r in repos_info if r in self.history and repos_info[r].get("endpoint_method")]
+
+        def rate(name: str, pairs: list[tuple[float, float]], default: float) -> None:
+            fitted = _median_ratio(pairs)
+            self.rates[name] = fitted if fitted is not None else default
+
+        rate("tokens_per_byte", [(h["tokens"], s["source_bytes"]) for h, s in with_sources], DEFAULT_TOKENS_PER_SOURCE_BYTE)
+        rate("seconds_per_class", [(h["seconds"], s["test_classes"]) for h, s in with_sources], DEFAULT_SECONDS_PER_TEST_CLASS)
+        mean_class_bytes = _median_ratio([(s["source_bytes"], s["test_classes"]) for s in sources.values() if s]) or 4000.0
+        rate("tokens_per_endpoint", [(h["tokens"], d["endpoint_method"]) for h, d in with_endpoints],
+             DEFAULT_TEST_CLASSES_PER_ENDPOINT * mean_class_bytes * self.rates["tokens_per_byte"])
+        rate("seconds_per_endpoint", [(h["seconds"], d["endpoint_method"]) for h, d in with_endpoints],
+             DEFAULT_TEST_CLASSES_PER_ENDPOINT * self.rates["seconds_per_class"])
+        return self
+
+    def estimate(self, repo: str, details: dict) -> RepoEstimate:
+        value = informativeness(details)
+        if repo in self.history:
+            return RepoEstimate(repo, self.history[repo]["seconds"], self.history[repo]["tokens"], "history", value)
+        sources = self.sources.get(repo)
+        if sources:
+            seconds = sources["test_classes"] * self.rates["seconds_per_class"]
+            return RepoEstimate(repo, seconds, sources["source_bytes"] * self.rates["tokens_per_byte"], "source size", value)
+        endpoints = details.get("endpoint_method")
+        if endpoints:
+            return RepoEstimate(repo, endpoints * self.rates["seconds_per_endpoint"], endpoints * self.rates["tokens_per_endpoint"], "endpoints", value)
+        return RepoEstimate(repo, DEFAULT_COST["seconds"], DEFAULT_COST["tokens"], "default", value)
+
+
+def makespan(seconds: list[float], workers: int) -> float:
+    """Finish time when the jobs are handed, in this order, to whichever of `workers` frees up first."""
+    loads = [0.0] * max(1, workers)
+    for s in seconds:
+        loads[loads.index(min(loads))] += s
+    return max(loads)
+
+
+def plan(repos_info: dict, model: Optional[CostModel] = None, max_tokens: Optional[float] = None,
+         max_seconds: Optional[float] = None, workers: int = 1) -> tuple[dict, list[RepoEstimate], list[RepoEstimate]]:
+    """Returns (repos_info in run order, the scheduled estimates, the estimates left out by the budget).
+
+    With a budget, repos are picked greedily by informativeness per unit of cost until the budget is spent;
+    `max_seconds` is wall time, spread over `workers`.
+    """
+    model = model or CostModel().fit(repos_info)
+    estimates = [model.estimate(repo, details) for repo, details in repos_info.items()]
+
+    left_out = []
+    if max_tokens is not None or max_seconds is not None:
+        def cost(e: RepoEstimate) -> float:
+            # the share of the tighter budget this repo uses
+            shares = []
+            if max_tokens is not None:
+                shares.append(e.tokens / max_tokens if max_tokens else math.inf)
+            if max_seconds is not None:
+                shares.append(e.seconds / (max_seconds * workers) if max_seconds else math.inf)
+            return max(shares)
+
+        picked, tokens, seconds = [], 0.0, 0.0
+        for e in sorted(estimates, key=lambda e: e.value / cost(e) if cost(e) else math.inf, reverse=True):
+            if (max_tokens is not None and tokens + e.tokens > max_tokens) or (max_seconds is not None and seconds + e.seconds > max_seconds * workers):
+                left_out.append(e)
+                continue
+            picked.append(e)
+            tokens += e.tokens
+            seconds += e.seconds
+        estimates = picked
+
+    # longest processing time first
+    estimates.sort(key=lambda e: e.seconds, reverse=True)
+    return {e.repo: repos_info[e.repo] for e in estimates}, estimates, left_out
+
+
+def print_plan(repos_info: dict, estimates: list[RepoEstimate], left_out: list[RepoEstimate], workers: int) -> None:
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=f"Run order ({len(estimates)} repos, {len(left_out)} left out by the budget)")
+    for column in ("#", "repo", "est. s", "est. tokens", "basis", "value"):
+        table.add_column(column, justify="left" if column in ("repo", "basis") else "right")
+    for i, e in enumerate(estimates, 1):
+        table.add_row(str(i), e.repo, f"{e.seconds:.0f}", f"{e.tokens:.0f}", e.basis, f"{e.value:.2f}")
+    console = Console()
+    console.print(table)
+
+    by_repo = {e.repo: e for e in estimates}
+    in_input_order = [by_repo[repo].seconds for repo in repos_info if repo in by_repo]
+    console.print(
+        f"Estimated total: {sum(e.seconds for e in estimates):.0f} s, {sum(e.tokens for e in estimates):.0f} tokens. "
+        f"Makespan on {workers} workers: {makespan([e.seconds for e in estimates], workers):.0f} s longest-first, "
+        f"{makespan(in_input_order, workers):.0f} s in input order."
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repos_info_json", help="e.g. combined.json")
+    parser.add_argument("--workers", type=int, default=2, help="repos processed at once")
+    parser.add_argument("--max-run-tokens", type=float, help="token budget for the whole run")
+    parser.add_argument("--max-run-hours", type=float, help="wall time budget for the whole run")
+    parser.add_argument("--metrics-dir", default=str(METRICS_DIR), help="metrics of earlier runs")
+    parser.add_argument("--output", help="write the scheduled repos, in order, as a repos info json")
+    args = parser.parse_args()
+
+    with open(args.repos_info_json, "r") as f:
+        repos_info = json.load(f)
+
+    model = CostModel(load_history(Path(args.metrics_dir))).fit(repos_info)
+    max_seconds = args.max_run_hours * 3600 if args.max_run_hours is not None else None
+    ordered, estimates, left_out = plan(repos_info, model, args.max_run_tokens, max_seconds, args.workers)
+    print_plan(repos_info, estimates, left_out, args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(ordered, f, indent=4)
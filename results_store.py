@@ -0,0 +1,365 @@
+import json
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from static_filter import API_CALLS, CLEAR_AND_RELOAD, MANUAL, RESTART, known_pattern
+
+# Indexed SQLite store of the per-project outputs (stats/<repo>.json, analysis/<repo>.json) and the endpoint
+# counts from combined.json, for corpus-level reports. Ingest is incremental: a file is only re-read when its
+# size or mtime changed, and its rows replace that repo's previous rows. The free-text patterns are kept as
+# they are and also mapped onto a `pattern_group`. The reports read `pattern_counts`, the per-repo class counts
+# by (pattern group, confidence, fit), which is recomputed for a repo whenever its file is ingested.
+
+DEFAULT_STORE_PATH = Path("./.cache/results.sqlite")
+ANALYSIS_DIR = Path("./analysis")
+STATS_DIR = Path("./stats")
+ENDPOINTS_JSON = Path("./combined.json")
+
+# pattern groups: the static_filter pattern keys and these
+NOT_INTEGRATION, UNRECOGNIZED, NEW_PATTERN, OTHER = "not_integration", "unrecognized", "new_pattern", "other"
+
+STATS_PATTERNS = {
+    "Manual setup in tests": MANUAL,
+    "Restart": RESTART,
+    "Clear and reload": CLEAR_AND_RELOAD,
+    "API calls": API_CALLS,
+    "Not an integration test": NOT_INTEGRATION,
+}
+
+# repo size buckets by number of endpoint methods
+SIZE_BUCKETS = ((10, "1-9"), (50, "10-49"), (200, "50-199"), (None, "200+"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    endpoint_methods INTEGER,
+    endpoint_classes INTEGER,
+    github_url TEXT,
+    commit_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    source TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    test_class TEXT NOT NULL,
+    pattern TEXT,
+    pattern_group TEXT NOT NULL,
+    fit_assessment TEXT,
+    confidence TEXT,
+    is_self_contained INTEGER,
+    duplicate_of TEXT,
+    PRIMARY KEY (source, repo, test_class)
+);
+CREATE INDEX IF NOT EXISTS results_group ON results (source, pattern_group);
+CREATE TABLE IF NOT EXISTS pattern_counts (
+    source TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    pattern_group TEXT NOT NULL,
+    confidence TEXT,
+    fit_assessment TEXT,
+    classes INTEGER NOT NULL,
+    self_contained INTEGER
+);
+CREATE INDEX IF NOT EXISTS pattern_counts_repo ON pattern_counts (source, repo);
+CREATE INDEX IF NOT EXISTS pattern_counts_group ON pattern_counts (source, pattern_group, confidence, fit_assessment, classes, self_contained);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    repo TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+"""
+
+
+def stats_pattern_group(pattern: str) -> str:
+    if pattern.startswith("No recognized pattern"):
+        return UNRECOGNIZED
+    return STATS_PATTERNS.get(pattern, OTHER)
+
+
+def analysis_pattern_group(pattern_name: str, fit_assessment: Optional[str]) -> str:
+    group = known_pattern(pattern_name)
+    if group is not None:
+        return group
+    return NEW_PATTERN if fit_assessment == "No Fit (New Pattern)" else OTHER
+
+
+def size_bucket_sql(column: str) -> str:
+    cases = " ".join(f"WHEN {column} < {limit} THEN '{label}'" for limit, label in SIZE_BUCKETS if limit is not None)
+    return f"CASE WHEN {column} IS NULL THEN 'unknown' {cases} ELSE '{SIZE_BUCKETS[-1][1]}' END"
+
+
+def pearson(xs: list[float], ys: list[float]) -> Optional[float]:
+    if len(xs) < 2:
+        return None
+    try:
+        return statistics.correlation(xs, ys)
+    except statistics.StatisticsError:
+        # one of the series is constant
+        return None
+
+
+class ResultsStore:
+    """The SQLite store; with `enabled`, the scripts ingest each stats/analysis file as soon as they write it."""
+
+    def __init__(self, path: Path | str = DEFAULT_STORE_PATH, enabled: bool = False):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(SCHEMA)
+            return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def ingest_endpoints(self, endpoints_json: Path = ENDPOINTS_JSON) -> int:
+        with open(endpoints_json, "r") as f:
+            repos = json.load(f)
+        rows = [
+            # combined.json spells the class count "endppoint_class"
+            (repo, info.get("endpoint_method"), info.get("endppoint_class", info.get("endpoint_class")), info.get("github_url"), info.get("commit"))
+            for repo, info in repos.items()
+        ]
+        conn = self.conn
+        with self._lock, conn:
+            conn.executemany(
+                "INSERT INTO repos VALUES (?, ?, ?, ?, ?) ON CONFLICT (repo) DO UPDATE SET "
+                "endpoint_methods = excluded.endpoint_methods, endpoint_classes = excluded.endpoint_classes, "
+                "github_url = excluded.github_url, commit_hash = excluded.commit_hash",
+                rows,
+            )
+        return len(rows)
+
+    def _result_rows(self, source: str, repo: str, data) -> Iterable[tuple]:
+        if source == "stats":
+            for entry in data:
+                pattern = entry["pattern"]
+                yield (source, repo, entry["test_class"], pattern, stats_pattern_group(pattern), None, None, None, entry.get("duplicate_of"))
+        else:
+            for test_class, analysis in data.items():
+                fit = analysis.get("fit_assessment")
+                yield (
+                    source, repo, test_class, analysis.get("pattern_name"), analysis_pattern_group(analysis.get("pattern_name") or "", fit),
+                    fit, analysis.get("confidence_score"), analysis.get("is_self_contained"), analysis.get("duplicate_of"),
+                )
+
+    @staticmethod
+    def _pattern_counts(rows: list[tuple]) -> list[tuple]:
+        counts: dict[tuple, list[int]] = {}
+        for source, repo, _, _, group, fit, confidence, self_contained, _ in rows:
+            totals = counts.setdefault((source, repo, group, confidence, fit), [0, 0])
+            totals[0] += 1
+            totals[1] += bool(self_contained)
+        return [(*key, classes, self_contained) for key, (classes, self_contained) in counts.items()]
+
+    def ingest_file(self, path: Path, source: str, force: bool = False) -> bool:
+        """Loads one stats/analysis file; returns False when it is unchanged since the last ingest."""
+        path = Path(path)
+        stat = path.stat()
+        key = str(path.resolve())
+        conn = self.conn
+        if not force:
+            with self._lock:
+                known = conn.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (key,)).fetchone()
+            if known == (stat.st_size, stat.st_mtime_ns):
+                return False
+
+        with open(path, "r") as f:
+            data = json.load(f)
+        repo = path.stem
+        rows = list(self._result_rows(source, repo, data))
+        with self._lock, conn:
+            conn.execute("DELETE FROM results WHERE source = ? AND repo = ?", (source, repo))
+            conn.execute("DELETE FROM pattern_counts WHERE source = ? AND repo = ?", (source, repo))
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO pattern_counts VALUES (?, ?, ?, ?, ?, ?, ?)", self._pattern_counts(rows))
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, repo, stat.st_size, stat.st_mtime_ns, time.time()),
+            )
+        return True
+
+    def ingest_dir(self, directory: Path, source: str, force: bool = False) -> dict:
+        counts = {"ingested": 0, "unchanged": 0, "removed": 0}
+        directory = Path(directory)
+        present = set()
+        for path in sorted(directory.glob("*.json")) if directory.is_dir() else []:
+            present.add(str(path.resolve()))
+            counts["ingested" if self.ingest_file(path, source, force) else "unchanged"] += 1
+
+        # rows of files that were deleted since the last ingest go too
+        prefix = str(directory.resolve()) + "/"
+        conn = self.conn
+        with self._lock, conn:
+            for key, repo in conn.execute("SELECT path, repo FROM files WHERE source = ?", (source,)).fetchall():
+                if key.startswith(prefix) and key not in present:
+                    conn.execute("DELETE FROM results WHERE source = ? AND repo = ?", (source, repo))
+                    conn.execute("DELETE FROM pattern_counts WHERE source = ? AND repo = ?", (source, repo))
+                    conn.execute("DELETE FROM files WHERE path = ?", (key,))
+                    counts["removed"] += 1
+        return counts
+
+    def record_file(self, path: Path, source: str) -> None:
+        # called by the scripts after writing an output file
+        if self.enabled:
+            self.ingest_file(path, source, force=True)
+
+    def query(self, sql: str, params: tuple = ()) -> tuple[list[str], list[tuple]]:
+        conn = self.conn
+        with self._lock:
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall()
+        return [d[0] for d in cursor.description or ()], rows
+
+    def pattern_distribution(self, source: str, by: Optional[str] = None) -> tuple[list[str], list[tuple]]:
+        group_column = {
+            None: None,
+            "repo": "counts.repo",
+            "size": size_bucket_sql("repos.endpoint_methods"),
+            "confidence": "counts.confidence",
+        }[by]
+        # the classes per group are summed first, so the window can partition by the group's alias
+        # (a number in PARTITION BY is a constant, not a column position as in GROUP BY)
+        grouped = ("grp, " if group_column else "") + "pattern_group"
+        _, rows = self.query(
+            f"SELECT {grouped}, classes, ROUND(100.0 * classes / SUM(classes) OVER ({'PARTITION BY grp' if group_column else ''}), 1) "
+            f"FROM (SELECT {group_column + ' AS grp, ' if group_column else ''}counts.pattern_group AS pattern_group, SUM(classes) AS classes "
+            f"FROM pattern_counts AS counts {'LEFT JOIN repos ON repos.repo = counts.repo' if by == 'size' else ''} WHERE counts.source = ? "
+            f"GROUP BY {grouped}) ORDER BY {'grp, ' if group_column else ''}classes DESC",
+            (source,),
+        )
+        return ([by] if by else []) + ["pattern_group", "classes", "percent"], rows
+
+    def endpoint_correlation(self, source: str) -> tuple[list[str], list[tuple]]:
+        """Per pattern group: repos using it, their endpoint counts, and the Pearson correlation between a
+        repo's endpoint methods and the group's share of that repo's integration tests."""
+        _, rows = self.query(
+            "SELECT counts.repo, repos.endpoint_methods, counts.pattern_group, SUM(classes) FROM pattern_counts AS counts "
+            "JOIN repos ON repos.repo = counts.repo WHERE counts.source = ? AND counts.pattern_group != ? "
+            "AND repos.endpoint_methods IS NOT NULL GROUP BY counts.repo, counts.pattern_group",
+            (source, NOT_INTEGRATION),
+        )
+        endpoints: dict[str, int] = {}
+        counts: dict[str, dict[str, int]] = {}
+        for repo, endpoint_methods, group, classes in rows:
+            endpoints[repo] = endpoint_methods
+            counts.setdefault(group, {})[repo] = classes
+        totals = {repo: sum(c.get(repo, 0) for c in counts.values()) for repo in endpoints}
+
+        table = []
+        repos = sorted(endpoints)
+        for group in sorted(counts, key=lambda g: -len(counts[g])):
+            users = [endpoints[repo] for repo in counts[group]]
+            r = pearson([endpoints[repo] for repo in repos], [counts[group].get(repo, 0) / totals[repo] for repo in repos])
+            table.append((group, len(users), round(float(statistics.median(users)), 1), round(statistics.fmean(users), 1), round(r, 3) if r is not None else None))
+        return ["pattern_group", "repos", "median_endpoint_methods", "mean_endpoint_methods", "pearson_r"], table
+
+    def confidence_breakdown(self) -> tuple[list[str], list[tuple]]:
+        _, rows = self.query(
+            "SELECT pattern_group, confidence, fit_assessment, SUM(classes), ROUND(100.0 * SUM(self_contained) / SUM(classes), 1) "
+            "FROM pattern_counts WHERE source = 'analysis' GROUP BY pattern_group, confidence, fit_assessment "
+            "ORDER BY pattern_group, confidence, fit_assessment"
+        )
+        return ["pattern_group", "confidence", "fit_assessment", "classes", "self_contained_percent"], rows
+
+    def repo_summary(self, source: str) -> tuple[list[str], list[tuple]]:
+        return self.query(
+            "WITH counts AS (SELECT repo, pattern_group, SUM(classes) AS n FROM pattern_counts WHERE source = ? GROUP BY repo, pattern_group), "
+            "top AS (SELECT repo, pattern_group, ROW_NUMBER() OVER (PARTITION BY repo ORDER BY n DESC, pattern_group) AS rank "
+            "FROM counts WHERE pattern_group != ?) "
+            "SELECT counts.repo, repos.endpoint_methods, repos.endpoint_classes, SUM(counts.n) AS test_classes, "
+            "SUM(CASE WHEN counts.pattern_group != ? THEN counts.n ELSE 0 END) AS integration_tests, top.pattern_group AS top_pattern "
+            "FROM counts LEFT JOIN repos ON repos.repo = counts.repo LEFT JOIN top ON top.repo = counts.repo AND top.rank = 1 "
+            "GROUP BY counts.repo ORDER BY integration_tests DESC",
+            (source, NOT_INTEGRATION, NOT_INTEGRATION),
+        )
+
+
+store = ResultsStore()
+
+
+def print_table(columns: list[str], rows: list[tuple], title: str, as_json: bool = False) -> None:
+    if as_json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=4))
+        return
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=title)
+    for column in columns:
+        table.add_column(column)
+    for row in rows:
+        table.add_row(*("" if value is None else str(value) for value in row))
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=str(DEFAULT_STORE_PATH), help="SQLite file")
+    parser.add_argument("--json", action="store_true", help="print reports as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="load new and changed output files")
+    ingest.add_argument("--analysis-dir", default=str(ANALYSIS_DIR))
+    ingest.add_argument("--stats-dir", default=str(STATS_DIR))
+    ingest.add_argument("--endpoints", default=str(ENDPOINTS_JSON), help="combined.json with the endpoint counts")
+    ingest.add_argument("--full", action="store_true", help="re-read every file")
+
+    for name, help_text in (
+        ("patterns", "pattern distribution"),
+        ("endpoints", "endpoint counts and their correlation with each pattern"),
+        ("repos", "per-repo summary"),
+    ):
+        report = commands.add_parser(name, help=help_text)
+        report.add_argument("--source", choices=["stats", "analysis"], default="analysis")
+        if name == "patterns":
+            report.add_argument("--by", choices=["repo", "size", "confidence"], help="break the distribution down")
+    commands.add_parser("confidence", help="confidence and fit assessment per pattern (analysis results)")
+    sql = commands.add_parser("sql", help="run a query against the store")
+    sql.add_argument("query")
+    args = parser.parse_args()
+
+    results = ResultsStore(args.store)
+    start = time.perf_counter()
+
+    if args.command == "ingest":
+        counts = {"repos": results.ingest_endpoints(Path(args.endpoints)) if Path(args.endpoints).exists() else 0}
+        counts["analysis"] = results.ingest_dir(Path(args.analysis_dir), "analysis", args.full)
+        counts["stats"] = results.ingest_dir(Path(args.stats_dir), "stats", args.full)
+        elapsed = time.perf_counter() - start
+        print(json.dumps(counts, indent=4))
+    else:
+        if args.command == "patterns":
+            report, title = results.pattern_distribution(args.source, args.by), f"Patterns ({args.source})"
+        elif args.command == "endpoints":
+            report, title = results.endpoint_correlation(args.source), f"Endpoints by pattern ({args.source})"
+        elif args.command == "repos":
+            report, title = results.repo_summary(args.source), f"Repos ({args.source})"
+        elif args.command == "confidence":
+            report, title = results.confidence_breakdown(), "Confidence (analysis)"
+        else:
+            report, title = results.query(args.query), "Query"
+        elapsed = time.perf_counter() - start
+        print_table(*report, title, args.json)
+
+    if not args.json:
+        print(f"{elapsed * 1000:.1f} ms")
@@ -0,0 +1,138 @@
+import json
+import os
+import textwrap
+import threading
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Optional
+
+# Append-only JSONL journal of per-test-class results. Every record is flushed and fsynced, so a crash
+# or a rate-limit abort loses at most the class in flight; `--resume` skips what is already recorded.
+# Record lines are {"key": <test class>, "result": <json>}; a final {"done": true} line marks a finished run.
+
+JOURNAL_DIR = Path("./journal")
+
+
+class RunJournal:
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume and self.path.exists():
+            self.path.unlink()
+        elif self.path.exists():
+            _truncate_torn_tail(self.path)
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+
+    def _append(self, entry: dict) -> None:
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record(self, key: str, result: Any) -> None:
+        self._append({"key": key, "result": result})
+
+    def mark_done(self) -> None:
+        self._append({"done": True})
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def entries(self) -> Iterator[dict]:
+        return read_entries(self.path)
+
+    def completed_keys(self) -> set[str]:
+        return {entry["key"] for entry in self.entries() if "key" in entry}
+
+    def is_done(self) -> bool:
+        return any(entry.get("done") for entry in self.entries())
+
+    def results(self) -> Iterator[tuple[str, Any]]:
+        # first record wins, in journal order
+        seen = set()
+        for entry in self.entries():
+            if "key" in entry and entry["key"] not in seen:
+                seen.add(entry["key"])
+                yield entry["key"], entry["result"]
+
+
+def _truncate_torn_tail(path: Path) -> None:
+    # drop a partial last line so the next record starts on a line of its own
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            block = f.read(position - start)
+            if position == end and block.endswith(b"\n"):
+                return
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def read_entries(path: Path) -> Iterator[dict]:
+    if not Path(path).exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # a torn last line from a crash mid-write
+                continue
+
+
+# Streaming writers producing byte-for-byte the output of json.dump(..., indent=4)
+# without holding the whole document in memory.
+
+class JsonArrayWriter:
+    def __init__(self, f: IO[str]):
+        self.f = f
+        self.empty = True
+
+    def add(self, item: Any) -> None:
+        self.f.write("[\n" if self.empty else ",\n")
+        self.f.write(textwrap.indent(json.dumps(item, indent=4), "    "))
+        self.empty = False
+
+    def close(self) -> None:
+        self.f.write("[]" if self.empty else "\n]")
+
+
+class JsonObjectWriter:
+    def __init__(self, f: IO[str]):
+        self.f = f
+        self.empty = True
+
+    def add(self, key: str, value: Any) -> None:
+        self.f.write("{\n" if self.empty else ",\n")
+        self.f.write("    " + json.dumps(key) + ": " + json.dumps(value, indent=4).replace("\n", "\n    "))
+        self.empty = False
+
+    def close(self) -> None:
+        self.f.write("{}" if self.empty else "\n}")
+
+
+def write_json_array(items: Iterable[Any], f: IO[str]) -> None:
+    writer = JsonArrayWriter(f)
+    for item in items:
+        writer.add(item)
+    writer.close()
+
+
+def write_json_object(pairs: Iterable[tuple[str, Any]], f: IO[str]) -> None:
+    writer = JsonObjectWriter(f)
+    for key, value in pairs:
+        writer.add(key, value)
+    writer.close()
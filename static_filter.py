@@ -0,0 +1,309 @@
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import tree_sitter_java
+from tree_sitter import Language, Parser
+
+from chunked_classification import FIXTURE_ANNOTATIONS, JUNIT3_FIXTURES
+from is_integration_test import TestClassification, is_integration_test
+
+JAVA_LANGUAGE = Language(tree_sitter_java.language())
+
+# Deterministic signals taken from the is_integration_test system prompt, with a weight each.
+# A class whose score reaches POSITIVE_THRESHOLD is a REST integration test without asking the model.
+HTTP_IMPORTS = {
+    "org.springframework.test.web.servlet": 3,  # MockMvc
+    "io.restassured": 3,
+    "com.jayway.restassured": 3,
+    "org.springframework.boot.test.web.client": 3,  # TestRestTemplate
+    "org.springframework.test.web.reactive.server": 3,  # WebTestClient
+    "org.springframework.boot.test.web.server.LocalServerPort": 2,
+    "org.springframework.boot.context.embedded.LocalServerPort": 2,
+    "org.springframework.web.client.RestTemplate": 1,
+    "org.apache.http": 1,
+    "java.net.http": 1,
+    "okhttp3": 1,
+    "javax.ws.rs.client": 1,
+    "jakarta.ws.rs.client": 1,
+    "io.dropwizard.testing": 2,  # DropwizardAppRule starts the real HTTP server
+}
+HTTP_ANNOTATIONS = {
+    "WebMvcTest": 3,
+    "WebFluxTest": 3,
+    "AutoConfigureMockMvc": 2,
+    "AutoConfigureWebTestClient": 2,
+    "WebIntegrationTest": 2,
+    "LocalServerPort": 2,
+}
+HTTP_TYPES = {"MockMvc": 2, "TestRestTemplate": 2, "WebTestClient": 2, "RestAssured": 2}
+HTTP_VERBS = {"get", "post", "put", "patch", "delete", "head", "options", "request", "multipart"}
+HTTP_CLIENT_CALLS = {
+    "getForEntity": 2, "getForObject": 2, "postForEntity": 2, "postForObject": 2,
+    "postForLocation": 2, "exchange": 1, "statusCode": 1, "expectStatus": 2, "andExpect": 1,
+}
+UNIT_TEST_IMPORTS = ("org.mockito", "org.easymock", "org.powermock")
+UI_TEST_IMPORTS = ("org.openqa.selenium", "com.microsoft.playwright", "com.codeborne.selenide")
+INTEGRATION_NAME_SUFFIXES = ("IT", "ITCase", "IntegrationTest", "IntegrationTests", "ApiTest", "ControllerTest", "ResourceTest")
+
+POSITIVE_THRESHOLD = 5
+
+
+@dataclass
+class JavaSignals:
+    class_name: Optional[str] = None
+    superclass: Optional[str] = None
+    imports: list[str] = field(default_factory=list)
+    # annotation name -> argument text ("" for marker annotations), for every annotation in the file
+    annotations: dict[str, list[str]] = field(default_factory=dict)
+    method_calls: dict[str, int] = field(default_factory=dict)
+    type_names: set[str] = field(default_factory=set)
+    # number of .perform(get(...)) style MockMvc/WebTestClient calls
+    http_verb_calls: int = 0
+
+
+def _text(node) -> str:
+    return node.text.decode("utf-8", errors="replace")
+
+
+def extract_signals(source: str) -> JavaSignals:
+    parser = Parser(JAVA_LANGUAGE)
+    tree = parser.parse(source.encode("utf-8"))
+    signals = JavaSignals()
+
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        if node.type == "import_declaration":
+            signals.imports.append(_text(node)[len("import"):].strip().rstrip(";").removeprefix("static ").strip())
+            continue
+        if node.type in ("annotation", "marker_annotation"):
+            name = node.child_by_field_name("name")
+            arguments = node.child_by_field_name("arguments")
+            if name is not None:
+                simple_name = _text(name).rsplit(".", 1)[-1]
+                signals.annotations.setdefault(simple_name, []).append(_text(arguments) if arguments is not None else "")
+        elif node.type == "class_declaration" and signals.class_name is None:
+            name = node.child_by_field_name("name")
+            superclass = node.child_by_field_name("superclass")
+            signals.class_name = _text(name) if name is not None else None
+            signals.superclass = _text(superclass).removeprefix("extends").strip() if superclass is not None else None
+        elif node.type == "method_invocation":
+            name = node.child_by_field_name("name")
+            receiver = node.child_by_field_name("object")
+            if receiver is not None and receiver.type == "identifier":
+                # static calls such as RestAssured.given() name the class without a type_identifier
+                signals.type_names.add(_text(receiver))
+            if name is not None:
+                method = _text(name)
+                signals.method_calls[method] = signals.method_calls.get(method, 0) + 1
+                if method in ("perform", "exchange"):
+                    arguments = node.child_by_field_name("arguments")
+                    for argument in arguments.named_children if arguments is not None else []:
+                        if argument.type == "method_invocation":
+                            inner = argument.child_by_field_name("name")
+                            if inner is not None and _text(inner) in HTTP_VERBS:
+                                signals.http_verb_calls += 1
+        elif node.type == "type_identifier":
+            signals.type_names.add(_text(node))
+        stack.extend(node.children)
+
+    return signals
+
+
+@dataclass
+class StaticVerdict:
+    # True / False when the signals are conclusive, None when the model has to decide
+    decision: Optional[bool]
+    score: int
+    signals: list[str]
+
+    def reasoning(self) -> str:
+        found = ", ".join(self.signals) if self.signals else "no HTTP test signals"
+        return f"Static pre-filter (score {self.score}): {found}."
+
+
+def score_source(source: str) -> StaticVerdict:
+    signals = extract_signals(source)
+    score = 0
+    found = []
+
+    # each library counts once, however many of its classes are imported
+    for prefix, weight in HTTP_IMPORTS.items():
+        if any(imported.startswith(prefix) for imported in signals.imports):
+            score += weight
+            found.append(f"import {prefix}")
+
+    for name, arguments in signals.annotations.items():
+        if name in HTTP_ANNOTATIONS:
+            score += HTTP_ANNOTATIONS[name]
+            found.append(f"@{name}")
+        elif name == "SpringBootTest" and any("webEnvironment" in a for a in arguments):
+            score += 2
+            found.append("@SpringBootTest(webEnvironment=...)")
+
+    for type_name, weight in HTTP_TYPES.items():
+        if type_name in signals.type_names:
+            score += weight
+            found.append(type_name)
+
+    if signals.http_verb_calls:
+        score += 3
+        found.append(f"{signals.http_verb_calls} HTTP request(s) via perform/exchange")
+    for method, weight in HTTP_CLIENT_CALLS.items():
+        if method in signals.method_calls:
+            score += weight
+            found.append(f".{method}(...)")
+    if "given" in signals.method_calls and ("when" in signals.method_calls or HTTP_VERBS & signals.method_calls.keys()):
+        score += 2
+        found.append("given()...get(...) chain")
+
+    if score >= POSITIVE_THRESHOLD:
+        return StaticVerdict(True, score, found)
+
+    if score == 0:
+        is_ui_test = any(i.startswith(UI_TEST_IMPORTS) for i in signals.imports)
+        is_mock_test = any(i.startswith(UNIT_TEST_IMPORTS) for i in signals.imports)
+        looks_like_integration = signals.class_name is not None and signals.class_name.endswith(INTEGRATION_NAME_SUFFIXES)
+        # Only positive evidence of another kind of test rules a class out. A class without any of the signals
+        # above may still call the API through HttpURLConnection, a project helper or a base class.
+        if is_ui_test or (is_mock_test and not looks_like_integration):
+            if is_ui_test:
+                found.append("UI test library import")
+            if is_mock_test:
+                found.append("mocking library import")
+            return StaticVerdict(False, score, found)
+
+    return StaticVerdict(None, score, found)
+
+
+# Static hint for the self-containment pattern of an integration test, used to cross-check cheap model answers.
+# Returns one of the keys below, or None when the code does not point at a single known pattern.
+RESTART, CLEAR_AND_RELOAD, API_CALLS, MANUAL = "restart", "clear_and_reload", "api_calls", "manual"
+RESTART_ANNOTATIONS = {"DirtiesContext", "WebIntegrationTest"}
+RESTART_CALLS = {"startSut", "restartSut", "restart", "startApplication"}
+DATA_RELOAD_CALLS = {
+    "deleteAll", "deleteAllInBatch", "resetDatabase", "clean", "cleanDatabase", "migrate", "truncate",
+    "executeSqlScript", "runScript", "dropDatabase", "dropCollection", "save", "saveAll", "persist", "insert",
+}
+
+
+def known_pattern(pattern_name: str) -> Optional[str]:
+    # maps a free-text pattern name (from the model or a report) onto the keys above, None for anything else
+    name = pattern_name.casefold()
+    if "restart" in name:
+        return RESTART
+    if "clear" in name or "reload" in name:
+        return CLEAR_AND_RELOAD
+    if "api call" in name or "via api" in name:
+        return API_CALLS
+    if "manual" in name or "inline" in name:
+        return MANUAL
+    return None
+
+
+def _invocations(node) -> list:
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.type == "method_invocation":
+            found.append(current)
+        stack.extend(current.children)
+    return found
+
+
+def _is_http_call(invocation) -> bool:
+    name = _text(invocation.child_by_field_name("name"))
+    return name in HTTP_VERBS or name in HTTP_CLIENT_CALLS or name == "perform"
+
+
+def static_pattern(source: str) -> Optional[str]:
+    tree = Parser(JAVA_LANGUAGE).parse(source.encode("utf-8"))
+    class_node = next((node for node in tree.root_node.named_children if node.type == "class_declaration"), None)
+    if class_node is None:
+        return None
+
+    def annotation_names(declaration) -> set[str]:
+        names = set()
+        for child in declaration.children:
+            if child.type == "modifiers":
+                for modifier in child.named_children:
+                    name = modifier.child_by_field_name("name") if modifier.type in ("annotation", "marker_annotation") else None
+                    if name is not None:
+                        names.add(_text(name).rsplit(".", 1)[-1])
+        return names
+
+    class_annotations = annotation_names(class_node)
+    methods = [m for m in class_node.child_by_field_name("body").named_children if m.type == "method_declaration"]
+    fixtures = [
+        m for m in methods
+        if annotation_names(m) & FIXTURE_ANNOTATIONS or _text(m.child_by_field_name("name")) in JUNIT3_FIXTURES
+    ]
+    fixture_calls = [invocation for fixture in fixtures for invocation in _invocations(fixture)]
+    fixture_call_names = {_text(invocation.child_by_field_name("name")) for invocation in fixture_calls}
+    sql_annotations = "Sql" in class_annotations or any("Sql" in annotation_names(m) for m in methods)
+
+    if class_annotations & RESTART_ANNOTATIONS or fixture_call_names & RESTART_CALLS:
+        return RESTART
+    if fixture_call_names & DATA_RELOAD_CALLS or sql_annotations:
+        return CLEAR_AND_RELOAD
+    if any(_is_http_call(invocation) for invocation in fixture_calls):
+        return API_CALLS
+    if not fixtures and methods:
+        return MANUAL
+    return None
+
+
+class StaticPrefilter:
+    """Decides obvious cases locally and forwards only ambiguous classes to `is_integration_test`."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.static_positive = 0
+        self.static_negative = 0
+        self.llm_calls = 0
+        self.llm_calls_skipped = 0
+        self._lock = threading.Lock()
+
+    def verdict(self, file_content: str, fused: bool = False) -> StaticVerdict:
+        # in fused mode a static positive still makes the (fused) call, only for its classifier part
+        verdict = score_source(file_content) if self.enabled else StaticVerdict(None, 0, [])
+        with self._lock:
+            if verdict.decision is True:
+                self.static_positive += 1
+            elif verdict.decision is False:
+                self.static_negative += 1
+            if verdict.decision is None or (fused and verdict.decision is True):
+                self.llm_calls += 1
+            else:
+                self.llm_calls_skipped += 1
+        return verdict
+
+    def is_integration_test(self, file_content: str) -> TestClassification:
+        verdict = self.verdict(file_content)
+        if verdict.decision is None:
+            return is_integration_test(file_content)
+        return TestClassification(is_integration_test=verdict.decision, reasoning=verdict.reasoning())
+
+    def stats(self) -> dict:
+        return {
+            "static_positive": self.static_positive,
+            "static_negative": self.static_negative,
+            "llm_calls": self.llm_calls,
+            "llm_calls_skipped": self.llm_calls_skipped,
+        }
+
+
+prefilter = StaticPrefilter()
+
+
+if __name__ == "__main__":
+    # Print the static verdict for each file without calling the model
+    for file_path in sys.argv[1:]:
+        with open(file_path, "r") as file:
+            verdict = score_source(file.read())
+        decision = {True: "integration", False: "not integration", None: "ambiguous (LLM)"}[verdict.decision]
+        print(f"{file_path}: {decision}")
+        print(f"  {verdict.reasoning()}")
@@ -0,0 +1,218 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Per-run telemetry: wall time of every pipeline stage (clone, checkout, CLDK analysis, classification)
+# and of every model call, with prompt/completion tokens, retries and estimated cost. Everything is
+# attributed to the repo and test class of the current `scope`, which imap_ordered workers inherit.
+
+METRICS_DIR = Path("./metrics")
+# per-class entries kept; older classes are dropped first and counted in `classes_dropped`
+MAX_CLASSES = 10_000
+
+# USD per million (prompt, completion) tokens; models missing here get no cost estimate
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_scope: contextvars.ContextVar[dict] = contextvars.ContextVar("telemetry_scope", default={})
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model.rsplit("/", 1)[-1])
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def _new_totals() -> dict:
+    return {"calls": 0, "wall_s": 0.0, "max_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0, "cost_usd": 0.0, "errors": 0}
+
+
+class Telemetry:
+    def __init__(self, max_classes: Optional[int] = MAX_CLASSES):
+        self._lock = threading.Lock()
+        self.max_classes = max_classes
+        self.classes_dropped = 0
+        self.started_at = time.time()
+        self.stages: dict[str, dict] = {}
+        self.repos: dict[str, dict[str, dict]] = {}
+        # per repo and stage, the first start and the last end
+        self._repo_spans: dict[str, dict[str, list[float]]] = {}
+        self.classes: dict[tuple[str, str], dict[str, dict]] = {}
+        self.models: dict[str, dict] = {}
+        self.unpriced_models: set[str] = set()
+
+    @contextmanager
+    def scope(self, **attributes) -> Iterator[None]:
+        token = _scope.set({**_scope.get(), **attributes})
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def _add(
+        self, totals: dict, wall_s: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+        retries: int = 0, cost: float = 0.0, error: bool = False, count: int = 1,
+    ) -> None:
+        totals["calls"] += count
+        totals["wall_s"] += wall_s
+        totals["max_s"] = max(totals["max_s"], wall_s)
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["retries"] += retries
+        totals["cost_usd"] += cost
+        totals["errors"] += error
+
+    def record(self, stage: str, wall_s: float, **values) -> None:
+        scope = _scope.get()
+        repo, test_class = scope.get("repo"), scope.get("test_class")
+        end = time.perf_counter()
+        with self._lock:
+            self._add(self.stages.setdefault(stage, _new_totals()), wall_s, **values)
+            if repo is not None:
+                self._add(self.repos.setdefault(repo, {}).setdefault(stage, _new_totals()), wall_s, **values)
+                span = self._repo_spans.setdefault(repo, {}).setdefault(stage, [end - wall_s, end])
+                span[0], span[1] = min(span[0], end - wall_s), max(span[1], end)
+                if test_class is not None:
+                    self._add(self._class_stages(repo, test_class).setdefault(stage, _new_totals()), wall_s, **values)
+
+    def _class_stages(self, repo: str, test_class: str) -> dict[str, dict]:
+        stages = self.classes.get((repo, test_class))
+        if stages is None:
+            stages = self.classes[(repo, test_class)] = {}
+            while self.max_classes is not None and len(self.classes) > self.max_classes:
+                del self.classes[next(iter(self.classes))]
+                self.classes_dropped += 1
+        return stages
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, error=error)
+
+    def record_llm(self, model: str, wall_s: float, prompt_tokens: int, completion_tokens: int, error: bool = False) -> None:
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        if cost is None:
+            with self._lock:
+                self.unpriced_models.add(model)
+        values = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": cost or 0.0, "error": error}
+        self.record("llm", wall_s, **values)
+        with self._lock:
+            self._add(self.models.setdefault(model, _new_totals()), wall_s, **values)
+
+    def record_retry(self) -> None:
+        self.record("retry", 0.0, retries=1)
+
+    def summary(self) -> dict:
+        def rounded(totals: dict) -> dict:
+            return {k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()}
+
+        with self._lock:
+            def entry(stages: dict) -> dict:
+                llm = stages.get("llm", _new_totals())
+                return {
+                    "stages": {stage: rounded(totals) for stage, totals in stages.items()},
+                    "llm_calls": llm["calls"],
+                    "prompt_tokens": llm["prompt_tokens"],
+                    "completion_tokens": llm["completion_tokens"],
+                    "retries": stages.get("retry", _new_totals())["retries"],
+                    "cost_usd": round(llm["cost_usd"], 6),
+                }
+
+            def elapsed(repo: str) -> float:
+                # the repo's own wall time: classes classified concurrently count once, llm calls are inside
+                # classify and retries are not timed
+                spans = self._repo_spans.get(repo, {})
+                return round(sum(end - start for stage, (start, end) in spans.items() if stage not in ("llm", "retry")), 3)
+
+            repos = {repo: {"elapsed_s": elapsed(repo), **entry(stages)} for repo, stages in self.repos.items()}
+            return {
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                "wall_s": round(time.time() - self.started_at, 3),
+                "argv": sys.argv,
+                "stages": {stage: rounded(totals) for stage, totals in self.stages.items()},
+                "models": {model: rounded(totals) for model, totals in self.models.items()},
+                "unpriced_models": sorted(self.unpriced_models),
+                "repos": repos,
+                "classes": [
+                    {"repo": repo, "test_class": test_class, **entry(stages)}
+                    for (repo, test_class), stages in self.classes.items()
+                ],
+                "classes_dropped": self.classes_dropped,
+            }
+
+    def write(self, path: Optional[Path] = None) -> Path:
+        if path is None:
+            script = Path(sys.argv[0]).stem.strip("-") or "run"
+            path = METRICS_DIR / f"{script}-{datetime.fromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+        return path
+
+    def print_table(self, file=None, top: int = 10) -> None:
+        from rich.console import Console
+        from rich.table import Table
+
+        summary = self.summary()
+        console = Console(file=file or sys.stdout)
+
+        stages = Table(title=f"Stages (run wall time {summary['wall_s']:.1f}s)")
+        for column in ("stage", "calls", "wall s", "max s", "prompt tok", "completion tok", "retries", "cost $", "errors"):
+            stages.add_column(column, justify="left" if column == "stage" else "right")
+        for stage, t in summary["stages"].items():
+            stages.add_row(
+                stage, str(t["calls"]), f"{t['wall_s']:.1f}", f"{t['max_s']:.2f}", str(t["prompt_tokens"]),
+                str(t["completion_tokens"]), str(t["retries"]), f"{t['cost_usd']:.4f}", str(t["errors"]),
+            )
+        console.print(stages)
+
+        if summary["repos"]:
+            repos = Table(title=f"Top {top} repos by wall time")
+            for column in ("repo", "wall s", "llm calls", "tokens", "retries", "cost $"):
+                repos.add_column(column, justify="left" if column == "repo" else "right")
+
+            by_time = sorted(summary["repos"].items(), key=lambda item: -item[1]["elapsed_s"])
+            for repo, r in by_time[:top]:
+                tokens = r["prompt_tokens"] + r["completion_tokens"]
+                repos.add_row(repo, f"{r['elapsed_s']:.1f}", str(r["llm_calls"]), str(tokens), str(r["retries"]), f"{r['cost_usd']:.4f}")
+            console.print(repos)
+
+        if summary["classes"]:
+            classes = Table(title=f"Top {top} test classes by tokens")
+            for column in ("repo", "test class", "llm calls", "llm s", "tokens", "retries", "cost $"):
+                classes.add_column(column, justify="left" if column in ("repo", "test class") else "right")
+            by_tokens = sorted(summary["classes"], key=lambda c: -(c["prompt_tokens"] + c["completion_tokens"]))
+            for c in by_tokens[:top]:
+                llm_s = c["stages"].get("llm", {"wall_s": 0.0})["wall_s"]
+                tokens = c["prompt_tokens"] + c["completion_tokens"]
+                classes.add_row(
+                    c["repo"], c["test_class"], str(c["llm_calls"]), f"{llm_s:.1f}", str(tokens), str(c["retries"]), f"{c['cost_usd']:.4f}",
+                )
+            console.print(classes)
+
+    def report(self, file=None) -> Path:
+        path = self.write()
+        self.print_table(file)
+        print(f"Metrics: {path}", file=file or sys.stdout)
+        return path
+
+
+telemetry = Telemetry()
@@ -0,0 +1,103 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import analysis_cache
+from analysis_cache import ProjectAnalysis, cache_dir_for, clean_head, is_cached, load_project
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch):
+    # the analysis cache is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    project = tmp_path / "project"
+    (project / "src").mkdir(parents=True)
+    for name in ("FooIT", "BarIT"):
+        (project / "src" / f"{name}.java").write_text(f"class {name} {{}}")
+    return project
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    # stands in for CLDK: every test class found in src/, with its source file in the checkout
+    calls = []
+
+    def run_cldk(project_path, repo_name, cache_dir, eager):
+        calls.append((project_path, eager))
+        sources = {path.stem: path.resolve() for path in sorted((Path(project_path) / "src").glob("*.java"))}
+        return ProjectAnalysis({name: [f"{name}.test"] for name in sources}, sources, repo_name, cache_dir, project_path)
+
+    monkeypatch.setattr(analysis_cache, "_run_cldk", run_cldk)
+    return calls
+
+
+def test_miss_then_hit(checkout, analyses):
+    project = load_project(str(checkout), "repo", "abc")
+    assert len(analyses) == 1
+    assert is_cached("repo", "abc")
+    # sources are read from the cache from now on, so the checkout can go
+    assert all(cache_dir_for("repo", "abc") in path.parents for path in project.source_files.values())
+    for path in (checkout / "src").iterdir():
+        path.unlink()
+
+    cached = load_project(None, "repo", "abc")
+    assert len(analyses) == 1
+    assert cached.test_entities == {"BarIT": ["BarIT.test"], "FooIT": ["FooIT.test"]}
+    assert dict(cached.iter_sources(skip={"BarIT"})) == {"FooIT": "class FooIT {}"}
+
+
+def test_miss_without_a_checkout(checkout, analyses):
+    with pytest.raises(ValueError, match="no cached analysis"):
+        load_project(None, "repo", "abc")
+
+
+def test_without_a_key_nothing_is_cached(checkout, analyses):
+    load_project(str(checkout))
+    load_project(str(checkout))
+    assert len(analyses) == 2
+    assert not analysis_cache.ANALYSIS_CACHE_DIR.exists()
+
+
+def test_invalidate_runs_the_analysis_again(checkout, analyses):
+    load_project(str(checkout), "repo", "abc")
+    (checkout / "src" / "BarIT.java").unlink()
+
+    project = load_project(str(checkout), "repo", "abc", invalidate=True)
+    assert analyses == [(str(checkout), False), (str(checkout), True)]
+    assert project.test_class_names() == ["FooIT"]
+    assert [p.name for p in (cache_dir_for("repo", "abc") / "sources").iterdir()] == ["0_FooIT.java"]
+
+
+def test_interrupted_store_leaves_no_cache_entry(checkout, analyses, monkeypatch):
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(analysis_cache.os, "replace", crash)
+        with pytest.raises(OSError):
+            load_project(str(checkout), "repo", "abc")
+    # test_entities.json marks a complete entry and is only ever renamed into place
+    assert not is_cached("repo", "abc")
+    load_project(str(checkout), "repo", "abc")
+    assert len(analyses) == 2
+    assert is_cached("repo", "abc")
+
+
+def git(cwd, *args):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def test_clean_head_is_none_for_uncommitted_changes(checkout):
+    assert clean_head(str(checkout)) is None
+    git(checkout, "init", "-q")
+    git(checkout, "add", ".")
+    git(checkout, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+    head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=checkout, capture_output=True, text=True).stdout.strip()
+    assert clean_head(str(checkout)) == head
+
+    (checkout / "src" / "FooIT.java").write_text("class FooIT { int changed; }")
+    assert clean_head(str(checkout)) is None
+    git(checkout, "checkout", "--", ".")
+    (checkout / "src" / "NewIT.java").write_text("class NewIT {}")
+    assert clean_head(str(checkout)) is None
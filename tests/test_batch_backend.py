@@ -0,0 +1,135 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+import is_integration_test as gate
+import llm_cache
+from batch_backend import BatchRequest, BatchRunner, LocalBatchService, classify_corpus, fill_schema, request_line
+from llm_cache import LLMCache
+from llm_chains import new_chain
+from pattern_statistics import open_journal
+from static_filter import prefilter
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "off")
+
+
+def gate_request(custom_id: str, code: str) -> BatchRequest:
+    return BatchRequest(custom_id, gate.TestClassification, gate.SYSTEM_RULES, gate.PROMPT_VERSION, gate.MODEL_NAME, gate.TEMPERATURE, code)
+
+
+def failing_for(marker: str, schema_name: str = "TestClassification"):
+    def respond(body: dict) -> dict:
+        if marker in body["messages"][1]["content"] and body["response_format"]["json_schema"]["name"] == schema_name:
+            raise RuntimeError("stand-in failure")
+        return fill_schema(body)
+    return respond
+
+
+def runner_for(tmp_path: Path, respond=fill_schema) -> BatchRunner:
+    return BatchRunner(LocalBatchService(tmp_path / "service", respond), tmp_path / "work", poll_interval=0)
+
+
+def test_request_matches_the_synchronous_chain():
+    # batch answers are cached under the same keys as synchronous ones, so the requests must be the same
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        content = json.dumps({"is_integration_test": True, "reasoning": "r"})
+        return httpx.Response(200, json={
+            "id": "1", "object": "chat.completion", "created": 0, "model": "m",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    chain = new_chain(gate.TestClassification, gate.SYSTEM_RULES, gate.MODEL_NAME, gate.TEMPERATURE, "key", "http://stub/v1", client)
+    chain.invoke({"code": "class A {}"})
+
+    body = request_line(gate_request("gate-0", "class A {}"), gate.MODEL_NAME)["body"]
+    assert {k: v for k, v in sent[0].items() if k != "stream"} == body
+
+
+def test_run_maps_answers_back_by_custom_id(tmp_path):
+    runner = runner_for(tmp_path)
+    results = runner.run("gate", [gate_request(f"gate-{i}", f"class A{i} {{}}") for i in range(3)])
+
+    assert sorted(results) == ["gate-0", "gate-1", "gate-2"]
+    assert all(isinstance(result, gate.TestClassification) for result in results.values())
+    assert runner.stats() == {"submitted": 3, "from_cache": 0, "failed": 0}
+
+
+def test_failed_requests_are_left_out(tmp_path):
+    runner = runner_for(tmp_path, failing_for("class Broken"))
+    results = runner.run("gate", [gate_request("gate-0", "class A {}"), gate_request("gate-1", "class Broken {}")])
+
+    assert list(results) == ["gate-0"]
+    assert runner.stats() == {"submitted": 2, "from_cache": 0, "failed": 1}
+
+
+def test_rerun_only_submits_what_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "on")
+    monkeypatch.setattr(llm_cache, "_default_cache", LLMCache(tmp_path / "cache.sqlite"))
+    requests = [gate_request("gate-0", "class A {}"), gate_request("gate-1", "class Broken {}")]
+
+    runner_for(tmp_path, failing_for("class Broken")).run("gate", requests)
+    rerun = runner_for(tmp_path)
+    results = rerun.run("gate", requests)
+
+    assert sorted(results) == ["gate-0", "gate-1"]
+    assert rerun.stats() == {"submitted": 1, "from_cache": 1, "failed": 0}
+
+
+def test_submitted_part_is_polled_instead_of_resubmitted(tmp_path):
+    requests = [gate_request("gate-0", "class A {}")]
+    first = runner_for(tmp_path).run("gate", requests)
+    second = runner_for(tmp_path).run("gate", requests)
+
+    assert first == second
+    assert len(list((tmp_path / "service").glob("batch_*"))) == 1
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    # one repo in the analysis cache, so classify_corpus needs neither a checkout nor CLDK
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(prefilter, "enabled", True)
+    entry_dir = tmp_path / ".cache" / "cldk" / "repo@abc"
+    (entry_dir / "sources").mkdir(parents=True)
+    entries = {}
+    for example in sorted(EXAMPLES.glob("*.txt")):
+        (entry_dir / "sources" / f"{example.stem}.java").write_text(example.read_text())
+        entries[example.stem] = {"methods": [], "source": f"sources/{example.stem}.java"}
+    (entry_dir / "test_entities.json").write_text(json.dumps(entries))
+    return {"repo": {"github_url": "file:///nonexistent", "commit": "abc"}}
+
+
+def test_corpus_repo_with_failures_is_retried_on_resume(tmp_path, corpus):
+    # the pattern request of one static positive fails
+    runner = runner_for(tmp_path, failing_for("class HospitalResourceTest", "IntergrationPatternRating"))
+    classify_corpus(corpus, runner, "stats")
+
+    journal = open_journal("repo", resume=True)
+    assert not journal.is_done()
+    assert "API_gestaohospial" not in journal.completed_keys()
+    assert len(journal.completed_keys()) == 4
+    assert not (tmp_path / "stats" / "repo.json").exists()
+
+    rerun = runner_for(tmp_path)
+    classify_corpus(corpus, rerun, "stats", resume=True)
+
+    assert rerun.stats()["submitted"] == 1
+    assert open_journal("repo", resume=True).is_done()
+    stats = json.loads((tmp_path / "stats" / "repo.json").read_text())
+    assert sorted(entry["test_class"] for entry in stats) == sorted(p.stem for p in EXAMPLES.glob("*.txt"))
+
+    # a finished repo is skipped altogether
+    skipped = runner_for(tmp_path)
+    classify_corpus(corpus, skipped, "stats", resume=True)
+    assert skipped.stats()["submitted"] == 0
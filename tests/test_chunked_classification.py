@@ -0,0 +1,115 @@
+import re
+
+import is_integration_test as gate
+from chunked_classification import ChunkedClassifier, count_tokens, split_class
+from pattern_analysis import ConfidenceScore, FitAssessment, IntegrationTestAnalysis, merge_analyses
+from pattern_rating import IntergrationPatternRating, merge_ratings
+
+
+def java_test_class(methods: int) -> str:
+    tests = "".join(
+        f"""
+    /** Checks case {i}. */
+    @Test
+    void case{i}() {{
+        given().body("{'x' * 200}").when().post("/items/{i}").then().statusCode(201);
+    }}
+"""
+        for i in range(methods)
+    )
+    return f"""package com.example;
+
+import io.restassured.RestAssured;
+
+@SpringBootTest(webEnvironment = RANDOM_PORT)
+class ItemsIT {{
+    private Client client;
+
+    @BeforeEach
+    void setUp() {{
+        repository.deleteAll();
+    }}
+{tests}
+    private void helper() {{}}
+}}
+"""
+
+
+def test_a_class_within_the_budget_is_not_split():
+    source = java_test_class(3)
+    assert split_class(source, count_tokens(source)) == [source]
+
+
+def test_a_single_test_method_is_never_split():
+    source = java_test_class(1)
+    assert split_class(source, 10) == [source]
+
+
+def test_chunks_keep_the_header_and_share_out_the_test_methods():
+    source = java_test_class(8)
+    chunks = split_class(source, count_tokens(source) // 3)
+
+    assert len(chunks) > 1
+    for n, chunk in enumerate(chunks, start=1):
+        assert "import io.restassured.RestAssured;" in chunk
+        assert "repository.deleteAll();" in chunk
+        assert "private void helper()" in chunk
+        assert f"// Part {n} of {len(chunks)}:" in chunk
+    methods = [re.findall(r"void (case\d+)\(\)", chunk) for chunk in chunks]
+    assert sorted(m for chunk in methods for m in chunk) == sorted(f"case{i}" for i in range(8))
+    # javadoc goes with its method
+    assert all(chunk.count("/** Checks case") == len(found) for chunk, found in zip(chunks, methods))
+
+
+def test_chunker_merges_the_chunk_answers():
+    source = java_test_class(8)
+    seen = []
+
+    def classify(code: str) -> gate.TestClassification:
+        seen.append(code)
+        return gate.TestClassification(is_integration_test="case7()" in code, reasoning=f"chunk {len(seen)}")
+
+    chunker = ChunkedClassifier(token_budget=count_tokens(source) // 3)
+    result = chunker.run(classify, gate.merge_classifications, source)
+    assert result.is_integration_test
+    assert len(seen) == chunker.stats()["chunks"] > 1
+    assert chunker.stats()["chunked_calls"] == 1
+
+    # without a budget the class goes to the classifier whole
+    assert ChunkedClassifier().run(lambda code: code, lambda answers: None, source) == source
+
+
+def test_merge_classifications():
+    negative = gate.TestClassification(is_integration_test=False, reasoning="no")
+    positive = gate.TestClassification(is_integration_test=True, reasoning="yes")
+    assert gate.merge_classifications([negative, positive]) == positive
+    assert gate.merge_classifications([negative, negative]) == negative
+
+
+def test_merge_ratings_is_a_union():
+    fields = list(IntergrationPatternRating.model_fields)
+    first = IntergrationPatternRating(**{name: name == "has_fixture" for name in fields})
+    second = IntergrationPatternRating(**{name: name == "API_calls_in_fixtures" for name in fields})
+    merged = merge_ratings([first, second])
+    assert {name for name in fields if getattr(merged, name)} == {"has_fixture", "API_calls_in_fixtures"}
+
+
+def analysis(pattern: str, confidence: ConfidenceScore, self_contained: bool = True) -> IntegrationTestAnalysis:
+    return IntegrationTestAnalysis(
+        is_self_contained=self_contained, analysis_of_mechanism="m", fit_assessment=FitAssessment.PERFECT_FIT,
+        pattern_name=pattern, reasoning="r", confidence_score=confidence,
+    )
+
+
+def test_merge_analyses_votes_by_confidence():
+    merged = merge_analyses([
+        analysis("Restart and Initialize", ConfidenceScore.HIGH),
+        analysis("Clear and Reload", ConfidenceScore.LOW),
+        analysis("clear and reload ", ConfidenceScore.MEDIUM, self_contained=False),
+    ])
+    # 3 votes for restart against 1 + 2 for clear and reload: the tie goes to the first pattern seen
+    assert merged.pattern_name == "Restart and Initialize"
+    # split votes never give a high-confidence answer, and one non-self-contained chunk decides
+    assert merged.confidence_score == ConfidenceScore.MEDIUM
+    assert not merged.is_self_contained
+    assert "1 of 3 chunks" in merged.reasoning
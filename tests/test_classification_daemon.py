@@ -0,0 +1,104 @@
+import json
+import stat
+import threading
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+import analysis_cache
+from classification_daemon import Daemon, Handler, UnixHTTPServer, request
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load_project(path, repo, commit):
+        calls.append((repo, commit))
+        return SimpleNamespace(name=repo)
+
+    monkeypatch.setattr(analysis_cache, "load_project", load_project)
+    return calls
+
+
+def test_projects_are_kept_least_recently_used_first(loads):
+    daemon = Daemon(max_projects=2)
+    for repo in ("a", "b", "a", "c", "a"):
+        assert daemon.project(None, repo, "1").name == repo
+
+    assert list(daemon.projects) == [("c", "1"), ("a", "1")]
+    assert loads == [("a", "1"), ("b", "1"), ("c", "1")]
+
+
+def test_one_load_per_project_and_other_projects_in_parallel(monkeypatch):
+    both_loading = threading.Barrier(2, timeout=5)
+    calls = []
+
+    def load_project(path, repo, commit):
+        calls.append(repo)
+        if repo != "a":
+            # only returns when the loads of "b" and "c" run at the same time
+            both_loading.wait()
+        return SimpleNamespace(name=repo)
+
+    monkeypatch.setattr(analysis_cache, "load_project", load_project)
+    daemon = Daemon()
+    results = []
+    threads = [threading.Thread(target=lambda r=repo: results.append(daemon.project(None, r, "1").name)) for repo in ("b", "c")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ["b", "c"]
+
+    threads = [threading.Thread(target=lambda: results.append(daemon.project(None, "a", "1").name)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(calls) == ["a", "b", "c"]
+    assert daemon._loading == {}
+
+
+class FailingDaemon:
+    def classify(self, request):
+        if "path" in request:
+            raise FileNotFoundError(request["path"])
+        raise RuntimeError("model unavailable")
+
+
+@pytest.fixture
+def server():
+    handler = type("DaemonHandler", (Handler,), {"daemon": FailingDaemon(), "log_message": lambda self, *args: None})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_errors_are_answered_as_json(server):
+    response = request("POST", "/classify", {"source": "class A {}"}, port=server)
+    assert response.status == 500
+    assert json.loads(response.read()) == {"error": "RuntimeError: model unavailable"}
+
+    response = request("POST", "/classify", {"path": "Missing.java"}, port=server)
+    assert response.status == 400
+    assert json.loads(response.read()) == {"error": "Missing.java"}
+
+
+def test_unix_socket_is_owner_only(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    handler = type("DaemonHandler", (Handler,), {"daemon": FailingDaemon(), "log_message": lambda self, *args: None})
+    server = UnixHTTPServer(socket_path, handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert stat.S_IMODE((tmp_path / "daemon.sock").stat().st_mode) == 0o600
+        response = request("POST", "/classify", {"source": "class A {}"}, socket_path=socket_path)
+        assert response.status == 500
+    finally:
+        server.shutdown()
+        server.server_close()
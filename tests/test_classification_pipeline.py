@@ -0,0 +1,108 @@
+import pytest
+
+import classification_pipeline
+import is_integration_test
+from classification_pipeline import ClassificationPipeline, ClassifierStage
+from near_duplicates import NearDuplicateIndex
+
+INTEGRATION_TEST = """
+@SpringBootTest
+class OrderIT {
+    @Autowired private MockMvc mvc;
+    @Test void createsOrder() throws Exception { mvc.perform(post("/orders")).andExpect(status().isCreated()); }
+    @Test void listsOrders() throws Exception { mvc.perform(get("/orders")).andExpect(status().isOk()); }
+}
+"""
+
+
+class CountingGate:
+    def __init__(self, answer: bool):
+        self.answer = answer
+        self.calls = []
+
+    def is_integration_test(self, code_body):
+        self.calls.append(code_body)
+        return is_integration_test.TestClassification(is_integration_test=self.answer, reasoning="")
+
+
+class EchoStage(ClassifierStage):
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def classify(self, payload, code_body):
+        self.calls.append(payload)
+        return f"{self.name} answer"
+
+    def classify_fused(self, code_body):
+        self.calls.append(code_body)
+        return None
+
+    def record(self, test_class_name, answer, provenance):
+        return {"answer": answer, "provenance": provenance}
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    gate = CountingGate(True)
+    monkeypatch.setattr(classification_pipeline, "prefilter", gate)
+    monkeypatch.setattr(classification_pipeline, "dedup", NearDuplicateIndex(enabled=False))
+    return gate
+
+
+def test_stages_must_implement_every_method():
+    class Incomplete(ClassifierStage):
+        def classify(self, payload, code_body):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_stages_share_one_gate_call(gate):
+    stages = [EchoStage("rating"), EchoStage("analysis")]
+    entries = ClassificationPipeline(stages).classify("OrderIT", INTEGRATION_TEST)
+
+    assert gate.calls == [INTEGRATION_TEST]
+    assert all(stage.calls == [INTEGRATION_TEST] for stage in stages)
+    assert entries == {
+        "rating": {"answer": "rating answer", "provenance": None},
+        "analysis": {"answer": "analysis answer", "provenance": None},
+    }
+
+
+def test_gate_negative_reaches_every_stage_as_none(gate):
+    gate.answer = False
+    stages = [EchoStage("rating"), EchoStage("analysis")]
+    entries = ClassificationPipeline(stages).classify("OrderTest", INTEGRATION_TEST)
+
+    assert len(gate.calls) == 1
+    assert all(stage.calls == [] for stage in stages)
+    assert entries == {"rating": {"answer": None, "provenance": None}, "analysis": {"answer": None, "provenance": None}}
+
+
+def test_fused_skips_the_gate(gate):
+    with pytest.raises(ValueError):
+        ClassificationPipeline([EchoStage("rating"), EchoStage("analysis")], fused=True)
+
+    stage = EchoStage("rating")
+    assert ClassificationPipeline([stage], fused=True).classify("OrderIT", INTEGRATION_TEST) == {
+        "rating": {"answer": None, "provenance": None},
+    }
+    assert gate.calls == []
+    assert stage.calls == [INTEGRATION_TEST]
+
+
+def test_duplicates_get_every_stage_answer_with_provenance(gate, monkeypatch):
+    monkeypatch.setattr(classification_pipeline, "dedup", NearDuplicateIndex(enabled=True))
+    stages = [EchoStage("rating"), EchoStage("analysis")]
+    sources = [("OrderIT", INTEGRATION_TEST), ("OrderCopyIT", INTEGRATION_TEST.replace("OrderIT", "OrderCopyIT"))]
+    results = dict(ClassificationPipeline(stages).run(sources))
+
+    assert len(gate.calls) == 1
+    assert all(len(stage.calls) == 1 for stage in stages)
+    for name in ("rating", "analysis"):
+        copy = results["OrderCopyIT"][name]
+        assert copy["answer"] == f"{name} answer"
+        assert copy["provenance"]["duplicate_of"] == "OrderIT"
+        assert copy["provenance"]["similarity"] > 0.8
@@ -0,0 +1,78 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+import llm_cache
+from llm_cache import LLMCache, cache_key, cached_invoke
+
+
+class Answer(BaseModel):
+    label: str
+
+
+class OtherAnswer(BaseModel):
+    label: str
+    score: int = 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # a strictly increasing clock, so LRU order does not depend on timer resolution
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: next(ticks)))
+    return ticks
+
+
+def test_key_covers_every_input():
+    base = ("class A {}", Answer, "prompt", "1", "model", 0.7)
+    key = cache_key(*base)
+    assert key == cache_key(*base)
+    for i, changed in enumerate(("class B {}", OtherAnswer, "prompt 2", "2", "model-b", 0.0)):
+        args = list(base)
+        args[i] = changed
+        assert cache_key(*args) != key
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite")
+    assert cache.get("k", Answer) is None
+    cache.put("k", Answer(label="x"), "model")
+    assert cache.get("k", Answer) == Answer(label="x")
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_lru_eviction_keeps_recently_read_entries(tmp_path, clock):
+    cache = LLMCache(tmp_path / "cache.sqlite", max_entries=2)
+    cache.put("a", Answer(label="a"), "model")
+    cache.put("b", Answer(label="b"), "model")
+    cache.get("a", Answer)
+    cache.put("c", Answer(label="c"), "model")
+
+    assert len(cache) == 2
+    assert cache.get("b", Answer) is None
+    assert cache.get("a", Answer) is not None
+    assert cache.get("c", Answer) is not None
+
+
+def test_expired_entries_are_dropped(tmp_path, clock):
+    cache = LLMCache(tmp_path / "cache.sqlite", max_age_seconds=5)
+    cache.put("old", Answer(label="old"), "model")
+    for _ in range(10):
+        next(clock)
+    assert cache.get("old", Answer) is None
+    assert len(cache) == 0
+
+
+def test_cached_invoke_calls_the_model_once(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite")
+    calls = []
+
+    def invoke():
+        calls.append(1)
+        return Answer(label="answer")
+
+    for _ in range(3):
+        assert cached_invoke(Answer, "prompt", "1", "model", 0.7, "class A {}", invoke, cache) == Answer(label="answer")
+    assert len(calls) == 1
@@ -0,0 +1,77 @@
+import json
+import warnings
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+import is_integration_test as gate
+from llm_chains import ChainRegistry, new_chain, response_format
+from pattern_analysis import GatedIntegrationTestAnalysis
+
+
+def completion(content: str) -> httpx.Response:
+    return httpx.Response(200, json={
+        "id": "1", "object": "chat.completion", "created": 0, "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 30, "completion_tokens": 7, "total_tokens": 37},
+    })
+
+
+def chain_answering(content: str):
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: completion(content)))
+    return new_chain(gate.TestClassification, gate.SYSTEM_RULES, gate.MODEL_NAME, gate.TEMPERATURE, "key", "http://stub/v1", client)
+
+
+def test_structured_answer_without_serializer_warnings():
+    chain = chain_answering(json.dumps({"is_integration_test": True, "reasoning": "r"}))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        output = chain.invoke({"code": "class A {}"})
+
+    assert output["parsed"] == gate.TestClassification(is_integration_test=True, reasoning="r")
+    assert output["parsing_error"] is None
+    assert output["raw"].usage_metadata["input_tokens"] == 30
+
+
+def test_malformed_answer_is_a_parsing_error():
+    output = chain_answering('{"is_integration_test": "maybe"}').invoke({"code": "class A {}"})
+    assert output["parsed"] is None
+    assert isinstance(output["parsing_error"], ValidationError)
+
+    registry = ChainRegistry(api_key="key")
+    registry._chains[(gate.TestClassification, gate.SYSTEM_RULES, gate.MODEL_NAME, gate.TEMPERATURE)] = chain_answering("not json")
+    with pytest.raises(ValidationError):
+        registry.invoke(gate.TestClassification, gate.SYSTEM_RULES, gate.MODEL_NAME, gate.TEMPERATURE, "class A {}")
+
+
+def objects(node):
+    if isinstance(node, dict):
+        if node.get("type") == "object":
+            yield node
+        for value in node.values():
+            yield from objects(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from objects(value)
+
+
+@pytest.mark.parametrize("schema", [gate.TestClassification, GatedIntegrationTestAnalysis])
+def test_response_format_is_strict(schema):
+    param = response_format(schema)
+    assert param["type"] == "json_schema"
+    assert param["json_schema"]["name"] == schema.__name__
+    assert param["json_schema"]["strict"] is True
+
+    json_schema = param["json_schema"]["schema"]
+    for node in objects(json_schema):
+        assert node["additionalProperties"] is False
+        assert node["required"] == list(node["properties"])
+    assert "$ref" not in json.dumps(json_schema)
+
+
+def test_response_format_inlines_described_enums():
+    # a $ref next to a description is not allowed in strict mode
+    fit = response_format(GatedIntegrationTestAnalysis)["json_schema"]["schema"]["properties"]["fit_assessment"]
+    assert fit["enum"] == ["Perfect Fit", "Loose Fit", "No Fit (New Pattern)"]
+    assert fit["description"] == "Assessment of how well the code matches the known patterns."
@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_dispatch
+from llm_dispatch import AdaptiveLimiter, imap_ordered, is_retryable, retry_after_of
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, retry_after: str = ""):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    # only the module's view of time and random is replaced, not the global functions
+    monkeypatch.setattr(llm_dispatch, "time", SimpleNamespace(sleep=slept.append))
+    monkeypatch.setattr(llm_dispatch, "random", SimpleNamespace(uniform=lambda a, b: 1.0))
+    return slept
+
+
+def test_retryable_errors():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(StatusError(409))
+    assert is_retryable(type("APITimeoutError", (Exception,), {})())
+    assert retry_after_of(StatusError(429, "2.5")) == 2.5
+    assert retry_after_of(StatusError(429)) is None
+
+
+def test_additive_increase_and_halving():
+    limiter = AdaptiveLimiter(max_in_flight=8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4.0
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2.0
+
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    # +1/limit per success: 2 -> 2.5 -> 2.9
+    assert limiter.limit == pytest.approx(2.9)
+
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == limiter.min_in_flight == 1
+
+
+def test_throttled_calls_are_retried_after_the_retry_after_delay(sleeps):
+    limiter = AdaptiveLimiter(max_in_flight=4)
+    errors = [StatusError(429, "3"), StatusError(502)]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert limiter.call(flaky, base_delay=1.0) == "ok"
+    # Retry-After wins over the exponential backoff, which is 2 s on the second attempt
+    assert sleeps == [3.0, 2.0]
+    assert limiter.stats() == {"limit": 2.0, "max_in_flight": 4, "throttled": 2, "retries": 2}
+
+
+def test_client_errors_and_exhausted_retries_are_raised(sleeps):
+    limiter = AdaptiveLimiter(max_in_flight=2)
+
+    def fail(status):
+        raise StatusError(status)
+
+    with pytest.raises(StatusError, match="400"):
+        limiter.call(fail, 400)
+    assert sleeps == []
+    with pytest.raises(StatusError, match="429"):
+        limiter.call(fail, 429, max_retries=2)
+    assert len(sleeps) == 2
+    assert limiter.in_flight == 0
+
+
+def test_in_flight_never_exceeds_the_limit():
+    limiter = AdaptiveLimiter(max_in_flight=3)
+    in_flight, most = 0, 0
+    lock = threading.Lock()
+
+    def call(_):
+        nonlocal in_flight, most
+        with lock:
+            in_flight += 1
+            most = max(most, in_flight)
+        time.sleep(0.005)
+        with lock:
+            in_flight -= 1
+
+    list(imap_ordered(lambda i: limiter.call(call, i), range(30), max_workers=8))
+    assert most == 3
+
+
+@pytest.mark.parametrize("max_workers", [1, 2, 8])
+def test_imap_ordered_keeps_the_input_order(max_workers):
+    rng = random.Random(max_workers)
+    delays = [rng.uniform(0, 0.005) for _ in range(40)]
+
+    def slow_square(i):
+        time.sleep(delays[i])
+        return i * i
+
+    assert list(imap_ordered(slow_square, range(40), max_workers)) == [i * i for i in range(40)]
+
+
+def test_imap_ordered_pulls_items_lazily():
+    pulled = []
+
+    def items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    results = imap_ordered(lambda i: i, items(), max_workers=4)
+    for n, result in enumerate(results, start=1):
+        # at most 2 * max_workers items are in flight beyond the ones yielded
+        assert len(pulled) - n <= 2 * 4
+        if n == 10:
+            break
+    assert len(pulled) <= 10 + 2 * 4
+
+
+def test_imap_ordered_propagates_exceptions():
+    def fail_on_5(i):
+        if i == 5:
+            raise ValueError("item 5")
+        return i
+
+    results = []
+    with pytest.raises(ValueError, match="item 5"):
+        for result in imap_ordered(fail_on_5, range(20), max_workers=4):
+            results.append(result)
+    assert results == [0, 1, 2, 3, 4]
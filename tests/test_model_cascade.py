@@ -0,0 +1,68 @@
+from pathlib import Path
+
+from model_cascade import ModelCascade
+from pattern_analysis import ConfidenceScore, FitAssessment, IntegrationTestAnalysis, escalation_reasons
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+RESTART_SOURCE = (EXAMPLES / "restart_EMB.txt").read_text()
+
+
+def analysis(pattern_name="Restart", fit=FitAssessment.PERFECT_FIT, confidence=ConfidenceScore.HIGH):
+    return IntegrationTestAnalysis(
+        is_self_contained=True, analysis_of_mechanism="", fit_assessment=fit,
+        pattern_name=pattern_name, reasoning="", confidence_score=confidence,
+    )
+
+
+def test_escalation_reasons():
+    assert escalation_reasons(analysis(), RESTART_SOURCE) == []
+    assert escalation_reasons(analysis(confidence=ConfidenceScore.LOW), RESTART_SOURCE) == ["low_confidence"]
+    assert escalation_reasons(analysis(fit=FitAssessment.NO_FIT), RESTART_SOURCE) == ["no_fit"]
+    assert escalation_reasons(analysis("Clear and reload"), RESTART_SOURCE) == ["static_disagreement"]
+    # without a static hint there is nothing to disagree with
+    assert escalation_reasons(analysis("Clear and reload"), "interface Api {}") == []
+    assert escalation_reasons(
+        analysis("Shared container", FitAssessment.NO_FIT, ConfidenceScore.LOW), RESTART_SOURCE
+    ) == ["low_confidence", "no_fit", "static_disagreement"]
+
+
+def run(cascade, cheap_answer):
+    models = []
+
+    def classify(model):
+        models.append(model)
+        return cheap_answer if model == cascade.cheap_model else analysis()
+
+    result = cascade.run(classify, lambda answer: escalation_reasons(answer, RESTART_SOURCE), "expensive")
+    return result, models
+
+
+def test_confident_cheap_answers_are_kept():
+    cascade = ModelCascade(enabled=True, cheap_model="cheap")
+    cheap = analysis(confidence=ConfidenceScore.MEDIUM)
+    result, models = run(cascade, cheap)
+    assert result is cheap
+    assert models == ["cheap"]
+    assert cascade.stats()["escalation_rate"] == 0
+
+
+def test_rejected_cheap_answers_are_escalated():
+    cascade = ModelCascade(enabled=True, cheap_model="cheap")
+    for cheap in (analysis(confidence=ConfidenceScore.LOW), analysis(fit=FitAssessment.NO_FIT), analysis("Manual setup")):
+        result, models = run(cascade, cheap)
+        assert models == ["cheap", "expensive"]
+        assert result == analysis()
+    run(cascade, analysis())
+
+    stats = cascade.stats()
+    assert stats["cheap"]["calls"] == 4
+    assert stats["expensive"]["calls"] == 3
+    assert stats["escalation_rate"] == 0.75
+    assert stats["escalation_reasons"] == {"low_confidence": 1, "no_fit": 1, "static_disagreement": 1}
+
+
+def test_disabled_cascade_only_uses_the_expensive_model():
+    cascade = ModelCascade(enabled=False, cheap_model="cheap")
+    result, models = run(cascade, analysis(confidence=ConfidenceScore.LOW))
+    assert models == ["expensive"]
+    assert cascade.stats()["escalation_rate"] is None
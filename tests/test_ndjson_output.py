@@ -0,0 +1,62 @@
+import builtins
+import io
+import json
+
+import ndjson_output
+from ndjson_output import NdjsonWriter, to_json
+
+
+def stream(tmp_path, lines):
+    path = tmp_path / "run.ndjson"
+    writer = NdjsonWriter(open(path, "w"))
+    for repo, test_class, records in lines:
+        writer.write(repo, test_class, records)
+    writer.close()
+    return path
+
+
+def analysis(pattern):
+    return {"pattern_name": pattern}
+
+
+def test_interleaved_repos_match_the_pretty_reports(tmp_path):
+    lines = []
+    for i in range(3):
+        for repo in ("a", "b"):
+            lines.append((repo, f"T{i}", {"stats": {"test_class": f"T{i}"}, "analysis": analysis(repo) if i != 1 else None}))
+    lines.append((None, "Single", {"analysis": analysis("single")}))
+    path = stream(tmp_path, lines)
+    with open(path, "a") as f:
+        f.write('{"repo": "a", "test_cl')
+
+    written = to_json(path, tmp_path / "out")
+
+    assert sorted(p.relative_to(tmp_path / "out").as_posix() for p in written) == [
+        "analysis/a.json", "analysis/b.json", "analysis/run.json", "stats/a.json", "stats/b.json",
+    ]
+    out = tmp_path / "out"
+    assert (out / "stats" / "a.json").read_text() == json.dumps([{"test_class": f"T{i}"} for i in range(3)], indent=4)
+    assert (out / "analysis" / "b.json").read_text() == json.dumps({"T0": analysis("b"), "T2": analysis("b")}, indent=4)
+    assert (out / "analysis" / "run.json").read_text() == json.dumps({"Single": analysis("single")}, indent=4)
+
+
+def test_one_repo_at_a_time_is_open(tmp_path, monkeypatch):
+    path = stream(tmp_path, [(f"repo{i % 50}", f"T{i}", {"stats": {}, "analysis": None}) for i in range(500)])
+    open_files = set()
+    most = 0
+
+    def tracking_open(*args, **kwargs):
+        nonlocal most
+        f = builtins.open(*args, **kwargs)
+        if isinstance(f, io.TextIOWrapper) and "w" in f.mode:
+            open_files.add(f)
+            most = max(most, sum(not g.closed for g in open_files))
+        return f
+
+    monkeypatch.setattr(ndjson_output, "open", tracking_open, raising=False)
+    assert len(to_json(path, tmp_path / "out")) == 100
+    assert most == 2
+
+
+def test_missing_stream(tmp_path):
+    assert to_json(tmp_path / "missing.ndjson", tmp_path) == []
@@ -0,0 +1,88 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from near_duplicates import MinHasher, NearDuplicateIndex, normalized_tokens, similarity
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def variant(source: str, n: int) -> str:
+    # what a copy-pasted test looks like to the model: other literals and comments, same structure
+    return f"// copy {n}\n" + re.sub(r'"([^"\n]*)"', lambda m: f'"v{n}{m.group(1)}"', source, count=3)
+
+
+def test_normalized_tokens_drop_imports_comments_and_literal_values():
+    tokens = normalized_tokens('package a;\nimport b.C;\n// note\nclass T { String s = "x"; int n = 42; }')
+    assert "import" not in tokens and "package" not in tokens
+    assert "<str>" in tokens and "<num>" in tokens
+    assert '"x"' not in tokens and "42" not in tokens
+
+
+def test_signature_similarity():
+    hasher = MinHasher()
+    source = (EXAMPLES / "restart_EMB.txt").read_text()
+    other = (EXAMPLES / "clear_and_reload_ocvn.txt").read_text()
+    assert hasher.signature(source) == MinHasher().signature(source)
+    assert similarity(hasher.signature(source), hasher.signature(variant(source, 1))) == 1.0
+    assert similarity(hasher.signature(source), hasher.signature(other)) < 0.5
+
+
+def test_duplicates_get_a_copy_of_the_representative_result():
+    index = NearDuplicateIndex(enabled=True)
+    sources = {path.stem: path.read_text() for path in sorted(EXAMPLES.glob("*.txt"))}
+    calls = []
+
+    def classify(name):
+        def compute():
+            calls.append(name)
+            return f"result of {name}"
+        return compute
+
+    for name, source in sources.items():
+        assert index.classify(name, source, classify(name)) == (f"result of {name}", None)
+    result, provenance = index.classify("copy", variant(sources["restart_EMB"], 2), classify("copy"))
+
+    assert result == "result of restart_EMB"
+    assert provenance == {"duplicate_of": "restart_EMB", "similarity": 1.0}
+    assert "copy" not in calls
+    assert index.stats()["propagated"] == 1
+    assert [r.key for r in index.clusters()] == ["restart_EMB"]
+
+
+def test_a_failed_representative_is_not_reused():
+    index = NearDuplicateIndex(enabled=True)
+    source = (EXAMPLES / "restart_EMB.txt").read_text()
+
+    def fail():
+        raise RuntimeError("model error")
+
+    with pytest.raises(RuntimeError):
+        index.classify("first", source, fail)
+    assert index.classify("second", variant(source, 1), lambda: "ok") == ("ok", None)
+
+
+def test_disabled_index_always_computes():
+    index = NearDuplicateIndex()
+    source = (EXAMPLES / "restart_EMB.txt").read_text()
+    assert index.classify("a", source, lambda: 1) == (1, None)
+    assert index.classify("b", source, lambda: 2) == (2, None)
+
+
+def test_least_recently_matched_representatives_are_evicted():
+    index = NearDuplicateIndex(enabled=True, max_representatives=2)
+    sources = {path.stem: path.read_text() for path in sorted(EXAMPLES.glob("*.txt"))}
+    first, second, third = "API_gestaohospial", "clear_and_reload_ocvn", "restart_EMB"
+
+    index.classify(first, sources[first], lambda: 1)
+    index.classify(second, sources[second], lambda: 2)
+    assert index.classify("copy", variant(sources[first], 1), lambda: 0)[1]["duplicate_of"] == first
+    index.classify(third, sources[third], lambda: 3)
+
+    # the second was matched least recently, so it is no longer an original
+    assert index.classify("copy 2", variant(sources[second], 2), lambda: 4) == (4, None)
+    # which in turn evicted the first
+    assert index.stats()["evicted"] == 2
+    assert [r.key for r in index._representatives.values()] == [third, "copy 2"]
+    assert index.classify("copy 3", variant(sources[third], 3), lambda: 0)[0] == 3
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+from prompt_slicing import PromptSlicer, slice_class
+
+TEST_STEPS = [f"        step{i}();" for i in range(20)]
+SOURCE_LINES = [
+    "/* Licensed under the Apache License */",
+    "package com.example;",
+    "import org.junit.jupiter.api.Test;",
+    "@SpringBootTest",
+    "class OrderIT extends BaseIT {",
+    "    @Autowired",
+    "    private OrderRepository repository;",
+    "",
+    "    @BeforeEach",
+    "    void setUp() {",
+    "        cleanDatabase();",
+    "    }",
+    "",
+    "    private void cleanDatabase() {",
+    "        repository.deleteAll();",
+    "    }",
+    "",
+    "    private String format(Order order) {",
+    "        return order.toString();",
+    "    }",
+    "",
+    "    @Test",
+    "    void createsOrder() {",
+    *TEST_STEPS,
+    "    }",
+    "}",
+]
+SOURCE = "\n".join(SOURCE_LINES) + "\n"
+
+
+def line_of(text: str) -> int:
+    # 1-based, as in CLDK
+    return SOURCE_LINES.index(text) + 1
+
+
+def method(signature: str, first: str, annotations=(), calls=(), declaration_has_annotations=False, **kwargs):
+    start = line_of(first)
+    end = next(i for i in range(start, len(SOURCE_LINES)) if SOURCE_LINES[i] == "    }") + 1
+    return SimpleNamespace(
+        signature=signature, annotations=list(annotations), is_constructor=False, is_implicit=False,
+        start_line=start - len(annotations) if declaration_has_annotations else start, end_line=end, code_start_line=start,
+        call_sites=[SimpleNamespace(method_name=name) for name in calls], **kwargs,
+    )
+
+
+def order_it():
+    callables = [
+        method("setUp()", "    void setUp() {", ["@BeforeEach"], calls=["cleanDatabase"]),
+        method("cleanDatabase()", "    private void cleanDatabase() {", calls=["deleteAll"]),
+        method("format(Order)", "    private String format(Order order) {"),
+        method("createsOrder()", "    void createsOrder() {", ["@Test"], calls=[f"step{i}" for i in range(20)], declaration_has_annotations=True),
+        # the default constructor CLDK adds has no source
+        SimpleNamespace(signature="OrderIT()", annotations=[], is_constructor=True, is_implicit=True, start_line=-1, end_line=-1, call_sites=[]),
+    ]
+    repository = SimpleNamespace(start_line=line_of("    private OrderRepository repository;"), end_line=line_of("    private OrderRepository repository;"), annotations=["@Autowired"])
+    return SimpleNamespace(
+        callable_declarations={c.signature: c for c in callables},
+        field_declarations=[repository],
+        annotations=["@SpringBootTest"],
+        modifiers=[],
+        is_interface=False,
+        extends_list=["BaseIT"],
+        implements_list=["Serializable"],
+    )
+
+
+def test_fixtures_and_the_helpers_they_call_are_kept_in_full():
+    sliced = slice_class(order_it(), SOURCE, "com.example.OrderIT", max_test_lines=5)
+    lines = sliced.splitlines()
+
+    assert lines[0].startswith("// Structural slice of com.example.OrderIT")
+    assert lines[1:3] == ["@SpringBootTest", "class OrderIT extends BaseIT implements Serializable {"]
+    assert "Licensed" not in sliced and "import" not in sliced.split("\n", 1)[1] and "package" not in sliced
+    # the field annotation is outside the field's range, so it is added back
+    assert lines[3:5] == ["    @Autowired", "    private OrderRepository repository;"]
+    assert "    @BeforeEach\n    void setUp() {\n        cleanDatabase();\n    }" in sliced
+    assert "    private void cleanDatabase() {\n        repository.deleteAll();\n    }" in sliced
+    assert sliced.endswith("}\n")
+
+
+def test_tests_are_abridged_and_other_helpers_elided():
+    sliced = slice_class(order_it(), SOURCE, "com.example.OrderIT", max_test_lines=5)
+
+    assert "    private String format(Order order) {\n        // ... 1 lines omitted\n    }" in sliced
+    assert "order.toString()" not in sliced
+    # the test keeps its annotation once, its first 5 lines and a marker for the rest
+    assert sliced.count("@Test") == 1
+    assert "\n".join(TEST_STEPS[:5]) + "\n        // ... 15 lines omitted\n    }" in sliced
+    assert "step5();" not in sliced
+    assert "OrderIT()" not in sliced
+
+
+def test_junit3_fixtures_and_tests_are_found_by_name():
+    klass = order_it()
+    for callable_ in klass.callable_declarations.values():
+        callable_.annotations = []
+    klass.callable_declarations["createsOrder()"].signature = "testCreatesOrder()"
+    klass.callable_declarations["createsOrder()"].start_line = line_of("    void createsOrder() {")
+    klass.extends_list = ["junit.framework.TestCase"]
+
+    sliced = slice_class(klass, SOURCE, "OrderIT", max_test_lines=3)
+    assert "        cleanDatabase();\n    }" in sliced
+    assert "        // ... 17 lines omitted" in sliced
+
+
+def test_slicer_falls_back_to_the_full_source():
+    assert PromptSlicer(enabled=False).payload(SimpleNamespace(get_class=order_it), "OrderIT", SOURCE) == SOURCE
+    assert PromptSlicer(enabled=True).payload(None, "OrderIT", SOURCE) == SOURCE
+
+    slicer = PromptSlicer(enabled=True)
+    # CLDK has no class model for a source it failed to parse
+    assert slicer.payload(SimpleNamespace(get_class=lambda name: None), "OrderIT", SOURCE) == SOURCE
+    assert slicer.stats()["full_source"] == 1
+
+    sliced = slicer.payload(SimpleNamespace(get_class=lambda name: order_it()), "OrderIT", SOURCE)
+    assert sliced != SOURCE
+    stats = slicer.stats()
+    assert stats["sliced"] == 1
+    assert 0 < stats["tokens_sliced"] < stats["tokens_full"]
@@ -0,0 +1,87 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from repo_fetch import FetchError, RepoFetcher
+
+
+def git(*args, cwd):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    (repo / "src" / "test" / "java").mkdir(parents=True)
+    (repo / "docs").mkdir()
+    git("init", "--quiet", "-b", "main", str(repo), cwd=tmp_path)
+    git("config", "user.email", "test@example.com", cwd=repo)
+    git("config", "user.name", "test", cwd=repo)
+    (repo / "pom.xml").write_text("<project/>\n")
+    (repo / "src" / "test" / "java" / "FooIT.java").write_text("class FooIT {}\n")
+    (repo / "docs" / "notes.md").write_text("notes\n")
+    git("add", "-A", cwd=repo)
+    git("commit", "--quiet", "-m", "first", cwd=repo)
+    pinned = git("rev-parse", "HEAD", cwd=repo)
+    (repo / "src" / "test" / "java" / "FooIT.java").write_text("class FooIT { int changed; }\n")
+    git("commit", "--quiet", "-am", "second", cwd=repo)
+    return f"file://{repo}", pinned
+
+
+def worktrees(mirror: Path) -> list[str]:
+    return [line for line in git("worktree", "list", "--porcelain", cwd=mirror).splitlines() if line.startswith("worktree ")]
+
+
+def test_checkout_pinned_commit(tmp_path, origin):
+    url, pinned = origin
+    fetcher = RepoFetcher(mirror_dir=tmp_path / "mirrors")
+    folder = fetcher.checkout(url, pinned, tmp_path / "work" / "repo")
+
+    assert git("rev-parse", "HEAD", cwd=folder) == pinned
+    assert (folder / "src" / "test" / "java" / "FooIT.java").read_text() == "class FooIT {}\n"
+    assert (folder / "docs" / "notes.md").exists()
+
+    mirror = fetcher.mirror_path(url)
+    assert fetcher.has_commit(mirror, pinned)
+    assert len(worktrees(mirror)) == 2
+
+    fetcher.remove(folder)
+    assert not folder.exists()
+    assert len(worktrees(mirror)) == 1
+
+
+def test_sparse_checkout(tmp_path, origin):
+    url, pinned = origin
+    fetcher = RepoFetcher(mirror_dir=tmp_path / "mirrors", sparse=True)
+    folder = fetcher.checkout(url, pinned, tmp_path / "work" / "repo")
+
+    assert (folder / "pom.xml").exists()
+    assert (folder / "src" / "test" / "java" / "FooIT.java").exists()
+    assert not (folder / "docs").exists()
+
+    fetcher.remove(folder)
+    assert not folder.exists()
+
+
+def test_checkout_again_reuses_the_mirror(tmp_path, origin):
+    url, pinned = origin
+    fetcher = RepoFetcher(mirror_dir=tmp_path / "mirrors")
+    folder = fetcher.checkout(url, pinned, tmp_path / "work" / "repo")
+    # an existing checkout is replaced, and the pinned commit is not fetched again
+    folder = fetcher.checkout(url, pinned, folder)
+    assert git("rev-parse", "HEAD", cwd=folder) == pinned
+    assert len(worktrees(fetcher.mirror_path(url))) == 2
+
+
+def test_unknown_commit(tmp_path, origin):
+    url, _ = origin
+    with pytest.raises(FetchError):
+        RepoFetcher(mirror_dir=tmp_path / "mirrors").fetch(url, "deadbeef" * 5)
+
+
+def test_relative_and_absolute_mirror_paths_share_a_lock(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fetcher = RepoFetcher(mirror_dir=Path("mirrors"))
+    mirror = fetcher.mirror_path("https://example.com/a/b.git")
+    assert fetcher._lock_for(mirror) is fetcher._lock_for(mirror.absolute())
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from repo_pipeline import RepoPipeline
+
+
+class RecordingPipeline(RepoPipeline):
+    """Stages that only record when they run, with a slow classification."""
+
+    def __init__(self, skip=(), fail=(), **kwargs):
+        super().__init__(show_progress=False, **kwargs)
+        self.skip, self.fail = set(skip), set(fail)
+        self.events = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self._events_lock = threading.Lock()
+
+    def _event(self, job, stage):
+        with self._events_lock:
+            self.events.append((job.folder_name, stage))
+
+    def _fetch(self, job):
+        with self._events_lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self._event(job, "fetch")
+        if job.folder_name in self.skip:
+            return None
+        return "analysis"
+
+    def _analysis(self, job):
+        self._event(job, "analysis")
+        if job.folder_name in self.fail:
+            raise RuntimeError("CLDK failed")
+        job.project = object()
+        return "classify"
+
+    def _classify(self, job):
+        self._event(job, "classify")
+        time.sleep(0.01)
+        return None
+
+    def _finish(self, job, stage):
+        with self._events_lock:
+            self.in_flight -= 1
+        super()._finish(job, stage)
+
+
+def repos(n):
+    return {f"repo{i}": {"github_url": f"file:///repo{i}", "commit": "c"} for i in range(n)}
+
+
+def test_fetch_and_analysis_stay_within_the_in_flight_bound():
+    pipeline = RecordingPipeline(fetch_workers=4, analysis_workers=2, classify_workers=1, max_in_flight=2)
+    jobs = pipeline.run(repos(8))
+
+    assert pipeline.most_in_flight == 2
+    assert all(job.error is None for job in jobs)
+    assert sum(stage == "classify" for _, stage in pipeline.events) == 8
+    # repo k is fetched only once all but one of the k repos before it have been classified
+    for n, (repo, stage) in enumerate(pipeline.events):
+        if stage == "fetch":
+            classified = sum(s == "classify" for _, s in pipeline.events[:n])
+            assert classified >= int(repo.removeprefix("repo")) - 1
+
+
+def test_stages_run_in_order_and_early_stops_free_their_slot():
+    pipeline = RecordingPipeline(skip={"repo1"}, fail={"repo2"}, max_in_flight=1)
+    jobs = {job.folder_name: job for job in pipeline.run(repos(4))}
+
+    for repo in ("repo0", "repo3"):
+        stages = [stage for name, stage in pipeline.events if name == repo]
+        assert stages == ["fetch", "analysis", "classify"]
+    assert [stage for name, stage in pipeline.events if name == "repo1"] == ["fetch"]
+    assert [stage for name, stage in pipeline.events if name == "repo2"] == ["fetch", "analysis"]
+    assert jobs["repo2"].error.startswith("analysis:")
+    # with one slot the repos go through the pipeline one after the other
+    assert [name for name, stage in pipeline.events if stage == "fetch"] == [f"repo{i}" for i in range(4)]
+    assert all(job.project is None for job in jobs.values())
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from analysis_cache import cache_dir_for
+from repo_scheduler import DEFAULT_COST, CostModel, RepoEstimate, load_history, makespan, plan
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # the analysis cache and the metrics directory are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def cache_sources(repo: str, commit: str, sizes: list[int]) -> None:
+    cache_dir = cache_dir_for(repo, commit)
+    (cache_dir / "sources").mkdir(parents=True)
+    entries = {}
+    for i, size in enumerate(sizes):
+        (cache_dir / "sources" / f"T{i}.java").write_text("x" * size)
+        entries[f"T{i}"] = {"methods": [], "source": f"sources/T{i}.java"}
+    (cache_dir / "test_entities.json").write_text(json.dumps(entries))
+
+
+def test_makespan():
+    assert makespan([4, 1, 1, 1, 1], 2) == 4
+    assert makespan([1, 1, 1, 1, 4], 2) == 6
+    assert makespan([1, 2], 0) == 3
+
+
+def test_load_history_takes_classified_repos_from_metrics(tmp_path):
+    metrics = tmp_path / "metrics"
+    metrics.mkdir()
+    (metrics / "run.json").write_text(json.dumps({"repos": {
+        "a": {"stages": {"fetch": {"wall_s": 10}, "classify": {"wall_s": 30}, "llm": {"wall_s": 25}},
+              "prompt_tokens": 900, "completion_tokens": 100},
+        "b": {"stages": {"fetch": {"wall_s": 10}}},
+        # the classes of c ran 4 at a time
+        "c": {"elapsed_s": 20, "stages": {"fetch": {"wall_s": 10}, "classify": {"wall_s": 40}}, "prompt_tokens": 10, "completion_tokens": 0},
+    }}))
+    (metrics / "broken.json").write_text("{")
+
+    # a has no elapsed_s (an older metrics file), so its stage totals are summed
+    assert load_history(metrics) == {"a": {"seconds": 40, "tokens": 1000}, "c": {"seconds": 20, "tokens": 10}}
+    assert load_history(tmp_path / "missing") == {}
+
+
+def test_estimate_bases():
+    history = {"known": {"seconds": 100.0, "tokens": 50_000.0}, "sized": {"seconds": 30.0, "tokens": 6000.0}}
+    cache_sources("sized", "c1", [2000, 3000, 5000])
+    cache_sources("other", "c2", [1000])
+    repos_info = {
+        "known": {"commit": "c0"},
+        "sized": {"commit": "c1"},
+        "other": {"commit": "c2"},
+        "endpoints": {"commit": "c3", "endpoint_method": 4},
+        "unknown": {"commit": "c4"},
+    }
+    model = CostModel(history).fit(repos_info)
+    estimates = {repo: model.estimate(repo, details) for repo, details in repos_info.items()}
+
+    assert {repo: e.basis for repo, e in estimates.items()} == {
+        "known": "history", "sized": "history", "other": "source size", "endpoints": "endpoints", "unknown": "default",
+    }
+    # rates fitted on the repo with both history and cached sources: 0.6 tokens per byte, 10 s per class
+    assert (estimates["other"].seconds, estimates["other"].tokens) == (10.0, 600.0)
+    assert (estimates["unknown"].seconds, estimates["unknown"].tokens) == (DEFAULT_COST["seconds"], DEFAULT_COST["tokens"])
+    assert estimates["endpoints"].value > estimates["unknown"].value
+
+
+def test_plan_orders_longest_first():
+    history = {repo: {"seconds": seconds, "tokens": 1000.0} for repo, seconds in (("a", 5.0), ("b", 50.0), ("c", 20.0))}
+    repos_info = {repo: {"commit": "x"} for repo in history}
+    ordered, estimates, left_out = plan(repos_info, CostModel(history).fit(repos_info))
+
+    assert list(ordered) == ["b", "c", "a"]
+    assert [e.repo for e in estimates] == ["b", "c", "a"]
+    assert left_out == []
+
+
+def test_plan_budget_keeps_the_most_informative_repos_per_cost():
+    class Fixed(CostModel):
+        def estimate(self, repo, details):
+            return RepoEstimate(repo, details["seconds"], details["tokens"], "fixed", details["value"])
+
+    repos_info = {
+        "cheap": {"seconds": 10, "tokens": 100, "value": 1.0},
+        "rich": {"seconds": 40, "tokens": 400, "value": 8.0},
+        "costly": {"seconds": 80, "tokens": 800, "value": 2.0},
+    }
+    ordered, estimates, left_out = plan(repos_info, Fixed({}), max_tokens=600)
+    assert list(ordered) == ["rich", "cheap"]
+    assert [e.repo for e in left_out] == ["costly"]
+
+    # 25 s of wall time is 50 s of work on 2 workers
+    ordered, _, left_out = plan(repos_info, Fixed({}), max_seconds=25, workers=2)
+    assert list(ordered) == ["rich", "cheap"]
+    ordered, _, left_out = plan(repos_info, Fixed({}), max_seconds=25, workers=1)
+    assert list(ordered) == ["cheap"]
+    assert sorted(e.repo for e in left_out) == ["costly", "rich"]
@@ -0,0 +1,67 @@
+import json
+from collections import defaultdict
+
+import pytest
+
+from results_store import NEW_PATTERN, OTHER, ResultsStore, analysis_pattern_group
+from static_filter import CLEAR_AND_RELOAD, RESTART
+
+
+def analysis(pattern_name, confidence="High", fit="Perfect Fit"):
+    return {"pattern_name": pattern_name, "fit_assessment": fit, "confidence_score": confidence, "is_self_contained": True}
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "combined.json").write_text(json.dumps({
+        "small": {"endpoint_method": 3, "endppoint_class": 1},
+        "large": {"endpoint_method": 300, "endppoint_class": 20},
+    }))
+    analysis_dir = tmp_path / "analysis"
+    analysis_dir.mkdir()
+    # the repos differ in size and in how their classes split over the patterns
+    (analysis_dir / "small.json").write_text(json.dumps({
+        "A": analysis("Restart"), "B": analysis("Restart", "Low"), "C": analysis("Clear and reload"),
+    }))
+    (analysis_dir / "large.json").write_text(json.dumps({
+        f"T{i}": analysis("Clear and reload" if i < 7 else "Shared fixture", "Medium", "No Fit (New Pattern)" if i >= 7 else "Loose Fit")
+        for i in range(10)
+    }))
+
+    store = ResultsStore(tmp_path / "results.sqlite")
+    store.ingest_endpoints(tmp_path / "combined.json")
+    store.ingest_dir(analysis_dir, "analysis")
+    yield store
+    store.close()
+
+
+def test_analysis_pattern_group():
+    assert analysis_pattern_group("Restart the context", "Loose Fit") == RESTART
+    assert analysis_pattern_group("Clear and reload", None) == CLEAR_AND_RELOAD
+    assert analysis_pattern_group("Shared fixture", "No Fit (New Pattern)") == NEW_PATTERN
+    assert analysis_pattern_group("Shared fixture", "Loose Fit") == OTHER
+
+
+@pytest.mark.parametrize("by", [None, "repo", "size", "confidence"])
+def test_percentages_add_up_to_100_per_group(store, by):
+    columns, rows = store.pattern_distribution("analysis", by)
+    assert columns == ([by] if by else []) + ["pattern_group", "classes", "percent"]
+
+    percents = defaultdict(float)
+    for row in rows:
+        percents[row[0] if by else None] += row[-1]
+    assert len(percents) == {None: 1, "repo": 2, "size": 2, "confidence": 3}[by]
+    for total in percents.values():
+        assert total == pytest.approx(100, abs=0.2)
+
+
+def test_distribution_by_repo(store):
+    _, rows = store.pattern_distribution("analysis", "repo")
+    assert rows == [
+        ("large", CLEAR_AND_RELOAD, 7, 70.0),
+        ("large", NEW_PATTERN, 3, 30.0),
+        ("small", RESTART, 2, 66.7),
+        ("small", CLEAR_AND_RELOAD, 1, 33.3),
+    ]
+    _, rows = store.pattern_distribution("analysis")
+    assert rows[0] == (CLEAR_AND_RELOAD, 8, 61.5)
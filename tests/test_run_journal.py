@@ -0,0 +1,64 @@
+import io
+import json
+
+from run_journal import RunJournal, write_json_array, write_json_object
+
+
+def test_record_and_results(tmp_path):
+    journal = RunJournal(tmp_path / "run.jsonl")
+    journal.record("A", {"pattern": "Restart"})
+    journal.record("B", None)
+    journal.record("A", {"pattern": "later"})
+    journal.close()
+
+    assert list(journal.results()) == [("A", {"pattern": "Restart"}), ("B", None)]
+    assert journal.completed_keys() == {"A", "B"}
+    assert not journal.is_done()
+
+
+def test_without_resume_the_journal_starts_over(tmp_path):
+    path = tmp_path / "run.jsonl"
+    journal = RunJournal(path)
+    journal.record("A", 1)
+    journal.mark_done()
+    journal.close()
+
+    assert RunJournal(path, resume=True).is_done()
+    assert list(RunJournal(path).results()) == []
+
+
+def test_resume_truncates_a_torn_last_line(tmp_path):
+    path = tmp_path / "run.jsonl"
+    journal = RunJournal(path)
+    journal.record("A", 1)
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"key": "B", "res')
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_keys() == {"A"}
+    resumed.record("C", 3)
+    resumed.close()
+    assert list(resumed.results()) == [("A", 1), ("C", 3)]
+    assert all(json.loads(line) for line in path.read_text().splitlines())
+
+
+def test_resume_of_a_file_without_any_complete_line(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"key": "A"' + "x" * 100_000)
+    journal = RunJournal(path, resume=True)
+    assert path.read_text() == ""
+    journal.record("A", 1)
+    journal.close()
+    assert list(journal.results()) == [("A", 1)]
+
+
+def test_streaming_writers_match_json_dump():
+    for items in ([], [{"a": [1, 2]}, "x", None]):
+        f = io.StringIO()
+        write_json_array(items, f)
+        assert f.getvalue() == json.dumps(items, indent=4)
+    for obj in ({}, {"A": {"b": [1, {"c": None}]}, "B": "x"}):
+        f = io.StringIO()
+        write_json_object(obj.items(), f)
+        assert f.getvalue() == json.dumps(obj, indent=4)
@@ -0,0 +1,159 @@
+from pathlib import Path
+
+from static_filter import API_CALLS, CLEAR_AND_RELOAD, MANUAL, RESTART, StaticPrefilter, extract_signals, score_source, static_pattern
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+MOCKMVC_TEST = """
+import org.springframework.test.web.servlet.MockMvc;
+import org.springframework.boot.test.autoconfigure.web.servlet.AutoConfigureMockMvc;
+
+@SpringBootTest
+@AutoConfigureMockMvc
+class OrderControllerIT {
+    @Autowired
+    private MockMvc mockMvc;
+
+    @Test
+    void listsOrders() throws Exception {
+        mockMvc.perform(get("/orders")).andExpect(status().isOk());
+    }
+}
+"""
+
+MOCKITO_UNIT_TEST = """
+import org.mockito.Mock;
+
+class PriceCalculatorTest {
+    @Mock
+    private TaxService taxService;
+
+    @Test
+    void addsTax() {
+        assertEquals(110, new PriceCalculator(taxService).total(100));
+    }
+}
+"""
+
+SUBCLASS_WITHOUT_SIGNALS = """
+class OrderTest extends AbstractApiTest {
+    @Test
+    void createsOrder() {
+        assertNotNull(createOrder());
+    }
+}
+"""
+
+HTTP_URL_CONNECTION_TEST = """
+import java.net.HttpURLConnection;
+import java.net.URL;
+
+class OrderEndpointTest {
+    @Test
+    void listsOrders() throws Exception {
+        HttpURLConnection connection = (HttpURLConnection) new URL("http://localhost:8080/orders").openConnection();
+        assertEquals(200, connection.getResponseCode());
+    }
+}
+"""
+
+HELPER_TEST = """
+class OrderTest {
+    @Test
+    void createsOrder() {
+        assertEquals(201, TestUtils.post("/orders", "{}").status());
+    }
+}
+"""
+
+SELENIUM_TEST = """
+import org.openqa.selenium.WebDriver;
+
+class LoginPageIT {
+    @Test
+    void logsIn() {
+        driver.get("http://localhost:8080/login");
+    }
+}
+"""
+
+
+def test_extract_signals():
+    signals = extract_signals(MOCKMVC_TEST)
+    assert signals.class_name == "OrderControllerIT"
+    assert "org.springframework.test.web.servlet.MockMvc" in signals.imports
+    assert {"SpringBootTest", "AutoConfigureMockMvc", "Autowired", "Test"} <= signals.annotations.keys()
+    assert "MockMvc" in signals.type_names
+    assert signals.http_verb_calls == 1
+
+
+def test_http_test_is_a_static_positive():
+    verdict = score_source(MOCKMVC_TEST)
+    assert verdict.decision is True
+    assert "@AutoConfigureMockMvc" in verdict.signals
+
+
+def test_mock_unit_test_is_a_static_negative():
+    verdict = score_source(MOCKITO_UNIT_TEST)
+    assert verdict.decision is False
+    assert "mocking library import" in verdict.signals
+
+
+def test_ui_test_is_a_static_negative():
+    verdict = score_source(SELENIUM_TEST)
+    assert verdict.decision is False
+    assert "UI test library import" in verdict.signals
+
+
+def test_classes_without_signals_are_left_to_the_model():
+    # neither HttpURLConnection nor a project helper is a known signal, but both are REST tests
+    assert score_source(HTTP_URL_CONNECTION_TEST).decision is None
+    assert score_source(HELPER_TEST).decision is None
+
+
+def test_subclass_without_signals_is_left_to_the_model():
+    # the base class may hold the HTTP client, so the static filter cannot rule it out
+    assert score_source(SUBCLASS_WITHOUT_SIGNALS).decision is None
+
+
+def test_examples():
+    decisions = {path.stem: score_source(path.read_text()).decision for path in EXAMPLES.glob("*.txt")}
+    assert decisions["restart_EMB"] is True
+    assert decisions["API_gestaohospial"] is True
+    # every example is an integration test, so none may be ruled out statically
+    assert False not in decisions.values()
+
+
+def test_prefilter_skips_the_model_for_conclusive_verdicts():
+    prefilter = StaticPrefilter()
+    assert prefilter.is_integration_test(MOCKMVC_TEST).is_integration_test is True
+    assert prefilter.is_integration_test(MOCKITO_UNIT_TEST).is_integration_test is False
+    assert prefilter.stats() == {"static_positive": 1, "static_negative": 1, "llm_calls": 0, "llm_calls_skipped": 2}
+
+
+def test_fused_static_positives_still_make_the_call():
+    prefilter = StaticPrefilter()
+    assert prefilter.verdict(MOCKMVC_TEST, fused=True).decision is True
+    assert prefilter.verdict(MOCKITO_UNIT_TEST, fused=True).decision is False
+    assert prefilter.stats() == {"static_positive": 1, "static_negative": 1, "llm_calls": 1, "llm_calls_skipped": 1}
+
+
+def test_disabled_prefilter_decides_nothing():
+    prefilter = StaticPrefilter(enabled=False)
+    assert prefilter.verdict(MOCKMVC_TEST).decision is None
+    assert prefilter.stats()["llm_calls"] == 1
+
+
+def test_static_pattern_of_the_examples():
+    patterns = {path.stem: static_pattern(path.read_text()) for path in EXAMPLES.glob("*.txt")}
+    assert patterns == {
+        "API_gestaohospial": API_CALLS,
+        "clear_and_reload_ocvn": CLEAR_AND_RELOAD,
+        "manual_scout_api": MANUAL,
+        "restart_EMB": RESTART,
+        "restart_features_service": RESTART,
+    }
+
+
+def test_static_pattern_without_a_class():
+    assert static_pattern("interface Api {}") is None
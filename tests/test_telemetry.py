@@ -0,0 +1,97 @@
+import json
+import time
+
+import pytest
+
+from llm_dispatch import imap_ordered
+from telemetry import Telemetry, estimate_cost
+
+
+def test_scope_reaches_imap_ordered_workers():
+    telemetry = Telemetry()
+
+    def classify(test_class):
+        with telemetry.scope(test_class=test_class), telemetry.stage("classify"):
+            telemetry.record_llm("openai/gpt-4o-mini", 0.5, 100, 10)
+
+    with telemetry.scope(repo="repo"):
+        list(imap_ordered(classify, ["A", "B", "C"], max_workers=3))
+    # outside a scope only the stage totals are kept
+    telemetry.record("clone", 1.0)
+
+    summary = telemetry.summary()
+    assert summary["stages"]["llm"]["calls"] == 3
+    assert summary["stages"]["clone"]["calls"] == 1
+    assert list(summary["repos"]) == ["repo"]
+    assert summary["repos"]["repo"]["llm_calls"] == 3
+    assert sorted(c["test_class"] for c in summary["classes"]) == ["A", "B", "C"]
+    assert all(c["repo"] == "repo" and c["prompt_tokens"] == 100 for c in summary["classes"])
+
+
+def test_repo_elapsed_counts_concurrent_classes_once():
+    telemetry = Telemetry()
+
+    def classify(test_class):
+        with telemetry.scope(test_class=test_class), telemetry.stage("classify"):
+            time.sleep(0.05)
+
+    with telemetry.scope(repo="repo"):
+        with telemetry.stage("cldk_analysis"):
+            time.sleep(0.02)
+        list(imap_ordered(classify, range(8), max_workers=8))
+
+    repo = telemetry.summary()["repos"]["repo"]
+    assert repo["stages"]["classify"]["wall_s"] >= 0.4
+    assert 0.07 <= repo["elapsed_s"] < 0.25
+
+
+def test_record_llm_cost():
+    assert estimate_cost("openai/gpt-4o", 1_000_000, 100_000) == pytest.approx(3.5)
+    assert estimate_cost("local/llama", 10, 10) is None
+
+    telemetry = Telemetry()
+    telemetry.record_llm("gpt-4o-mini", 1.0, 2_000_000, 1_000_000)
+    telemetry.record_llm("local/llama", 2.0, 50, 5, error=True)
+
+    summary = telemetry.summary()
+    assert summary["models"]["gpt-4o-mini"]["cost_usd"] == pytest.approx(0.9)
+    assert summary["models"]["local/llama"]["cost_usd"] == 0
+    assert summary["models"]["local/llama"]["errors"] == 1
+    assert summary["unpriced_models"] == ["local/llama"]
+    assert summary["stages"]["llm"]["cost_usd"] == pytest.approx(0.9)
+    assert summary["stages"]["llm"]["prompt_tokens"] == 2_000_050
+
+
+def test_classes_are_bounded():
+    telemetry = Telemetry(max_classes=2)
+    for test_class in ("A", "B", "C"):
+        with telemetry.scope(repo="repo", test_class=test_class):
+            telemetry.record("classify", 1.0)
+
+    summary = telemetry.summary()
+    assert [c["test_class"] for c in summary["classes"]] == ["B", "C"]
+    assert summary["classes_dropped"] == 1
+    assert summary["repos"]["repo"]["stages"]["classify"]["calls"] == 3
+
+
+def test_metrics_file(tmp_path):
+    telemetry = Telemetry()
+    with telemetry.scope(repo="repo", test_class="A"):
+        with pytest.raises(RuntimeError):
+            with telemetry.stage("classify"):
+                raise RuntimeError("model down")
+        telemetry.record_retry()
+
+    path = telemetry.write(tmp_path / "metrics" / "run.json")
+    metrics = json.loads(path.read_text())
+    assert set(metrics) == {
+        "started_at", "wall_s", "argv", "stages", "models", "unpriced_models", "repos", "classes", "classes_dropped",
+    }
+    assert set(metrics["stages"]["classify"]) == {
+        "calls", "wall_s", "max_s", "prompt_tokens", "completion_tokens", "retries", "cost_usd", "errors",
+    }
+    assert metrics["stages"]["classify"]["errors"] == 1
+    assert metrics["classes"] == [{
+        "repo": "repo", "test_class": "A", "stages": metrics["repos"]["repo"]["stages"],
+        "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 1, "cost_usd": 0.0,
+    }]
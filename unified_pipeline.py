@@ -0,0 +1,110 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import llm_dispatch
+from chunked_classification import chunker
+from classification_pipeline import ClassificationPipeline
+from model_cascade import CHEAP_MODEL_NAME, cascade
+from ndjson_output import open_ndjson
+from near_duplicates import DEFAULT_THRESHOLD, dedup
+from pattern_analysis import AnalysisStage
+from pattern_statistics import STATS_DIR, RatingStage, load_repo_analysis, print_run_stats
+from prompt_slicing import slicer
+from repo_fetch import fetcher
+from repo_scheduler import plan
+from results_store import ANALYSIS_DIR, store
+from run_journal import JOURNAL_DIR, RunJournal, write_json_array, write_json_object
+from static_filter import prefilter
+from telemetry import telemetry
+
+# Both reports from one pass per repo: every test class is read and gated once, then rated for
+# stats/<repo>.json and analysed for analysis/<repo>.json. The journal records {stage: entry} per class.
+
+UNIFIED_JOURNAL_DIR = JOURNAL_DIR / "unified"
+STAGES = {RatingStage.name: RatingStage, AnalysisStage.name: AnalysisStage}
+
+
+def write_reports(folder_name: str, journal: RunJournal, stage_names: list[str], stats_dir: Path = STATS_DIR, analysis_dir: Path = ANALYSIS_DIR) -> None:
+    # same formats as pattern_statistics.py and pattern_analysis.py, streamed from the journal
+    if RatingStage.name in stage_names:
+        stats_dir.mkdir(parents=True, exist_ok=True)
+        with open(stats_dir / f"{folder_name}.json", "w") as f:
+            write_json_array((records[RatingStage.name] for _, records in journal.results() if RatingStage.name in records), f)
+        store.record_file(stats_dir / f"{folder_name}.json", "stats")
+    if AnalysisStage.name in stage_names:
+        analysis_dir.mkdir(parents=True, exist_ok=True)
+        with open(analysis_dir / f"{folder_name}.json", "w") as f:
+            analyses = ((name, records.get(AnalysisStage.name)) for name, records in journal.results())
+            write_json_object(((name, analysis) for name, analysis in analyses if analysis is not None), f)
+        store.record_file(analysis_dir / f"{folder_name}.json", "analysis")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repos_info_json")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="reports to produce from the pass")
+    parser.add_argument("--max-workers", type=int, default=1, help="maximum LLM requests in flight")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every test class to the LLM gate")
+    parser.add_argument("--slice", action="store_true", help="send a structural slice of each integration test to the pattern prompts instead of the full source")
+    parser.add_argument("--cascade", action="store_true", help="ask a cheaper model first for the analysis and escalate uncertain answers")
+    parser.add_argument("--cheap-model", default=CHEAP_MODEL_NAME, help="first tier of --cascade")
+    parser.add_argument("--dedup", action="store_true", help="classify one representative per cluster of near-duplicate test classes")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity of a near-duplicate")
+    parser.add_argument("--token-budget", type=int, help="split test classes larger than this many tokens into chunks classified separately")
+    parser.add_argument("--sparse", action="store_true", help="check out only build files and src/ trees")
+    parser.add_argument("--resume", action="store_true", help="skip repos and test classes already in the journal")
+    parser.add_argument("--invalidate-analysis", action="store_true", help="re-run CLDK even when a cached analysis exists")
+    parser.add_argument("--schedule", action="store_true", help="process repos longest-first by estimated cost (see repo_scheduler.py)")
+    parser.add_argument("--store", action="store_true", help="load each output file into the results store as it is written (see results_store.py)")
+    parser.add_argument("--ndjson", metavar="PATH", help="also stream each class as an NDJSON line as soon as it is classified ('-' for stdout)")
+    args = parser.parse_args()
+
+    llm_dispatch.configure(args.max_workers)
+    prefilter.enabled = not args.no_prefilter
+    chunker.token_budget = args.token_budget
+    slicer.enabled = args.slice
+    cascade.enabled = args.cascade
+    cascade.cheap_model = args.cheap_model
+    dedup.enabled = args.dedup
+    dedup.threshold = args.dedup_threshold
+    fetcher.sparse = args.sparse
+    store.enabled = args.store
+    ndjson = open_ndjson(args.ndjson) if args.ndjson else None
+
+    with open(args.repos_info_json, "r") as f:
+        repos_info = json.load(f)
+    if args.schedule:
+        repos_info, _, _ = plan(repos_info)
+
+    pipeline = ClassificationPipeline([STAGES[name]() for name in args.stages])
+
+    for folder_name, details in repos_info.items():
+        with telemetry.scope(repo=folder_name):
+            journal = RunJournal(UNIFIED_JOURNAL_DIR / f"{folder_name}.jsonl", resume=args.resume)
+            try:
+                if ndjson is not None:
+                    # classes finished by an earlier run come first, so the stream is complete
+                    for test_class_name, records in journal.results():
+                        ndjson.write(folder_name, test_class_name, records)
+                if not (args.resume and journal.is_done()):
+                    project = load_repo_analysis(folder_name, details["github_url"], details["commit"], invalidate=args.invalidate_analysis)
+                    if project is None:
+                        continue
+                    for test_class_name, records in pipeline.run(project.iter_sources(skip=journal.completed_keys()), project, args.max_workers):
+                        journal.record(test_class_name, records)
+                        if ndjson is not None:
+                            ndjson.write(folder_name, test_class_name, records)
+                    journal.mark_done()
+            finally:
+                # also on the resume and failed-analysis branches
+                journal.close()
+            write_reports(folder_name, journal, args.stages)
+
+    if ndjson is not None:
+        ndjson.close()
+    # with the stream on stdout, the statistics go to stderr
+    log = sys.stderr if args.ndjson == "-" else None
+    print(f"Model cascade: {cascade.stats()}", file=log)
+    print_run_stats(file=log)